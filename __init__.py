@@ -4,7 +4,7 @@ from fastapi import APIRouter
 from lnbits.tasks import create_permanent_unique_task
 from loguru import logger
 
-from .crud import db, get_startup_enabled_ssh_tunnels
+from .crud import db
 from .tasks import wait_for_paid_invoices
 from .views import lnbits_cloud_connect_generic_router
 from .views_api import lnbits_cloud_connect_api_router
@@ -33,18 +33,21 @@ lnbits_cloud_connect_static_files = [
 scheduled_tasks: list[asyncio.Task] = []
 
 
-def lnbits_cloud_connect_stop():
+async def lnbits_cloud_connect_stop():
     for task in scheduled_tasks:
         try:
             task.cancel()
         except Exception as ex:
             logger.warning(ex)
-    
-    # Stop all SSH tunnels on extension shutdown
+
+    # Stop all SSH tunnels on extension shutdown, on the server's event loop
     try:
+        from .keypool import key_pool
+        from .metrics import loop_lag_monitor
         from .ssh_service import tunnel_manager
-        asyncio.run(tunnel_manager.stop_all_tunnels())
-        logger.info("All SSH tunnels stopped")
+        loop_lag_monitor.stop()
+        await key_pool.stop()
+        await tunnel_manager.stop_all_tunnels()
     except Exception as ex:
         logger.warning(f"Error stopping SSH tunnels: {ex}")
 
@@ -52,28 +55,33 @@ def lnbits_cloud_connect_stop():
 def lnbits_cloud_connect_start():
     startup_task = create_permanent_unique_task("ext_lnbits_cloud_connect_startup", start_startup_tunnels)
     scheduled_tasks.append(startup_task)
+    invoice_task = create_permanent_unique_task("ext_lnbits_cloud_connect_invoices", wait_for_paid_invoices)
+    scheduled_tasks.append(invoice_task)
 
 
 async def start_startup_tunnels():
     """
-    Start all SSH tunnels marked for startup.
+    Bring up the tunnels that should run (marked for startup, or connected
+    with auto-reconnect before the restart), then keep them reconciled and
+    their status in the database audited.
     """
     try:
+        from .keypool import key_pool
+        from .metrics import loop_lag_monitor
+        from .spawner import process_spawner
         from .ssh_service import tunnel_manager
-        
-        startup_tunnels = await get_startup_enabled_ssh_tunnels()
-        logger.info(f"Found {len(startup_tunnels)} tunnels marked for startup")
-        
-        for tunnel in startup_tunnels:
-            try:
-                success = await tunnel_manager.start_tunnel(tunnel)
-                if success:
-                    logger.info(f"Successfully started startup tunnel: {tunnel.name} ({tunnel.id})")
-                else:
-                    logger.error(f"Failed to start startup tunnel: {tunnel.name} ({tunnel.id})")
-            except Exception as e:
-                logger.error(f"Error starting startup tunnel {tunnel.name} ({tunnel.id}): {e}")
-                
+
+        key_pool.start()
+        loop_lag_monitor.start()
+        tunnel_manager.supervisor.start()
+
+        try:
+            await process_spawner.start()
+        except OSError as e:
+            logger.warning(f"SSH process spawner unavailable, forking ssh directly: {e}")
+
+        await tunnel_manager.reconciler.start()
+
     except Exception as e:
         logger.error(f"Error in startup tunnel initialization: {e}")
 
@@ -84,4 +92,4 @@ __all__ = [
     "lnbits_cloud_connect_start",
     "lnbits_cloud_connect_static_files",
     "lnbits_cloud_connect_stop",
-]
\ No newline at end of file
+]
@@ -0,0 +1,162 @@
+import asyncio
+
+import asyncssh
+from loguru import logger
+
+from .helpers import decrypt_private_key
+from .models import SSHTunnel
+from .ssh_service import TunnelBackend, TunnelHandle, TunnelLog
+
+# Size of the chunks copied between the SSH channel and the local service
+COPY_BUFFER_SIZE = 65536
+
+
+def parse_server_url(remote_server_url: str) -> tuple[str, int]:
+    """
+    Split a `host` or `host:port` server url, defaulting to port 22.
+    """
+    if remote_server_url.count(":") == 1:
+        host, port = remote_server_url.split(":")
+        return host, int(port)
+    return remote_server_url, 22
+
+
+class AsyncSSHHandle(TunnelHandle):
+    """
+    A forward served by an in-process asyncssh connection.
+    Every forwarded connection is copied to the local service on the event
+    loop, so per-channel events and byte counts are available directly.
+    """
+
+    backend = "asyncssh"
+
+    def __init__(self, tunnel: SSHTunnel, local_host: str, log: TunnelLog):
+        self.tunnel_id = tunnel.id
+        self.local_host = local_host
+        self.local_port = tunnel.local_port
+        self.log = log
+        self.conn: asyncssh.SSHClientConnection | None = None
+        self.closed = asyncio.Event()
+        self._exit_code: int | None = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.channels_open = 0
+        self.channels_total = 0
+
+    @property
+    def exit_code(self) -> int | None:
+        return self._exit_code
+
+    def connection_lost(self, exc: Exception | None):
+        if exc:
+            self.log.append("asyncssh", f"Connection lost: {exc}")
+        if self._exit_code is None:
+            self._exit_code = 255 if exc else 0
+        self.closed.set()
+
+    async def wait(self):
+        await self.closed.wait()
+
+    async def terminate(self):
+        if self.conn:
+            self.conn.close()
+
+    def kill(self):
+        if self.conn:
+            self.conn.abort()
+        self.connection_lost(None)
+
+    def stats(self) -> dict:
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "channels_open": self.channels_open,
+            "channels_total": self.channels_total,
+        }
+
+    def handler_factory(self, orig_host: str, orig_port: int):
+        return self._handle_channel
+
+    async def _handle_channel(self, reader: asyncssh.SSHReader, writer: asyncssh.SSHWriter):
+        self.channels_open += 1
+        self.channels_total += 1
+        try:
+            local_reader, local_writer = await asyncio.open_connection(self.local_host, self.local_port)
+        except OSError as e:
+            self.log.append("asyncssh", f"connect to {self.local_host}:{self.local_port} failed: {e}")
+            self.channels_open -= 1
+            writer.close()
+            return
+
+        async def _copy(source, sink, inbound: bool):
+            try:
+                while data := await source.read(COPY_BUFFER_SIZE):
+                    sink.write(data)
+                    await sink.drain()
+                    if inbound:
+                        self.bytes_in += len(data)
+                    else:
+                        self.bytes_out += len(data)
+                if sink.can_write_eof():
+                    sink.write_eof()
+            except (OSError, asyncssh.Error):
+                pass
+
+        try:
+            await asyncio.gather(_copy(reader, local_writer, True), _copy(local_reader, writer, False))
+        finally:
+            self.channels_open -= 1
+            local_writer.close()
+            writer.close()
+
+
+class AsyncSSHBackend(TunnelBackend):
+    """
+    Runs forwards on the LNbits event loop with asyncssh: no fork, no key
+    file on disk, and direct access to channel events.
+    """
+
+    name = "asyncssh"
+
+    def __init__(self, ready_timeout: float, local_host: str):
+        self.ready_timeout = ready_timeout
+        self.local_host = local_host
+
+    async def open(self, tunnel: SSHTunnel, log: TunnelLog) -> TunnelHandle:
+        host, port = parse_server_url(tunnel.remote_server_url)
+        handle = AsyncSSHHandle(tunnel, self.local_host, log)
+
+        class _Client(asyncssh.SSHClient):
+            def connection_lost(self, exc: Exception | None):
+                handle.connection_lost(exc)
+
+        client_key = asyncssh.import_private_key(decrypt_private_key(tunnel.private_key))
+        log.append("asyncssh", f"Connecting to {tunnel.remote_server_user}@{host}:{port}")
+        try:
+            handle.conn, _ = await asyncio.wait_for(
+                asyncssh.create_connection(
+                    _Client,
+                    host,
+                    port,
+                    username=tunnel.remote_server_user,
+                    client_keys=[client_key],
+                    known_hosts=None,
+                    keepalive_interval=30,
+                    keepalive_count_max=3,
+                ),
+                timeout=self.ready_timeout,
+            )
+            await handle.conn.start_server(handle.handler_factory, "127.0.0.1", tunnel.remote_port)
+        except (asyncssh.Error, OSError, asyncio.TimeoutError) as e:
+            if handle.conn:
+                handle.conn.abort()
+            log.append("asyncssh", f"SSH connection failed: {e}")
+            raise RuntimeError(f"SSH connection failed: {e}") from e
+
+        log.append(
+            "asyncssh",
+            f"remote forward success for: listen 127.0.0.1:{tunnel.remote_port}, "
+            f"connect {self.local_host}:{tunnel.local_port}",
+        )
+        logger.info(f"asyncssh forward for tunnel {tunnel.id} established")
+        return handle
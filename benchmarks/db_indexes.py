@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Query latency of the extension's hot lookups before and after the
+m010_add_indexes migration, on a throwaway SQLite database.
+
+    uv run python benchmarks/db_indexes.py --rows 10000 100000
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from lnbits.settings import settings
+
+MIGRATIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations.py")
+INSERT_CHUNK = 500
+REPEAT = 50
+
+QUERIES = {
+    "tunnels by wallet": (
+        """
+            SELECT * FROM lnbits_cloud_connect.ssh_tunnels
+            WHERE wallet_id = :wallet_id ORDER BY created_at DESC LIMIT 10
+        """,
+        lambda n: {"wallet_id": f"wallet{n // 2}"},
+    ),
+    "startup tunnels": (
+        "SELECT * FROM lnbits_cloud_connect.ssh_tunnels WHERE startup_enabled = TRUE",
+        lambda n: {},
+    ),
+    "owner data by user": (
+        "SELECT DISTINCT id FROM lnbits_cloud_connect.owner_data WHERE user_id = :user_id",
+        lambda n: {"user_id": f"user{n // 20}"},
+    ),
+    "client data by owner": (
+        """
+            SELECT * FROM lnbits_cloud_connect.client_data
+            WHERE owner_data_id = :owner_data_id ORDER BY created_at DESC LIMIT 10
+        """,
+        lambda n: {"owner_data_id": f"owner{n // 2}"},
+    ),
+}
+
+
+def load_migrations():
+    spec = importlib.util.spec_from_file_location("lnbits_cloud_connect_migrations", MIGRATIONS_PATH)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def insert_rows(db, table: str, columns: list[str], rows: list[tuple]):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[start : start + INSERT_CHUNK]
+        values = {}
+        placeholders = []
+        for i, row in enumerate(chunk):
+            keys = [f"{column}_{i}" for column in columns]
+            values.update(zip(keys, row, strict=True))
+            placeholders.append("(" + ", ".join(f":{key}" for key in keys) + ")")
+        await db.execute(
+            f"INSERT INTO lnbits_cloud_connect.{table} ({', '.join(columns)}) VALUES {', '.join(placeholders)}",
+            values,
+        )
+
+
+async def seed(db, rows: int):
+    """
+    One tunnel per wallet with 1% marked for startup;
+    ten owner data rows per user and ten client data rows per owner data.
+    """
+    await insert_rows(
+        db,
+        "ssh_tunnels",
+        [
+            "id",
+            "wallet_id",
+            "name",
+            "remote_server_user",
+            "remote_server_url",
+            "local_port",
+            "remote_port",
+            "private_key",
+            "public_key",
+            "startup_enabled",
+            "created_at",
+        ],
+        [
+            (
+                f"tunnel{i}",
+                f"wallet{i}",
+                f"tunnel {i}",
+                "lnbits",
+                "cloud.example.com",
+                5000,
+                10000 + i,
+                "x" * 1700,
+                "y" * 400,
+                int(i % 100 == 1),
+                i,
+            )
+            for i in range(rows)
+        ],
+    )
+    await insert_rows(
+        db,
+        "owner_data",
+        ["id", "user_id", "name"],
+        [(f"owner{i}", f"user{i // 10}", f"owner {i}") for i in range(rows)],
+    )
+    await insert_rows(
+        db,
+        "client_data",
+        ["id", "owner_data_id", "name"],
+        [(f"client{i}", f"owner{i // 10}", f"client {i}") for i in range(rows)],
+    )
+
+
+async def measure(db, rows: int) -> dict[str, float]:
+    """
+    Median latency of each query in milliseconds.
+    """
+    results = {}
+    for name, (query, values) in QUERIES.items():
+        timings = []
+        for _ in range(REPEAT):
+            started_at = time.perf_counter()
+            await db.fetchall(query, values(rows))
+            timings.append((time.perf_counter() - started_at) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+
+async def run(rows: int) -> tuple[dict[str, float], dict[str, float]]:
+    with tempfile.TemporaryDirectory() as data_folder:
+        settings.lnbits_data_folder = data_folder
+        from lnbits.db import Database
+
+        migrations = load_migrations()
+        db = Database("ext_lnbits_cloud_connect")
+        async with db.connect() as conn:
+            # the schema as it was before the indexes
+            for name in sorted(n for n in dir(migrations) if re.match(r"^m00[1-9]_", n)):
+                await getattr(migrations, name)(conn)
+
+        await seed(db, rows)
+        before = await measure(db, rows)
+        async with db.connect() as conn:
+            await migrations.m010_add_indexes(conn)
+        after = await measure(db, rows)
+        await db.engine.dispose()
+        return before, after
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print("| rows | query | before (ms) | after (ms) | speedup |")
+    print("|---:|---|---:|---:|---:|")
+    for rows in args.rows:
+        before, after = await run(rows)
+        for name in QUERIES:
+            speedup = before[name] / after[name]
+            print(f"| {rows} | {name} | {before[name]:.3f} | {after[name]:.3f} | {speedup:.1f}x |")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Latency of bulk tunnel onboarding: many concurrent tunnel creations
+(keypair generation plus the insert), on a throwaway SQLite database.
+
+Compares the old path (RSA-2048 generated on the event loop) with key
+generation in a worker thread, Ed25519 keys and a pre-filled key pool.
+Besides the p50/p99 create latency it reports the worst event loop
+stall, i.e. how long every other request on the worker was frozen.
+
+    uv run python benchmarks/tunnel_create_latency.py --tunnels 200
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from lnbits.settings import settings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONCURRENCY = 20
+TICK = 0.005
+
+
+def load_extension():
+    """
+    Import the extension as a package so its relative imports resolve.
+    """
+    spec = importlib.util.spec_from_file_location(
+        "lnbits_cloud_connect", os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT]
+    )
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+async def watch_loop(stalls: list[float], done: asyncio.Event):
+    """
+    Record how much later than asked each short sleep wakes up.
+    """
+    while not done.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls.append((time.perf_counter() - started_at - TICK) * 1000)
+
+
+async def onboard(crud, models, helpers, keypair, tunnels: int) -> tuple[list[float], float]:
+    """
+    Create `tunnels` tunnels, CONCURRENCY at a time. Returns the latency
+    of every create and the worst event loop stall, in milliseconds.
+    """
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    timings: list[float] = []
+
+    async def create(i: int):
+        async with semaphore:
+            started_at = time.perf_counter()
+            private_key, public_key = await keypair()
+            data = models.CreateSSHTunnel(
+                name=f"tunnel {i}",
+                remote_server_user="lnbits",
+                remote_server_url="cloud.example.com",
+                local_port=5000,
+                remote_port=10000 + i,
+            )
+            await crud.create_ssh_tunnel(f"wallet{i}", data, helpers.encrypt_private_key(private_key), public_key)
+            timings.append((time.perf_counter() - started_at) * 1000)
+
+    stalls: list[float] = []
+    done = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stalls, done))
+    await asyncio.gather(*(create(i) for i in range(tunnels)))
+    done.set()
+    await watcher
+    return timings, max(stalls, default=0.0)
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+async def run(tunnels: int):
+    with tempfile.TemporaryDirectory() as data_folder:
+        settings.lnbits_data_folder = data_folder
+        load_extension()
+        from lnbits_cloud_connect import crud, helpers, keypool, migrations, models
+
+        db = crud.db
+        async with db.connect() as conn:
+            for name in sorted(n for n in dir(migrations) if n[:1] == "m" and n[1:4].isdigit()):
+                await getattr(migrations, name)(conn)
+
+        async def rsa_on_loop():
+            return helpers.generate_ssh_keypair("rsa")
+
+        async def rsa_in_thread():
+            return await keypool.generate_ssh_keypair_async("rsa")
+
+        async def ed25519_in_thread():
+            return await keypool.generate_ssh_keypair_async("ed25519")
+
+        pool = keypool.KeyPool(size=tunnels, key_type="ed25519")
+        pool.start()
+        await pool._task
+
+        variants = {
+            "rsa on event loop": rsa_on_loop,
+            "rsa in thread": rsa_in_thread,
+            "ed25519 in thread": ed25519_in_thread,
+            "ed25519 from pool": pool.take,
+        }
+        print(f"{tunnels} tunnels, {CONCURRENCY} concurrent\n")
+        print("| keys | p50 ms | p99 ms | max ms | worst loop stall ms |")
+        print("|---|---:|---:|---:|---:|")
+        for name, keypair in variants.items():
+            await db.execute("DELETE FROM lnbits_cloud_connect.ssh_tunnels")
+            timings, stall = await onboard(crud, models, helpers, keypair, tunnels)
+            print(
+                f"| {name} | {percentile(timings, 50):.1f} | {percentile(timings, 99):.1f} | "
+                f"{max(timings):.1f} | {stall:.1f} |"
+            )
+        await pool.stop()
+        await db.engine.dispose()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tunnels", type=int, default=200)
+    args = parser.parse_args()
+    await run(args.tunnels)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import time
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from .models import SSHTunnel
+
+# Most tunnels kept in memory
+TUNNEL_CACHE_SIZE = 1024
+# Seconds a cached tunnel is trusted, bounding staleness from writes
+# that bypass crud.py (e.g. another process sharing the database)
+TUNNEL_CACHE_TTL = 60.0
+
+
+class TunnelCache:
+    """
+    Bounded LRU cache of SSH tunnel rows by id, with a TTL per entry.
+
+    A lookup by id and wallet is answered from the same entry, since a
+    tunnel of another wallet is "not found" either way. Only rows that
+    exist are cached, and callers get copies so mutating a returned
+    tunnel never changes the cache. Every write in crud.py invalidates
+    the rows it touches.
+    """
+
+    def __init__(self, size: int = TUNNEL_CACHE_SIZE, ttl: float = TUNNEL_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, tuple[float, SSHTunnel]] = OrderedDict()
+
+    def get(self, tunnel_id: str, wallet_id: str | None = None) -> tuple[bool, SSHTunnel | None]:
+        """
+        Returns (hit, tunnel). On a hit for another wallet the tunnel is None.
+        """
+        entry = self._entries.get(tunnel_id)
+        if not entry or entry[0] <= time.monotonic():
+            if entry:
+                del self._entries[tunnel_id]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(tunnel_id)
+        self.hits += 1
+        tunnel = entry[1]
+        if wallet_id is not None and tunnel.wallet_id != wallet_id:
+            return True, None
+        return True, tunnel.copy()
+
+    def put(self, tunnel: SSHTunnel | None) -> SSHTunnel | None:
+        """
+        Cache `tunnel` if it exists and pass it through.
+        """
+        if tunnel is None:
+            return None
+        self._entries[tunnel.id] = (time.monotonic() + self.ttl, tunnel.copy())
+        self._entries.move_to_end(tunnel.id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return tunnel
+
+    def invalidate(self, tunnel_ids: Iterable[str]):
+        for tunnel_id in tunnel_ids:
+            self._entries.pop(tunnel_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+tunnel_cache = TunnelCache()
@@ -1,9 +1,16 @@
 # Description: This file contains the CRUD operations for talking to the database.
 
+import socket
+import time
 
 from lnbits.db import Database, Filters, Page
 from lnbits.helpers import urlsafe_short_hash
+from lnbits.settings import settings
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
 
+from .cache import tunnel_cache
+from .metrics import DB_STATUS_WRITE_SECONDS, DB_STATUS_WRITES
 from .models import (
     ClientData,
     ClientDataFilters,
@@ -15,8 +22,12 @@ from .models import (
     OwnerDataFilters,
     SSHTunnel,
     SSHTunnelFilters,
+    SSHTunnelSummary,
+    TunnelRuntime,
     UserExtensionSettings,  #  
 )
+from .pagination import CURSOR_SORT_FIELDS, fetch_cursor_page
+from .versions import list_versions, ssh_tunnels_scope, user_data_scope
 
 db = Database("ext_lnbits_cloud_connect")
 
@@ -25,6 +36,7 @@ db = Database("ext_lnbits_cloud_connect")
 async def create_owner_data(user_id: str, data: CreateOwnerData) -> OwnerData:
     owner_data = OwnerData(**data.dict(), id=urlsafe_short_hash(), user_id=user_id)
     await db.insert("lnbits_cloud_connect.owner_data", owner_data)
+    list_versions.bump(user_data_scope(user_id))
     return owner_data
 
 
@@ -72,13 +84,30 @@ async def get_owner_data_ids_by_user(
 async def get_owner_data_paginated(
     user_id: str | None = None,
     filters: Filters[OwnerDataFilters] | None = None,
+    cursor: str | None = None,
+    with_total: bool = False,
 ) -> Page[OwnerData]:
+    """
+    Offset paging, or keyset paging from `cursor` when one is given
+    (see `fetch_cursor_page`).
+    """
     where = []
     values = {}
     if user_id:
         where.append("user_id = :user_id")
         values["user_id"] = user_id
 
+    if cursor is not None:
+        return await fetch_cursor_page(
+            db,
+            "SELECT * FROM lnbits_cloud_connect.owner_data",
+            where=where,
+            values=values,
+            filters=filters,
+            model=OwnerData,
+            cursor=cursor,
+            with_total=with_total,
+        )
     return await db.fetch_page(
         "SELECT * FROM lnbits_cloud_connect.owner_data",
         where=where,
@@ -90,6 +119,7 @@ async def get_owner_data_paginated(
 
 async def update_owner_data(data: OwnerData) -> OwnerData:
     await db.update("lnbits_cloud_connect.owner_data", data)
+    list_versions.bump(user_data_scope(data.user_id))
     return data
 
 
@@ -101,6 +131,7 @@ async def delete_owner_data(user_id: str, owner_data_id: str) -> None:
         """,
         {"id": owner_data_id, "user_id": user_id},
     )
+    list_versions.bump(user_data_scope(user_id))
 
 
 ################################# Client Data ###########################
@@ -109,6 +140,7 @@ async def delete_owner_data(user_id: str, owner_data_id: str) -> None:
 async def create_client_data(owner_data_id: str, data: CreateClientData) -> ClientData:
     client_data = ClientData(**data.dict(), id=urlsafe_short_hash(), owner_data_id=owner_data_id)
     await db.insert("lnbits_cloud_connect.client_data", client_data)
+    await _bump_client_data_version(owner_data_id)
     return client_data
 
 
@@ -140,24 +172,40 @@ async def get_client_data_by_id(
 
 
 async def get_client_data_paginated(
-    owner_data_ids: list[str] | None = None,
+    user_id: str,
+    owner_data_id: str | None = None,
     filters: Filters[ClientDataFilters] | None = None,
+    cursor: str | None = None,
+    with_total: bool = False,
 ) -> Page[ClientData]:
-
-    if not owner_data_ids:
-        return Page(data=[], total=0)
-
-    where = []
-    values = {}
-    id_clause = []
-    for i, item_id in enumerate(owner_data_ids):
-        # owner_data_ids are not user input, but DB entries, so this is safe
-        owner_data_id = f"owner_data_id__{i}"
-        id_clause.append(f"owner_data_id = :{owner_data_id}")
-        values[owner_data_id] = item_id
-    or_clause = " OR ".join(id_clause)
-    where.append(f"({or_clause})")
-
+    """
+    Client data of all owner data of `user_id`, or of just `owner_data_id`
+    if given. Ownership is checked by the query itself.
+    Pages by keyset from `cursor` when one is given.
+    """
+    where = [
+        """
+            owner_data_id IN (
+                SELECT id FROM lnbits_cloud_connect.owner_data WHERE user_id = :user_id
+            )
+        """
+    ]
+    values = {"user_id": user_id}
+    if owner_data_id:
+        where.append("owner_data_id = :owner_data_id")
+        values["owner_data_id"] = owner_data_id
+
+    if cursor is not None:
+        return await fetch_cursor_page(
+            db,
+            "SELECT * FROM lnbits_cloud_connect.client_data",
+            where=where,
+            values=values,
+            filters=filters,
+            model=ClientData,
+            cursor=cursor,
+            with_total=with_total,
+        )
     return await db.fetch_page(
         "SELECT * FROM lnbits_cloud_connect.client_data",
         where=where,
@@ -169,6 +217,7 @@ async def get_client_data_paginated(
 
 async def update_client_data(data: ClientData) -> ClientData:
     await db.update("lnbits_cloud_connect.client_data", data)
+    await _bump_client_data_version(data.owner_data_id)
     return data
 
 
@@ -180,6 +229,16 @@ async def delete_client_data(owner_data_id: str, client_data_id: str) -> None:
         """,
         {"id": client_data_id, "owner_data_id": owner_data_id},
     )
+    await _bump_client_data_version(owner_data_id)
+
+
+async def _bump_client_data_version(owner_data_id: str) -> None:
+    """
+    Client data lists are versioned per user, the owner of the owner data.
+    """
+    owner_data = await get_owner_data_by_id(owner_data_id)
+    if owner_data:
+        list_versions.bump(user_data_scope(owner_data.user_id))
 
 
 ############################ Settings #############################
@@ -209,6 +268,27 @@ async def update_extension_settings(user_id: str, data: ExtensionSettings) -> Ex
 
 
 ############################ SSH Tunnels ############################
+# Everything but the key blobs, which only starting a tunnel and its details need
+SSH_TUNNEL_SUMMARY_COLUMNS = ", ".join(SSHTunnelSummary.__fields__)
+# Tunnels per runtime upsert statement, well below SQLite's parameter limit
+RUNTIME_UPSERT_BATCH_SIZE = 500
+# This LNbits process among those sharing one database: the runtime rows it
+# writes are its own, and the supervisor audit only repairs those
+NODE_ID = f"{socket.gethostname()}:{settings.port}"
+# Tunnel configuration with its runtime state from tunnel_runtime joined on,
+# under the name of the config table so filters and sorting work unchanged
+SSH_TUNNELS = f"""(
+        SELECT {", ".join(
+            f"t.{name}"
+            for name, field in SSHTunnel.__fields__.items()
+            if not field.field_info.extra.get("no_database")
+        )},
+            COALESCE(r.is_connected, FALSE) AS is_connected, r.process_id AS process_id
+        FROM lnbits_cloud_connect.ssh_tunnels AS t
+        LEFT JOIN lnbits_cloud_connect.tunnel_runtime AS r ON r.tunnel_id = t.id
+    ) AS ssh_tunnels"""
+
+
 async def create_ssh_tunnel(wallet_id: str, data: CreateSSHTunnel, private_key: str, public_key: str) -> SSHTunnel:
     tunnel = SSHTunnel(
         **data.dict(),
@@ -218,62 +298,110 @@ async def create_ssh_tunnel(wallet_id: str, data: CreateSSHTunnel, private_key:
         public_key=public_key
     )
     await db.insert("lnbits_cloud_connect.ssh_tunnels", tunnel)
+    list_versions.bump(ssh_tunnels_scope(wallet_id))
     return tunnel
 
 
 async def get_ssh_tunnel(tunnel_id: str, wallet_id: str) -> SSHTunnel | None:
-    return await db.fetchone(
-        """
-            SELECT * FROM lnbits_cloud_connect.ssh_tunnels
+    hit, tunnel = tunnel_cache.get(tunnel_id, wallet_id)
+    if hit:
+        return tunnel
+    tunnel = await db.fetchone(
+        f"""
+            SELECT * FROM {SSH_TUNNELS}
             WHERE id = :id AND wallet_id = :wallet_id
         """,
         {"id": tunnel_id, "wallet_id": wallet_id},
         SSHTunnel,
     )
+    return tunnel_cache.put(tunnel)
 
 
-async def get_ssh_tunnel_by_id(tunnel_id: str) -> SSHTunnel | None:
+async def get_ssh_tunnel_summary(tunnel_id: str, wallet_id: str) -> SSHTunnelSummary | None:
+    hit, tunnel = tunnel_cache.get(tunnel_id, wallet_id)
+    if hit:
+        return tunnel and SSHTunnelSummary(**tunnel.dict(exclude={"private_key", "public_key"}))
     return await db.fetchone(
-        """
-            SELECT * FROM lnbits_cloud_connect.ssh_tunnels
+        f"""
+            SELECT {SSH_TUNNEL_SUMMARY_COLUMNS} FROM {SSH_TUNNELS}
+            WHERE id = :id AND wallet_id = :wallet_id
+        """,
+        {"id": tunnel_id, "wallet_id": wallet_id},
+        SSHTunnelSummary,
+    )
+
+
+async def get_ssh_tunnel_by_id(tunnel_id: str) -> SSHTunnel | None:
+    hit, tunnel = tunnel_cache.get(tunnel_id)
+    if hit:
+        return tunnel
+    tunnel = await db.fetchone(
+        f"""
+            SELECT * FROM {SSH_TUNNELS}
             WHERE id = :id
         """,
         {"id": tunnel_id},
         SSHTunnel,
     )
+    return tunnel_cache.put(tunnel)
 
 
 async def get_ssh_tunnels_paginated(
     wallet_id: str | None = None,
     filters: Filters[SSHTunnelFilters] | None = None,
-) -> Page[SSHTunnel]:
+    cursor: str | None = None,
+    with_total: bool = False,
+) -> Page[SSHTunnelSummary]:
+    """
+    Offset paging, or keyset paging from `cursor` when one is given
+    (see `fetch_cursor_page`).
+    """
     where = []
     values = {}
     if wallet_id:
         where.append("wallet_id = :wallet_id")
         values["wallet_id"] = wallet_id
 
+    if cursor is not None:
+        return await fetch_cursor_page(
+            db,
+            f"SELECT {SSH_TUNNEL_SUMMARY_COLUMNS} FROM {SSH_TUNNELS}",
+            where=where,
+            values=values,
+            filters=filters,
+            model=SSHTunnelSummary,
+            cursor=cursor,
+            with_total=with_total,
+            # all non-null, unlike the name of owner and client data
+            sort_fields=(
+                *CURSOR_SORT_FIELDS,
+                "name",
+                "remote_server_user",
+                "remote_server_url",
+                "is_connected",
+            ),
+        )
     return await db.fetch_page(
-        "SELECT * FROM lnbits_cloud_connect.ssh_tunnels",
+        f"SELECT {SSH_TUNNEL_SUMMARY_COLUMNS} FROM {SSH_TUNNELS}",
         where=where,
         values=values,
         filters=filters,
-        model=SSHTunnel,
+        model=SSHTunnelSummary,
     )
 
 
 async def get_all_ssh_tunnels() -> list[SSHTunnel]:
     return await db.fetchall(
-        "SELECT * FROM lnbits_cloud_connect.ssh_tunnels",
+        f"SELECT * FROM {SSH_TUNNELS}",
         model=SSHTunnel,
     )
 
 
 async def get_connected_ssh_tunnels() -> list[SSHTunnel]:
     return await db.fetchall(
-        """
-            SELECT * FROM lnbits_cloud_connect.ssh_tunnels
-            WHERE is_connected = 1
+        f"""
+            SELECT * FROM {SSH_TUNNELS}
+            WHERE is_connected = TRUE
         """,
         model=SSHTunnel,
     )
@@ -281,18 +409,147 @@ async def get_connected_ssh_tunnels() -> list[SSHTunnel]:
 
 async def update_ssh_tunnel(data: SSHTunnel) -> SSHTunnel:
     await db.update("lnbits_cloud_connect.ssh_tunnels", data)
+    tunnel_cache.invalidate([data.id])
+    list_versions.bump(ssh_tunnels_scope(data.wallet_id))
     return data
 
 
-async def update_ssh_tunnel_connection_status(tunnel_id: str, is_connected: bool, process_id: int | None = None) -> None:
-    await db.execute(
+async def get_tunnel_runtimes() -> list[TunnelRuntime]:
+    return await db.fetchall(
+        "SELECT * FROM lnbits_cloud_connect.tunnel_runtime",
+        model=TunnelRuntime,
+    )
+
+
+async def upsert_tunnel_runtimes(runtimes: list[TunnelRuntime]) -> None:
+    """
+    Write the runtime state of many tunnels in one transaction, with a
+    single statement per `RUNTIME_UPSERT_BATCH_SIZE` tunnels. Either all
+    of them are written or, if a statement fails, none.
+    """
+    if not runtimes:
+        return
+    columns = list(TunnelRuntime.__fields__)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in [*columns[1:], "node_id", "updated_at"])
+    statements = []
+    for start in range(0, len(runtimes), RUNTIME_UPSERT_BATCH_SIZE):
+        values: dict = {"node_id": NODE_ID}
+        rows = []
+        for i, runtime in enumerate(runtimes[start : start + RUNTIME_UPSERT_BATCH_SIZE]):
+            values.update({f"{column}_{i}": getattr(runtime, column) for column in columns})
+            placeholders = [
+                db.timestamp_placeholder(f"{column}_{i}") if column == "started_at" else f":{column}_{i}"
+                for column in columns
+            ]
+            rows.append(f"({', '.join(placeholders)}, :node_id, {db.timestamp_now})")
+        query = f"""
+            INSERT INTO lnbits_cloud_connect.tunnel_runtime ({", ".join(columns)}, node_id, updated_at)
+            VALUES {", ".join(rows)}
+            ON CONFLICT (tunnel_id) DO UPDATE SET {updates}
         """
-            UPDATE lnbits_cloud_connect.ssh_tunnels
-            SET is_connected = :is_connected, process_id = :process_id, updated_at = strftime('%s', 'now')
-            WHERE id = :id
+        statements.append((query, values))
+    started_at = time.perf_counter()
+    await _execute_in_transaction(statements)
+    DB_STATUS_WRITE_SECONDS.observe(time.perf_counter() - started_at, "runtime_upsert")
+    DB_STATUS_WRITES.inc("runtime_upsert", amount=len(runtimes))
+    tunnel_cache.invalidate([runtime.tunnel_id for runtime in runtimes])
+    await _bump_tunnel_list_versions([runtime.tunnel_id for runtime in runtimes])
+
+
+async def _execute_in_transaction(statements: list[tuple[str, dict]]) -> None:
+    """
+    Run `statements` in one transaction: all of them are committed, or all
+    are rolled back when one fails.
+
+    lnbits has no transaction API, so this is the one place that relies on
+    how lnbits.db.Connection works (checked against lnbits 1.6):
+    - `Connection.execute` commits after every statement, so it cannot be
+      used here;
+    - `Connection.conn` is the SQLAlchemy AsyncConnection underneath, which
+      begins a transaction on the first statement and keeps it open until
+      `commit()` or `rollback()`;
+    - `rewrite_query` and `rewrite_values` prepare a query and its values
+      for the backend, as `Connection.execute` does before running them.
+    """
+    async with db.connect() as conn:
+        if not isinstance(getattr(conn, "conn", None), AsyncConnection):
+            raise RuntimeError("lnbits.db.Connection no longer exposes its SQLAlchemy connection")
+        try:
+            for query, values in statements:
+                await conn.conn.execute(text(conn.rewrite_query(query)), conn.rewrite_values(values))
+            await conn.conn.commit()
+        except BaseException:
+            await conn.conn.rollback()
+            raise
+
+
+async def get_connected_ssh_tunnel_ids() -> dict[str, int | None]:
+    """
+    Get the process id of every tunnel this node marked as connected, by
+    tunnel id. Rows without a node predate node ids and count as local.
+    """
+    rows = await db.fetchall(
+        """
+            SELECT tunnel_id, process_id FROM lnbits_cloud_connect.tunnel_runtime
+            WHERE is_connected = TRUE AND (node_id = :node_id OR node_id IS NULL)
+        """,
+        {"node_id": NODE_ID},
+    )
+    return {row["tunnel_id"]: row["process_id"] for row in rows}
+
+
+async def mark_ssh_tunnels_disconnected(tunnel_ids: list[str]) -> None:
+    """
+    Mark many tunnels as disconnected in a single statement, leaving rows
+    another node has since taken over untouched.
+    """
+    if not tunnel_ids:
+        return
+    values = {f"id_{i}": tunnel_id for i, tunnel_id in enumerate(tunnel_ids)}
+    values["node_id"] = NODE_ID
+    started_at = time.perf_counter()
+    await db.execute(
+        f"""
+            UPDATE lnbits_cloud_connect.tunnel_runtime
+            SET is_connected = FALSE, process_id = NULL, updated_at = {db.timestamp_now}
+            WHERE tunnel_id IN ({", ".join(f":id_{i}" for i in range(len(tunnel_ids)))})
+            AND (node_id = :node_id OR node_id IS NULL)
         """,
-        {"id": tunnel_id, "is_connected": int(is_connected), "process_id": process_id},
+        values,
     )
+    DB_STATUS_WRITE_SECONDS.observe(time.perf_counter() - started_at, "mark_disconnected")
+    DB_STATUS_WRITES.inc("mark_disconnected", amount=len(tunnel_ids))
+    tunnel_cache.invalidate(tunnel_ids)
+    await _bump_tunnel_list_versions(tunnel_ids)
+
+
+async def mark_ssh_tunnels_connected(process_ids: dict[str, int | None]) -> None:
+    """
+    Mark many tunnels as connected with their process ids in a single statement.
+    """
+    if not process_ids:
+        return
+    values: dict = {"node_id": NODE_ID}
+    rows = []
+    for i, (tunnel_id, process_id) in enumerate(process_ids.items()):
+        values[f"id_{i}"] = tunnel_id
+        values[f"pid_{i}"] = process_id
+        rows.append(f"(:id_{i}, TRUE, :pid_{i}, :node_id, {db.timestamp_now})")
+    started_at = time.perf_counter()
+    await db.execute(
+        f"""
+            INSERT INTO lnbits_cloud_connect.tunnel_runtime (tunnel_id, is_connected, process_id, node_id, updated_at)
+            VALUES {", ".join(rows)}
+            ON CONFLICT (tunnel_id) DO UPDATE SET
+                is_connected = TRUE, process_id = excluded.process_id, node_id = excluded.node_id,
+                updated_at = excluded.updated_at
+        """,
+        values,
+    )
+    DB_STATUS_WRITE_SECONDS.observe(time.perf_counter() - started_at, "mark_connected")
+    DB_STATUS_WRITES.inc("mark_connected", amount=len(process_ids))
+    tunnel_cache.invalidate(process_ids)
+    await _bump_tunnel_list_versions(list(process_ids))
 
 
 async def delete_ssh_tunnel(tunnel_id: str, wallet_id: str) -> None:
@@ -303,6 +560,34 @@ async def delete_ssh_tunnel(tunnel_id: str, wallet_id: str) -> None:
         """,
         {"id": tunnel_id, "wallet_id": wallet_id},
     )
+    await db.execute(
+        """
+            DELETE FROM lnbits_cloud_connect.tunnel_runtime
+            WHERE tunnel_id = :id
+              AND NOT EXISTS (SELECT 1 FROM lnbits_cloud_connect.ssh_tunnels WHERE id = :id)
+        """,
+        {"id": tunnel_id},
+    )
+    tunnel_cache.invalidate([tunnel_id])
+    list_versions.bump(ssh_tunnels_scope(wallet_id))
+
+
+async def _bump_tunnel_list_versions(tunnel_ids: list[str]) -> None:
+    """
+    Runtime writes only know tunnel ids; look up the wallets whose tunnel
+    lists they change.
+    """
+    for start in range(0, len(tunnel_ids), RUNTIME_UPSERT_BATCH_SIZE):
+        batch = tunnel_ids[start : start + RUNTIME_UPSERT_BATCH_SIZE]
+        values = {f"id_{i}": tunnel_id for i, tunnel_id in enumerate(batch)}
+        rows = await db.fetchall(
+            f"""
+                SELECT DISTINCT wallet_id FROM lnbits_cloud_connect.ssh_tunnels
+                WHERE id IN ({", ".join(f":{key}" for key in values)})
+            """,
+            values,
+        )
+        list_versions.bump(*(ssh_tunnels_scope(row["wallet_id"]) for row in rows))
 
 
 async def get_startup_enabled_ssh_tunnels() -> list[SSHTunnel]:
@@ -310,9 +595,9 @@ async def get_startup_enabled_ssh_tunnels() -> list[SSHTunnel]:
     Get all SSH tunnels that are marked for startup.
     """
     return await db.fetchall(
-        """
-            SELECT * FROM lnbits_cloud_connect.ssh_tunnels
-            WHERE startup_enabled = 1
+        f"""
+            SELECT * FROM {SSH_TUNNELS}
+            WHERE startup_enabled = TRUE
         """,
         model=SSHTunnel,
     )
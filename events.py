@@ -0,0 +1,80 @@
+import asyncio
+import json
+from collections import defaultdict
+from collections.abc import AsyncIterator
+
+# Events buffered per subscriber before it is told to reload instead
+SUBSCRIBER_QUEUE_SIZE = 100
+# Seconds between keepalive comments on an idle stream, so proxies keep it open
+KEEPALIVE_INTERVAL = 15.0
+# Milliseconds the browser waits before reconnecting a dropped stream
+RECONNECT_DELAY_MS = 5000
+
+
+class TunnelEvents:
+    """
+    Fan-out of tunnel state changes to Server-Sent Events subscribers,
+    scoped per wallet so a subscriber only sees its own tunnels.
+
+    Publishing never blocks: a subscriber whose queue is full has its
+    backlog replaced by a single `resync` event, after which it reloads
+    the tunnel list instead of replaying every missed change.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, wallet_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[wallet_id].add(queue)
+        return queue
+
+    def unsubscribe(self, wallet_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(wallet_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[wallet_id]
+
+    def publish(self, wallet_id: str, event: str, data: dict):
+        for queue in self._subscribers.get(wallet_id, ()):
+            if queue.full():
+                while not queue.empty():
+                    queue.get_nowait()
+                self.dropped += 1
+                queue.put_nowait(("resync", {}))
+            else:
+                queue.put_nowait((event, data))
+            self.published += 1
+
+    async def stream(self, wallet_id: str, keepalive: float = KEEPALIVE_INTERVAL) -> AsyncIterator[str]:
+        """
+        Server-Sent Events for `wallet_id`, until the client goes away.
+        """
+        queue = self.subscribe(wallet_id)
+        try:
+            yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            self.unsubscribe(wallet_id, queue)
+
+    def stats(self) -> dict:
+        return {
+            "wallets": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+tunnel_events = TunnelEvents()
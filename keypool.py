@@ -0,0 +1,82 @@
+import asyncio
+from collections import deque
+
+from loguru import logger
+
+from .helpers import SSH_KEY_TYPE, generate_ssh_keypair
+
+# Ready keypairs kept for new tunnels; 0 generates every keypair on demand
+KEY_POOL_SIZE = 0
+
+
+async def generate_ssh_keypair_async(key_type: str = SSH_KEY_TYPE) -> tuple[str, str]:
+    """
+    `generate_ssh_keypair` in a worker thread, so a slow (RSA) key never
+    blocks the event loop.
+    """
+    return await asyncio.to_thread(generate_ssh_keypair, key_type)
+
+
+class KeyPool:
+    """
+    Pool of pre-generated SSH keypairs, refilled in the background.
+
+    `take` hands out a ready keypair, so creating a tunnel does not wait
+    for key generation; when the pool is empty (or disabled with size 0)
+    it generates one in a worker thread instead. Every keypair is handed
+    out once only.
+    """
+
+    def __init__(self, size: int = KEY_POOL_SIZE, key_type: str = SSH_KEY_TYPE):
+        self.size = size
+        self.key_type = key_type
+        self.hits = 0
+        self.misses = 0
+        self._keys: deque[tuple[str, str]] = deque()
+        self._task: asyncio.Task | None = None
+
+    async def take(self) -> tuple[str, str]:
+        """
+        Returns (private_key_pem, public_key_openssh).
+        """
+        if self._keys:
+            self.hits += 1
+            keypair = self._keys.popleft()
+        else:
+            self.misses += 1
+            keypair = await generate_ssh_keypair_async(self.key_type)
+        self.start()
+        return keypair
+
+    def start(self):
+        """
+        Refill the pool in the background, if it is enabled and not full.
+        """
+        if self.size <= 0 or len(self._keys) >= self.size:
+            return
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._fill())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "ready": len(self._keys),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    async def _fill(self):
+        try:
+            while len(self._keys) < self.size:
+                self._keys.append(await generate_ssh_keypair_async(self.key_type))
+        except Exception as e:
+            logger.error(f"Failed to pre-generate SSH keypairs: {e}")
+
+
+key_pool = KeyPool()
@@ -0,0 +1,268 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+from loguru import logger
+
+# Label sets kept per metric; further ones are dropped, so a label that
+# accidentally carries a tunnel id cannot grow the output without bound
+MAX_SERIES = 100
+# Seconds between event loop lag samples
+LOOP_LAG_INTERVAL = 1.0
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+READY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+Labels = tuple[str, ...]
+
+
+def format_labels(names: tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.dropped = 0
+
+    def _accepts(self, series: dict, values: Labels) -> bool:
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {values}")
+        if values in series or len(series) < MAX_SERIES:
+            return True
+        if not self.dropped:
+            logger.warning(f"Metric {self.name} reached {MAX_SERIES} label sets, dropping new ones")
+        self.dropped += 1
+        return False
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> list[str]:
+        """
+        Sample lines of this metric, without the HELP and TYPE header.
+        """
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self.values: dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        if self._accepts(self.values, labels):
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self.values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        return [
+            f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+            for labels, value in sorted(self.values.items())
+        ]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, description: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DURATION_BUCKETS
+    ):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: count per bucket (not cumulative), sum, count
+        self.series: dict[Labels, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not self._accepts(self.series, labels):
+            return
+        counts, totals = self.series.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0, 0]))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        totals[0] += value
+        totals[1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """
+        Observe the duration of the `with` block, also when it raises.
+        """
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, *labels)
+
+    def count(self, *labels: str) -> int:
+        series = self.series.get(labels)
+        return int(series[1][1]) if series else 0
+
+    def render(self) -> list[str]:
+        lines = []
+        for labels, (counts, (total, count)) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts, strict=True):
+                cumulative += bucket_count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labels, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labels, labels)} {int(count)}")
+        return lines
+
+
+class Gauge(Metric):
+    """
+    Gauge read from `collect` at scrape time, so the state it reports
+    (e.g. tunnels per state) is never duplicated or out of date.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self, name: str, description: str, collect: Callable[[], dict[Labels, float]], labels: tuple[str, ...] = ()
+    ):
+        super().__init__(name, description, labels)
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        try:
+            values = self.collect()
+        except Exception as e:
+            logger.error(f"Failed to collect metric {self.name}: {e}")
+            return []
+        return [
+            f"{self.name}{format_labels(self.labels, labels)} {format_value(value)}"
+            for labels, value in sorted(values.items())[:MAX_SERIES]
+        ]
+
+
+class MetricsRegistry:
+    """
+    Process-local metrics in the Prometheus text exposition format.
+
+    Labels only ever carry small, fixed sets of values (backend, outcome,
+    operation, loop name); tunnels are never a label, so the number of
+    series stays the same with ten tunnels or ten thousand.
+    """
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, description, labels))
+
+    def histogram(
+        self, name: str, description: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DURATION_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def gauge(
+        self, name: str, description: str, collect: Callable[[], dict[Labels, float]], labels: tuple[str, ...] = ()
+    ) -> Gauge:
+        return self.register(Gauge(name, description, collect, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than asked a periodic sleep
+    wakes up, i.e. how long something blocked the loop.
+    """
+
+    def __init__(self, histogram: Histogram, interval: float = LOOP_LAG_INTERVAL):
+        self.histogram = histogram
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.histogram.observe(max(0.0, time.perf_counter() - started_at - self.interval))
+
+
+metrics = MetricsRegistry()
+
+TUNNEL_STARTS = metrics.counter(
+    "cloud_connect_tunnel_starts_total", "Tunnel start attempts by backend and result.", ("backend", "result")
+)
+TUNNEL_FAILURES = metrics.counter(
+    "cloud_connect_tunnel_failures_total",
+    "Tunnel failures by backend and reason (start_failed, unexpected_exit).",
+    ("backend", "reason"),
+)
+TUNNEL_RECONNECTS = metrics.counter(
+    "cloud_connect_tunnel_reconnects_total", "Reconnects scheduled after a tunnel went down."
+)
+TUNNEL_READY_SECONDS = metrics.histogram(
+    "cloud_connect_tunnel_ready_seconds",
+    "Seconds from starting a tunnel until its forward is ready.",
+    ("backend",),
+    READY_BUCKETS,
+)
+DB_STATUS_WRITES = metrics.counter(
+    "cloud_connect_db_status_writes_total", "Tunnel status rows written to the database.", ("operation",)
+)
+DB_STATUS_WRITE_SECONDS = metrics.histogram(
+    "cloud_connect_db_status_write_seconds", "Duration of tunnel status writes.", ("operation",)
+)
+LOOP_DURATION_SECONDS = metrics.histogram(
+    "cloud_connect_background_loop_seconds", "Duration of one pass of a background loop.", ("loop",)
+)
+LOOP_ERRORS = metrics.counter(
+    "cloud_connect_background_loop_errors_total", "Background loop passes that raised.", ("loop",)
+)
+EVENT_LOOP_LAG_SECONDS = metrics.histogram(
+    "cloud_connect_event_loop_lag_seconds", "Delay of a periodic wakeup of the event loop.", buckets=LAG_BUCKETS
+)
+
+loop_lag_monitor = LoopLagMonitor(EVENT_LOOP_LAG_SECONDS)
@@ -2,9 +2,30 @@
 # If you create a new release for your extension ,
 # remember the migration file is like a blockchain, never edit only add!
 
+from lnbits.db import SQLITE
+
 empty_dict: dict[str, str] = {}
 
 
+def boolean(db, value: bool) -> str:
+    """
+    Boolean column default: the 0/1 SQLite has always been given, and the
+    literal Postgres requires.
+    """
+    if db.type == SQLITE:
+        return str(int(value))
+    return "TRUE" if value else "FALSE"
+
+
+def epoch_now(db) -> str:
+    """
+    Default of the epoch-seconds columns of m006, on every backend.
+    """
+    if db.type == SQLITE:
+        return "(strftime('%s', 'now'))"
+    return "(CAST(EXTRACT(EPOCH FROM now()) AS INTEGER))"
+
+
 async def m001_extension_settings(db):
     """
     Initial settings table.
@@ -110,8 +131,8 @@ async def m005_ssh_tunnel_table(db):
             remote_port INTEGER NOT NULL,
             private_key TEXT NOT NULL,
             public_key TEXT NOT NULL,
-            is_connected BOOLEAN NOT NULL DEFAULT 0,
-            auto_reconnect BOOLEAN NOT NULL DEFAULT 1,
+            is_connected BOOLEAN NOT NULL DEFAULT {boolean(db, False)},
+            auto_reconnect BOOLEAN NOT NULL DEFAULT {boolean(db, True)},
             process_id INTEGER,
             created_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now},
             updated_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now}
@@ -147,8 +168,8 @@ async def m006_fix_ssh_tunnel_timestamps(db):
             is_connected INTEGER NOT NULL DEFAULT 0,
             auto_reconnect INTEGER NOT NULL DEFAULT 1,
             process_id INTEGER,
-            created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now')),
-            updated_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+            created_at INTEGER NOT NULL DEFAULT {epoch_now(db)},
+            updated_at INTEGER NOT NULL DEFAULT {epoch_now(db)}
         );
     """
     )
@@ -164,4 +185,114 @@ async def m007_add_startup_enabled_to_ssh_tunnels(db):
         ALTER TABLE lnbits_cloud_connect.ssh_tunnels 
         ADD COLUMN startup_enabled INTEGER NOT NULL DEFAULT 0;
         """
-    )
\ No newline at end of file
+    )
+
+
+async def m008_add_backend_to_ssh_tunnels(db):
+    """
+    Add backend field to ssh_tunnels table.
+    """
+
+    await db.execute(
+        """
+        ALTER TABLE lnbits_cloud_connect.ssh_tunnels
+        ADD COLUMN backend TEXT NOT NULL DEFAULT 'openssh';
+        """
+    )
+
+
+async def m009_ssh_tunnel_column_types(db):
+    """
+    Give the flags and timestamps of ssh_tunnels their proper types on
+    Postgres, which the queries compare with TRUE/FALSE and timestamps.
+    SQLite stores the same 0/1 and epoch values whatever the declared
+    type, so its tables are left as they are.
+    """
+    if db.type == SQLITE:
+        return
+    for column, default in (("is_connected", "FALSE"), ("auto_reconnect", "TRUE"), ("startup_enabled", "FALSE")):
+        await db.execute(f"ALTER TABLE lnbits_cloud_connect.ssh_tunnels ALTER COLUMN {column} DROP DEFAULT")
+        await db.execute(
+            f"""
+            ALTER TABLE lnbits_cloud_connect.ssh_tunnels
+            ALTER COLUMN {column} TYPE BOOLEAN USING {column} <> 0
+            """
+        )
+        await db.execute(f"ALTER TABLE lnbits_cloud_connect.ssh_tunnels ALTER COLUMN {column} SET DEFAULT {default}")
+    for column in ("created_at", "updated_at"):
+        await db.execute(f"ALTER TABLE lnbits_cloud_connect.ssh_tunnels ALTER COLUMN {column} DROP DEFAULT")
+        await db.execute(
+            f"""
+            ALTER TABLE lnbits_cloud_connect.ssh_tunnels
+            ALTER COLUMN {column} TYPE TIMESTAMP USING to_timestamp({column}) AT TIME ZONE 'UTC'
+            """
+        )
+        await db.execute(
+            f"ALTER TABLE lnbits_cloud_connect.ssh_tunnels ALTER COLUMN {column} SET DEFAULT {db.timestamp_now}"
+        )
+
+
+async def create_index(db, name: str, table: str, columns: str, where: str = ""):
+    """
+    Create an index on a table of this extension.
+    SQLite qualifies the index name with the schema, Postgres the table name.
+    """
+    if db.type == SQLITE:
+        target = f"lnbits_cloud_connect.{name} ON {table}"
+    else:
+        target = f"{name} ON lnbits_cloud_connect.{table}"
+    await db.execute(f"CREATE INDEX IF NOT EXISTS {target} ({columns}) {where}")
+
+
+async def m010_add_indexes(db):
+    """
+    Index the columns the API and the tunnel manager filter on.
+    Lists are filtered by owner and sorted by creation time; the manager
+    only ever reads the few startup tunnels, which a partial index keeps
+    small. Connected tunnels are looked up in tunnel_runtime, see m011.
+    """
+    await create_index(db, "idx_ssh_tunnels_wallet_id_created_at", "ssh_tunnels", "wallet_id, created_at")
+    await create_index(db, "idx_ssh_tunnels_startup", "ssh_tunnels", "id", "WHERE startup_enabled = TRUE")
+    await create_index(db, "idx_owner_data_user_id_created_at", "owner_data", "user_id, created_at")
+    await create_index(
+        db, "idx_client_data_owner_data_id_created_at", "client_data", "owner_data_id, created_at"
+    )
+
+
+async def m011_tunnel_runtime_table(db):
+    """
+    Keep the volatile runtime state of tunnels in its own small table, so
+    that connects and disconnects no longer rewrite the configuration row.
+    The is_connected and process_id columns of ssh_tunnels are left unused.
+    """
+    await db.execute(
+        f"""
+        CREATE TABLE lnbits_cloud_connect.tunnel_runtime (
+            tunnel_id TEXT PRIMARY KEY,
+            is_connected BOOLEAN NOT NULL DEFAULT FALSE,
+            process_id INTEGER,
+            last_error TEXT,
+            started_at TIMESTAMP,
+            reconnect_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT {db.timestamp_now}
+        );
+    """
+    )
+    await db.execute(
+        """
+        INSERT INTO lnbits_cloud_connect.tunnel_runtime (tunnel_id, is_connected, process_id)
+        SELECT id, is_connected, process_id FROM lnbits_cloud_connect.ssh_tunnels
+        WHERE is_connected = TRUE
+    """
+    )
+    await create_index(
+        db, "idx_tunnel_runtime_connected", "tunnel_runtime", "tunnel_id, process_id", "WHERE is_connected = TRUE"
+    )
+
+
+async def m012_tunnel_runtime_node_id(db):
+    """
+    Record which LNbits node runs a tunnel, so that nodes sharing one
+    database only audit their own runtime rows.
+    """
+    await db.execute("ALTER TABLE lnbits_cloud_connect.tunnel_runtime ADD COLUMN node_id TEXT;")
@@ -1,7 +1,8 @@
+import importlib.util
 from datetime import datetime, timezone
 
 from lnbits.db import FilterModel
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 
 
 ########################### Owner Data ############################
@@ -78,6 +79,20 @@ class ClientDataFilters(FilterModel):
 
 
 ############################ SSH Tunnel Models #############################
+SSH_TUNNEL_BACKENDS = ["openssh", "asyncssh"]
+
+
+def available_ssh_tunnel_backends() -> list[str]:
+    """
+    The backends that can run here; asyncssh is an optional dependency.
+    """
+    return [
+        backend
+        for backend in SSH_TUNNEL_BACKENDS
+        if backend != "asyncssh" or importlib.util.find_spec("asyncssh") is not None
+    ]
+
+
 class CreateSSHTunnel(BaseModel):
     name: str
     remote_server_user: str
@@ -86,9 +101,22 @@ class CreateSSHTunnel(BaseModel):
     remote_port: int
     auto_reconnect: bool = True
     startup_enabled: bool = False
+    backend: str = "openssh"
+
+    @validator("backend")
+    def validate_backend(cls, v):
+        if v not in SSH_TUNNEL_BACKENDS:
+            raise ValueError(f"backend must be one of {', '.join(SSH_TUNNEL_BACKENDS)}")
+        if v not in available_ssh_tunnel_backends():
+            raise ValueError(f"the {v} backend requires the '{v}' package, which is not installed")
+        return v
 
 
-class SSHTunnel(BaseModel):
+class SSHTunnelSummary(BaseModel):
+    """
+    An SSH tunnel without its key material, for lists and ownership checks.
+    """
+
     id: str
     wallet_id: str
     name: str
@@ -96,15 +124,20 @@ class SSHTunnel(BaseModel):
     remote_server_url: str
     local_port: int
     remote_port: int
-    private_key: str
-    public_key: str
-    is_connected: bool = False
+    # runtime state, read from tunnel_runtime and never written with the config
+    is_connected: bool = Field(False, no_database=True)
     auto_reconnect: bool = True
     startup_enabled: bool = False
-    process_id: int | None = None
+    backend: str = "openssh"
+    process_id: int | None = Field(None, no_database=True)
     
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class SSHTunnel(SSHTunnelSummary):
+    private_key: str
+    public_key: str
     
     @classmethod
     def __get_validators__(cls):
@@ -123,6 +156,26 @@ class SSHTunnel(BaseModel):
         return v
 
 
+class TunnelRuntime(BaseModel):
+    """
+    Volatile state of a tunnel, kept apart from its configuration.
+    """
+
+    tunnel_id: str
+    is_connected: bool = False
+    process_id: int | None = None
+    last_error: str | None = None
+    started_at: datetime | None = None
+    reconnect_count: int = 0
+
+
+class SSHTunnelLogEntry(BaseModel):
+    timestamp: datetime
+    stream: str
+    level: str
+    message: str
+
+
 class SSHTunnelFilters(FilterModel):
     __search_fields__ = [
         "name",
@@ -0,0 +1,137 @@
+import base64
+import json
+import time
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from typing import Generic, TypeVar
+
+from lnbits.db import Database, Filters, Page, compat_timestamp_placeholder, dict_to_model
+
+T = TypeVar("T")
+
+# Keyset paging needs sort columns that are never NULL
+CURSOR_SORT_FIELDS = ("created_at", "updated_at")
+# Seconds a counted total is reused for the same query and parameters
+TOTAL_CACHE_TTL = 30.0
+TOTAL_CACHE_SIZE = 1024
+
+_totals: dict = {}
+
+
+class CursorPage(Page, Generic[T]):
+    """
+    A page from either paging mode. In cursor mode `next_cursor` continues
+    after the last row (None on the last page) and `total` is only set
+    when it was asked for.
+    """
+
+    total: int | None = None  # type: ignore[assignment]
+    next_cursor: str | None = None
+
+
+def encode_cursor(sortby: str, direction: str, value, row_id: str) -> str:
+    if isinstance(value, datetime):
+        # Postgres hands back TIMESTAMP columns as naive UTC datetimes
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        value = {"ts": value.timestamp()}
+    raw = json.dumps([sortby, direction, value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str, object, str]:
+    """
+    Raises ValueError for anything that is not a cursor we handed out.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sortby, direction, value, row_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    return sortby, direction, value, row_id
+
+
+async def fetch_cursor_page(
+    db: Database,
+    query: str,
+    where: list | None = None,
+    values: dict | None = None,
+    filters: Filters | None = None,
+    model=None,
+    cursor: str = "",
+    with_total: bool = False,
+    sort_fields: Sequence[str] = CURSOR_SORT_FIELDS,
+) -> CursorPage:
+    """
+    Keyset counterpart of `db.fetch_page`: rows are ordered by
+    `(sortby, id)` and a page starts after the row encoded in `cursor`
+    (an empty cursor is the first page), so every page costs the same
+    however deep it is. `total` is only counted with `with_total`, and
+    reused for `TOTAL_CACHE_TTL` seconds.
+
+    Raises ValueError for an invalid cursor or sort field.
+    """
+    filters = filters or Filters()
+    sortby = filters.sortby or "created_at"
+    direction = filters.direction or "asc"
+    if sortby not in sort_fields:
+        raise ValueError(f"Cursor paging can only sort by {', '.join(sort_fields)}")
+    # same bounds as Filters.pagination
+    limit = min(1000, filters.limit or (1000 if filters.limit == 0 else 10))
+    where = list(where or [])
+    values = dict(values or {})
+
+    total = None
+    if with_total:
+        total = await _count(db, query, filters.where(list(where)), filters.values(dict(values)))
+
+    if cursor:
+        cursor_sortby, cursor_direction, value, row_id = decode_cursor(cursor)
+        if (cursor_sortby, cursor_direction) != (sortby, direction):
+            raise ValueError("Cursor does not match the requested sort order")
+        placeholder = ":cursor_value"
+        if isinstance(value, dict):
+            if not isinstance(value.get("ts"), (int, float)):
+                raise ValueError("Invalid cursor")
+            value = value["ts"]
+            placeholder = compat_timestamp_placeholder("cursor_value")
+        op = ">" if direction == "asc" else "<"
+        where.append(f"({sortby} {op} {placeholder} OR ({sortby} = {placeholder} AND id {op} :cursor_id))")
+        values.update(cursor_value=value, cursor_id=row_id)
+
+    rows = await db.fetchall(
+        f"""
+            {query}
+            {filters.where(where)}
+            ORDER BY {sortby} {direction}, id {direction}
+            LIMIT {limit + 1}
+        """,
+        filters.values(values),
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sortby, direction, last[sortby], last["id"])
+
+    return CursorPage(
+        data=[dict_to_model(row, model) for row in rows] if model else rows,
+        total=total,
+        next_cursor=next_cursor,
+    )
+
+
+async def _count(db: Database, query: str, clause: str, values: dict) -> int:
+    key = (query, clause, json.dumps(values, sort_keys=True, default=str))
+    now = time.monotonic()
+    cached = _totals.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    row = await db.fetchone(f"SELECT COUNT(*) AS count FROM ({query} {clause}) AS counted", values)
+    total = int(row["count"])
+    if len(_totals) >= TOTAL_CACHE_SIZE:
+        _totals.pop(next(iter(_totals)))
+    _totals[key] = (now + TOTAL_CACHE_TTL, total)
+    return total
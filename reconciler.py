@@ -0,0 +1,164 @@
+import asyncio
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from .crud import get_all_ssh_tunnels
+from .metrics import LOOP_DURATION_SECONDS, LOOP_ERRORS
+from .models import SSHTunnel
+
+if TYPE_CHECKING:
+    from .ssh_service import SSHTunnelManager
+
+
+def tunnel_config(tunnel: SSHTunnel) -> tuple:
+    """
+    The settings a running forward was started with; a change to any of
+    them needs a restart to take effect.
+    """
+    return (
+        tunnel.remote_server_user,
+        tunnel.remote_server_url,
+        tunnel.local_port,
+        tunnel.remote_port,
+        tunnel.backend,
+        tunnel.private_key,
+    )
+
+
+def desired_tunnel_ids(tunnels: list[SSHTunnel], boot: bool = False) -> set[str]:
+    """
+    Tunnels that should be running: those kept connected with
+    auto-reconnect, and at boot also those marked for startup.
+    """
+    return {
+        tunnel.id
+        for tunnel in tunnels
+        if (tunnel.auto_reconnect and tunnel.is_connected) or (boot and tunnel.startup_enabled)
+    }
+
+
+class TunnelReconciler:
+    """
+    Brings the running tunnels in line with the database: starts the
+    desired tunnels that are not running (once, with the manager's bounded
+    concurrency), restarts tunnels whose settings changed and stops
+    tunnels that were deleted.
+
+    Runs once at boot, then again whenever `request` signals a change.
+    Requests arriving during a pass are coalesced into a single next pass.
+    """
+
+    def __init__(self, manager: "SSHTunnelManager"):
+        self.manager = manager
+        self.last_report: dict | None = None
+        self._requested = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> dict:
+        """
+        Run the boot pass, then keep reconciling on change requests.
+        """
+        report = await self.reconcile(boot=True)
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return report
+
+    def request(self):
+        self._requested.set()
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def reconcile(self, boot: bool = False) -> dict:
+        async with self._lock:
+            return await self._reconcile(boot)
+
+    async def _reconcile(self, boot: bool) -> dict:
+        manager = self.manager
+        if boot:
+            await manager.runtime.load()
+        tunnels = await get_all_ssh_tunnels()
+        manager.track(tunnels)
+        by_id = {tunnel.id: tunnel for tunnel in tunnels}
+
+        adopted: list[str] = []
+        if boot:
+            # ssh processes that survived a restart keep their forwards
+            adoption = await manager.adopt_tunnels([t for t in tunnels if t.is_connected])
+            adopted = adoption["adopted"]
+
+        stopped, restarted = await self._stop_outdated(by_id)
+        desired = desired_tunnel_ids(tunnels, boot) | set(restarted)
+        to_start = [
+            by_id[tunnel_id]
+            for tunnel_id in desired
+            if not manager.is_running_or_starting(tunnel_id) and not manager.reconnects.is_pending(tunnel_id)
+        ]
+        report = await manager.start_tunnels(to_start)
+
+        # desired tunnels that failed to start are retried with backoff
+        for tunnel_id in report["failed"]:
+            tunnel = by_id[tunnel_id]
+            if tunnel.auto_reconnect:
+                manager.schedule_reconnect(tunnel)
+
+        if boot:
+            self._mark_not_restored(tunnels)
+
+        report.update(adopted=adopted, stopped=stopped, restarted=restarted)
+        self.last_report = report
+        if boot or to_start or stopped:
+            logger.info(
+                f"Reconciled tunnels: {len(desired)} desired, {len(adopted)} adopted, "
+                f"{report['started']} started, {len(report['failed'])} failed, {len(stopped)} stopped"
+            )
+        return report
+
+    async def _stop_outdated(self, by_id: dict[str, SSHTunnel]) -> tuple[list[str], list[str]]:
+        """
+        Stop running tunnels that were deleted, and those whose settings
+        changed so they are started again with the new ones.
+        Returns the ids stopped for good and the ids to restart.
+        """
+        manager = self.manager
+        stopped: list[str] = []
+        restarted: list[str] = []
+        for tunnel_id in list(manager.active_tunnels):
+            tunnel = by_id.get(tunnel_id)
+            if not tunnel:
+                await manager.stop_tunnel(tunnel_id, manual_disconnect=False)
+                manager.forget_tunnel(tunnel_id)
+                stopped.append(tunnel_id)
+            elif tunnel_id in manager.configs and manager.configs[tunnel_id] != tunnel_config(tunnel):
+                logger.info(f"Settings of tunnel {tunnel_id} changed, restarting it")
+                await manager.stop_tunnel(tunnel_id, manual_disconnect=False)
+                restarted.append(tunnel_id)
+        return stopped, restarted
+
+    def _mark_not_restored(self, tunnels: list[SSHTunnel]):
+        """
+        Mark disconnected the tunnels that were connected when the previous
+        run stopped, but are neither adopted, started nor waiting to
+        reconnect now.
+        """
+        manager = self.manager
+        for tunnel in tunnels:
+            if tunnel.is_connected and not (
+                manager.is_running_or_starting(tunnel.id) or manager.reconnects.is_pending(tunnel.id)
+            ):
+                manager.runtime.update(tunnel.id, is_connected=False, process_id=None)
+
+    async def _run(self):
+        while True:
+            await self._requested.wait()
+            self._requested.clear()
+            try:
+                with LOOP_DURATION_SECONDS.time("reconcile"):
+                    await self.reconcile()
+            except Exception as e:
+                LOOP_ERRORS.inc("reconcile")
+                logger.error(f"Error reconciling SSH tunnels: {e}")
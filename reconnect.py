@@ -0,0 +1,198 @@
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from loguru import logger
+
+# Delay of the first reconnect attempt, doubled on every failure
+RECONNECT_BASE_DELAY = 1.0
+# Upper bound for the delay between two attempts
+RECONNECT_MAX_DELAY = 300.0
+# Tunnels of a recovered host allowed to reconnect at once, doubled on every success
+RAMP_UP_INITIAL = 1
+RAMP_UP_MAX = 16
+
+
+def backoff_delay(attempt: int, base: float = RECONNECT_BASE_DELAY, cap: float = RECONNECT_MAX_DELAY) -> float:
+    """
+    Capped exponential backoff with full jitter.
+    """
+    return random.uniform(0, min(cap, base * 2 ** min(attempt, 32)))
+
+
+@dataclass
+class ReconnectEntry:
+    tunnel_id: str
+    host: str
+    attempt: int = 0
+    due_at: float = 0.0
+    in_flight: bool = False
+
+
+@dataclass
+class HostState:
+    failures: int = 0
+    retry_at: float = 0.0
+    ramp: int = RAMP_UP_INITIAL
+    in_flight: int = 0
+    tunnel_ids: set = field(default_factory=set)
+
+
+class ReconnectScheduler:
+    """
+    Central scheduler for tunnel reconnects.
+    Tunnels are grouped by remote host. While a host is failing only a single
+    tunnel probes it, with a backoff that grows per failed probe. Once a probe
+    succeeds the other tunnels of that host are released in batches that
+    double with every successful reconnect, instead of all at once.
+
+    `reconnect` is called with a tunnel id and returns True on success, False
+    on failure and None if the tunnel should no longer be reconnected.
+    """
+
+    def __init__(
+        self,
+        reconnect: Callable[[str], Awaitable[bool | None]],
+        base_delay: float = RECONNECT_BASE_DELAY,
+        max_delay: float = RECONNECT_MAX_DELAY,
+        ramp_up_initial: int = RAMP_UP_INITIAL,
+        ramp_up_max: int = RAMP_UP_MAX,
+    ):
+        self._reconnect = reconnect
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.ramp_up_initial = max(1, ramp_up_initial)
+        self.ramp_up_max = max(self.ramp_up_initial, ramp_up_max)
+        self.entries: dict[str, ReconnectEntry] = {}
+        self.hosts: dict[str, HostState] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        # running attempts, referenced so they are not garbage collected
+        self._attempts: set[asyncio.Task] = set()
+
+    def schedule(self, tunnel_id: str, host: str):
+        """
+        Queue a reconnect for the tunnel, unless one is already pending.
+        """
+        if tunnel_id in self.entries:
+            return
+        now = time.monotonic()
+        self.entries[tunnel_id] = ReconnectEntry(
+            tunnel_id=tunnel_id, host=host, due_at=now + backoff_delay(0, self.base_delay, self.max_delay)
+        )
+        host_state = self.hosts.setdefault(host, HostState(ramp=self.ramp_up_initial))
+        host_state.tunnel_ids.add(tunnel_id)
+        self._ensure_running()
+        self._wakeup.set()
+
+    def cancel(self, tunnel_id: str):
+        """
+        Drop a pending reconnect. An attempt already in flight finishes.
+        """
+        entry = self.entries.pop(tunnel_id, None)
+        if not entry:
+            return
+        host_state = self.hosts.get(entry.host)
+        if host_state:
+            host_state.tunnel_ids.discard(tunnel_id)
+        self._wakeup.set()
+
+    def is_pending(self, tunnel_id: str) -> bool:
+        return tunnel_id in self.entries
+
+    def get_state(self, tunnel_id: str) -> dict | None:
+        """
+        Backoff state of a tunnel waiting to reconnect, None if not pending.
+        """
+        entry = self.entries.get(tunnel_id)
+        if not entry:
+            return None
+        host_state = self.hosts[entry.host]
+        now = time.monotonic()
+        return {
+            "attempt": entry.attempt,
+            "in_flight": entry.in_flight,
+            "next_attempt_in": round(max(0.0, entry.due_at - now, host_state.retry_at - now), 3),
+            "host": entry.host,
+            "host_failures": host_state.failures,
+            "host_ramp": host_state.ramp,
+            "host_waiting": len(host_state.tunnel_ids),
+        }
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _ensure_running(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _allowed_in_flight(self, host_state: HostState) -> int:
+        return 1 if host_state.failures else host_state.ramp
+
+    async def _run(self):
+        while self.entries:
+            self._wakeup.clear()
+            now = time.monotonic()
+            next_wakeup: float | None = None
+
+            for entry in sorted(self.entries.values(), key=lambda e: e.due_at):
+                if entry.in_flight:
+                    continue
+                host_state = self.hosts[entry.host]
+                ready_at = max(entry.due_at, host_state.retry_at)
+                if ready_at > now:
+                    next_wakeup = ready_at if next_wakeup is None else min(next_wakeup, ready_at)
+                    continue
+                if host_state.in_flight >= self._allowed_in_flight(host_state):
+                    # woken up again when an attempt for this host completes
+                    continue
+                entry.in_flight = True
+                host_state.in_flight += 1
+                attempt = asyncio.create_task(self._attempt(entry))
+                self._attempts.add(attempt)
+                attempt.add_done_callback(self._attempts.discard)
+
+            timeout = None if next_wakeup is None else max(0.0, next_wakeup - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _attempt(self, entry: ReconnectEntry):
+        host_state = self.hosts[entry.host]
+        try:
+            result = await self._reconnect(entry.tunnel_id)
+        except Exception as e:
+            logger.error(f"Error reconnecting tunnel {entry.tunnel_id}: {e}")
+            result = False
+        finally:
+            entry.in_flight = False
+            host_state.in_flight -= 1
+
+        if (result is None or result) and self.entries.get(entry.tunnel_id) is entry:
+            self.cancel(entry.tunnel_id)
+        if result is None:
+            return
+
+        now = time.monotonic()
+        if result:
+            if host_state.failures:
+                logger.info(f"Remote host {entry.host} reachable again, ramping up reconnects")
+            host_state.failures = 0
+            host_state.retry_at = 0.0
+            host_state.ramp = min(host_state.ramp * 2, self.ramp_up_max)
+        else:
+            host_state.failures += 1
+            host_state.ramp = self.ramp_up_initial
+            host_state.retry_at = now + backoff_delay(host_state.failures, self.base_delay, self.max_delay)
+            entry.attempt += 1
+            entry.due_at = now + backoff_delay(entry.attempt, self.base_delay, self.max_delay)
+            logger.warning(
+                f"Reconnect of tunnel {entry.tunnel_id} failed (attempt {entry.attempt}), "
+                f"host {entry.host} retry in {round(host_state.retry_at - now, 1)}s"
+            )
+        self._wakeup.set()
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from collections.abc import Callable
+
+from loguru import logger
+
+from .crud import get_tunnel_runtimes, upsert_tunnel_runtimes
+from .models import TunnelRuntime
+
+# Seconds changes are collected before they are written together
+FLUSH_WINDOW = 0.25
+# Seconds to wait before retrying a failed write
+FLUSH_RETRY_DELAY = 5.0
+
+
+class RuntimeStore:
+    """
+    Runtime state of every tunnel (connected, PID, last error, start time,
+    reconnect count), held in memory and persisted to `tunnel_runtime`
+    by a write-behind queue.
+
+    `update` only queues a tunnel when a value actually changes; further
+    changes within `flush_window` seconds are merged into the queued
+    state, so a flapping tunnel or a stop followed by its cleanup costs a
+    single row write. Each flush writes everything queued in batched
+    upserts over one connection. Tunnels whose write failed stay queued,
+    `on_error` is called and the flush is retried after
+    `FLUSH_RETRY_DELAY` seconds. `close` flushes synchronously.
+    """
+
+    def __init__(self, flush_window: float = FLUSH_WINDOW, on_error: Callable[[], None] | None = None):
+        self.flush_window = flush_window
+        self.on_error = on_error
+        self.states: dict[str, TunnelRuntime] = {}
+        self.writes = 0
+        self.skipped = 0
+        self.merged = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush_duration: float | None = None
+        self.max_flush_duration = 0.0
+        self._dirty: dict[str, TunnelRuntime] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    async def load(self):
+        """
+        Take over the state persisted by the previous run.
+        """
+        self.states = {runtime.tunnel_id: runtime for runtime in await get_tunnel_runtimes()}
+        self._dirty.clear()
+
+    def get(self, tunnel_id: str) -> TunnelRuntime:
+        return self.states.get(tunnel_id) or TunnelRuntime(tunnel_id=tunnel_id)
+
+    def update(self, tunnel_id: str, **changes) -> bool:
+        """
+        Apply `changes` to the runtime state of a tunnel and queue it for
+        writing. Returns False, and queues nothing, if nothing changed.
+        """
+        current = self.get(tunnel_id)
+        updated = current.copy(update=changes)
+        if updated == current:
+            self.skipped += 1
+            return False
+        self.states[tunnel_id] = updated
+        if tunnel_id in self._dirty:
+            self.merged += 1
+        self._dirty[tunnel_id] = updated
+        self._schedule(self.flush_window)
+        return True
+
+    def forget(self, tunnel_id: str):
+        self.states.pop(tunnel_id, None)
+        self._dirty.pop(tunnel_id, None)
+
+    def is_dirty(self, tunnel_id: str) -> bool:
+        return tunnel_id in self._dirty
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    async def flush(self):
+        """
+        Write every queued tunnel now.
+        Raises if a write fails; the tunnels stay queued.
+        """
+        async with self._lock:
+            if not self._dirty:
+                return
+            queued = dict(self._dirty)
+            started_at = time.monotonic()
+            await upsert_tunnel_runtimes(list(queued.values()))
+            for tunnel_id, runtime in queued.items():
+                # changed again while it was written, keep it queued
+                if self._dirty.get(tunnel_id) is runtime:
+                    del self._dirty[tunnel_id]
+            self.writes += len(queued)
+            duration = time.monotonic() - started_at
+            self.flushes += 1
+            self.last_flush_duration = duration
+            self.max_flush_duration = max(self.max_flush_duration, duration)
+            logger.debug(f"Wrote runtime state of {len(queued)} tunnels in {duration * 1000:.1f}ms")
+
+    async def close(self):
+        """
+        Stop the write-behind task and write what is still queued.
+        """
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "tunnels": len(self.states),
+            "queue_depth": self.pending,
+            "writes": self.writes,
+            "skipped": self.skipped,
+            "merged": self.merged,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "last_flush_duration": self.last_flush_duration,
+            "max_flush_duration": self.max_flush_duration,
+        }
+
+    def _schedule(self, delay: float):
+        if self._task and not self._task.done():
+            return
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._flush_later(delay))
+        except RuntimeError:
+            # no event loop, e.g. in synchronous tests; flush() writes it
+            self._task = None
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.flush()
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to write tunnel runtime state, retrying in {FLUSH_RETRY_DELAY}s: {e}")
+            if self.on_error:
+                self.on_error()
+            self._task = None
+            self._schedule(FLUSH_RETRY_DELAY)
+            return
+        self._task = None
+        # changes queued while writing
+        if self._dirty:
+            self._schedule(self.flush_window)
@@ -1,21 +1,41 @@
 from lnbits.core.models import Payment
 from lnbits.core.services import create_invoice
+from lnbits.db import Filters, Page
+from lnbits.utils.exchange_rates import allowed_currencies
 from loguru import logger
 
 from .crud import (
     create_client_data,
     create_extension_settings,  #  
     get_client_data_by_id,
+    get_client_data_paginated,
     get_extension_settings,  #  
     get_owner_data_by_id,
+    get_owner_data_paginated,
+    get_ssh_tunnels_paginated,
     update_client_data,
     update_extension_settings,  #  
 )
 from .models import (
+    ClientData,
+    ClientDataFilters,
     CreateClientData,
     ExtensionSettings,  #  
+    OwnerData,
+    OwnerDataFilters,
+    SSHTunnelFilters,
+    SSHTunnelSummary,
 )
 
+# List sections of the dashboard: row model, filter model and the sort
+# order of the first page, the same as the tables on the extension page
+DASHBOARD_LISTS = {
+    "owner_data": (OwnerData, OwnerDataFilters, "updated_at", "desc"),
+    "client_data": (ClientData, ClientDataFilters, "updated_at", "desc"),
+    "ssh_tunnels": (SSHTunnelSummary, SSHTunnelFilters, "created_at", "desc"),
+}
+DASHBOARD_SECTIONS = ("currencies", *DASHBOARD_LISTS)
+
 
 
 
@@ -41,3 +61,57 @@ async def update_settings(user_id: str, data: ExtensionSettings) -> ExtensionSet
     return settings
 
 
+async def get_dashboard(
+    user_id: str,
+    wallet_id: str,
+    limit: int = 10,
+    sections: list[str] | None = None,
+    fields: dict[str, list[str]] | None = None,
+) -> dict:
+    """
+    Everything the extension page shows on load in one response: the
+    currencies and the first page of every list.
+    Only `sections` are included (default all); `fields` maps a list
+    section to the row fields to return, the others return whole rows.
+
+    Raises ValueError for an unknown section or field.
+    """
+    sections = list(sections or DASHBOARD_SECTIONS)
+    fields = fields or {}
+    for section in [*sections, *fields]:
+        if section not in DASHBOARD_SECTIONS:
+            raise ValueError(f"Unknown dashboard section: {section}")
+    for section, names in fields.items():
+        model = DASHBOARD_LISTS[section][0] if section in DASHBOARD_LISTS else None
+        unknown = [name for name in names if not model or name not in model.__fields__]
+        if unknown:
+            raise ValueError(f"Unknown fields for {section}: {', '.join(unknown)}")
+
+    loaders = {
+        "owner_data": lambda filters: get_owner_data_paginated(user_id=user_id, filters=filters),
+        "client_data": lambda filters: get_client_data_paginated(user_id=user_id, filters=filters),
+        "ssh_tunnels": lambda filters: get_ssh_tunnels_paginated(wallet_id=wallet_id, filters=filters),
+    }
+    lists = [section for section in sections if section in DASHBOARD_LISTS]
+    # one after another: lnbits' Database.connect() holds a lock per
+    # database on every backend, so gathering them would not overlap
+    pages: list[Page] = []
+    for section in lists:
+        filters = Filters(
+            limit=limit,
+            sortby=DASHBOARD_LISTS[section][2],
+            direction=DASHBOARD_LISTS[section][3],
+            model=DASHBOARD_LISTS[section][1],
+        )
+        pages.append(await loaders[section](filters))
+
+    dashboard: dict = {}
+    if "currencies" in sections:
+        dashboard["currencies"] = allowed_currencies()
+    for section, page in zip(lists, pages, strict=True):
+        include = set(fields[section]) if section in fields else None
+        dashboard[section] = {
+            "data": [row.dict(include=include) for row in page.data],
+            "total": page.total,
+        }
+    return dashboard
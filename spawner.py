@@ -0,0 +1,207 @@
+import asyncio
+import itertools
+import json
+import os
+import signal
+import sys
+
+from loguru import logger
+
+HELPER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spawner_helper.py")
+# Spawn ssh children through the helper instead of forking LNbits
+USE_SPAWNER = True
+
+
+class SpawnedProcess:
+    """
+    A child of the spawner helper, with the parts of the
+    asyncio.subprocess.Process interface the tunnel backends use.
+    """
+
+    def __init__(self, spawner: "ProcessSpawner", request_id: int, adoptable: bool = False):
+        self._spawner = spawner
+        self.request_id = request_id
+        self.pid: int | None = None
+        self.returncode: int | None = None
+        # like a Process without pipes, an adoptable child has no streams
+        self.stdout: asyncio.StreamReader | None = None if adoptable else asyncio.StreamReader()
+        self.stderr: asyncio.StreamReader | None = None if adoptable else asyncio.StreamReader()
+        self.spawned: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._exited = asyncio.Event()
+
+    async def wait(self) -> int:
+        await self._exited.wait()
+        assert self.returncode is not None
+        return self.returncode
+
+    async def communicate(self):
+        stdout = await self.stdout.read() if self.stdout else None
+        stderr = await self.stderr.read() if self.stderr else None
+        await self.wait()
+        return stdout, stderr
+
+    def send_signal(self, sig: int):
+        if self.returncode is not None:
+            return
+        self._spawner.send({"op": "signal", "id": self.request_id, "signal": int(sig)})
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def exited(self, returncode: int):
+        self.returncode = returncode
+        for stream in (self.stdout, self.stderr):
+            if stream:
+                stream.feed_eof()
+        self._exited.set()
+
+
+class ProcessSpawner:
+    """
+    Long-lived helper process that launches and reaps ssh children.
+    LNbits is forked once to start it; after that every (re)start of a
+    tunnel only forks the tiny helper. Output and exit events stream back
+    over its stdout.
+    """
+
+    def __init__(self):
+        self.process: asyncio.subprocess.Process | None = None
+        self.children: dict[int, SpawnedProcess] = {}
+        self._ids = itertools.count(1)
+        self._reader: asyncio.Task | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start(self):
+        if self.is_running:
+            return
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-I",
+            "-S",
+            HELPER_PATH,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        self._reader = asyncio.create_task(self._read_events(self.process))
+        logger.info(f"SSH process spawner started with PID {self.process.pid}")
+
+    async def stop(self):
+        """
+        Shut the helper down; it kills its remaining children before exiting.
+        """
+        process = self.process
+        if not process:
+            return
+        if self.is_running:
+            self.send({"op": "shutdown"})
+        self.process = None
+        if process.stdin:
+            process.stdin.close()
+        try:
+            await asyncio.wait_for(process.wait(), timeout=10.0)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+        if self._reader:
+            await self._reader
+
+    async def spawn(self, *argv: str, adoptable: bool = False) -> SpawnedProcess:
+        """
+        Start `argv` through the helper and wait until it has a PID.
+        An `adoptable` child is left running if LNbits goes away without
+        stopping the helper, every other child is killed then. Its output
+        goes to /dev/null, see spawner_helper.
+        Raises OSError (e.g. FileNotFoundError) like create_subprocess_exec.
+        """
+        request_id = next(self._ids)
+        child = SpawnedProcess(self, request_id, adoptable)
+        self.children[request_id] = child
+        self.send({"op": "spawn", "id": request_id, "argv": list(argv), "adoptable": adoptable})
+        await child.spawned
+        return child
+
+    def send(self, request: dict):
+        if not self.is_running:
+            raise ConnectionError("SSH process spawner is not running")
+        assert self.process and self.process.stdin
+        self.process.stdin.write((json.dumps(request) + "\n").encode())
+
+    async def _read_events(self, process: asyncio.subprocess.Process):
+        assert process.stdout
+        while True:
+            try:
+                line = await process.stdout.readline()
+            except ValueError:
+                continue
+            if not line:
+                break
+            try:
+                self._dispatch(json.loads(line))
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Invalid event from SSH process spawner: {e}")
+
+        await process.wait()
+        if self.process is process:
+            logger.warning(f"SSH process spawner exited with code {process.returncode}")
+            self.process = None
+        # children are no longer watched, and can only be adopted after a restart
+        for child in list(self.children.values()):
+            if not child.spawned.done():
+                child.spawned.set_exception(ConnectionError("SSH process spawner exited"))
+            child.exited(255)
+        self.children.clear()
+
+    def _dispatch(self, event: dict):
+        child = self.children.get(event.get("id"))  # type: ignore[arg-type]
+        if not child:
+            if event["event"] == "error":
+                logger.warning(f"SSH process spawner: {event['message']}")
+            return
+        kind = event["event"]
+        if kind == "output":
+            stream = child.stderr if event["stream"] == "stderr" else child.stdout
+            if stream:
+                stream.feed_data(event["line"].encode())
+        elif kind == "spawned":
+            child.pid = event["pid"]
+            child.spawned.set_result(None)
+        elif kind == "error":
+            self.children.pop(child.request_id, None)
+            child.spawned.set_exception(OSError(event["errno"], event["message"]))
+        elif kind == "exit":
+            self.children.pop(child.request_id, None)
+            child.exited(event["returncode"])
+            logger.debug(f"SSH process {child.pid} exited with code {event['returncode']}")
+
+
+ChildProcess = asyncio.subprocess.Process | SpawnedProcess
+
+process_spawner = ProcessSpawner()
+
+
+async def spawn_process(*argv: str, adoptable: bool = False) -> ChildProcess:
+    """
+    Start a child process with piped stdout and stderr, through the spawner
+    helper when it is running and by forking LNbits directly otherwise.
+    Only `adoptable` children are meant to outlive LNbits; they get no pipes
+    and have to write their output to a file, see spawner_helper.
+    """
+    if USE_SPAWNER and process_spawner.is_running:
+        try:
+            return await process_spawner.spawn(*argv, adoptable=adoptable)
+        except ConnectionError as e:
+            logger.warning(f"Falling back to direct spawn: {e}")
+    output = asyncio.subprocess.DEVNULL if adoptable else asyncio.subprocess.PIPE
+    return await asyncio.create_subprocess_exec(
+        *argv,
+        stdin=asyncio.subprocess.DEVNULL if adoptable else None,
+        stdout=output,
+        stderr=output,
+        start_new_session=adoptable,
+    )
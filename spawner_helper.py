@@ -0,0 +1,160 @@
+"""
+Standalone process spawner, run by spawner.ProcessSpawner with
+`python -I -S spawner_helper.py`. It only imports the standard library so
+that forking it for every ssh child is cheap, unlike forking LNbits itself.
+
+Requests are JSON lines on stdin:
+    {"op": "spawn", "id": 1, "argv": ["ssh", ...], "adoptable": true}
+    {"op": "signal", "id": 1, "signal": 15}
+    {"op": "shutdown"}
+Events are JSON lines on stdout:
+    {"event": "spawned", "id": 1, "pid": 1234}
+    {"event": "error", "id": 1, "errno": 2, "message": "..."}
+    {"event": "output", "id": 1, "stream": "stderr", "line": "..."}
+    {"event": "exit", "id": 1, "returncode": 255}
+On shutdown all children are killed and the helper exits.
+
+If stdin is closed without a shutdown, LNbits went away unexpectedly. Only
+children spawned as `adoptable` (the ssh process of a single tunnel, which
+the next start of LNbits adopts or stops) are then left running, on
+purpose. Every other child is killed, as nothing would ever reap it; those
+also get SIGTERM from the kernel if the helper itself is killed.
+
+An adoptable child gets /dev/null as stdin, stdout and stderr and its own
+session, and has to write its output to a file itself (`ssh -E`). A pipe
+to the helper would break when the helper exits, and the child's next
+write would kill it with SIGPIPE, so there would be nothing to adopt.
+"""
+
+import asyncio
+import ctypes
+import json
+import os
+import signal
+import sys
+
+PR_SET_PDEATHSIG = 1
+
+children: dict = {}
+adoptable_ids: set = set()
+
+
+def emit(event: dict):
+    sys.stdout.write(json.dumps(event) + "\n")
+    sys.stdout.flush()
+
+
+def die_with_parent():
+    """
+    Ask Linux to SIGTERM the child if this helper dies, so children that
+    can not be adopted are not left behind when the helper is killed.
+    """
+    try:
+        ctypes.CDLL(None).prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+    except (AttributeError, OSError):
+        pass
+
+
+async def relay(request_id: int, stream: asyncio.StreamReader, name: str):
+    while True:
+        try:
+            line = await stream.readline()
+        except ValueError:
+            continue
+        if not line:
+            return
+        emit({"event": "output", "id": request_id, "stream": name, "line": line.decode(errors="replace")})
+
+
+async def run_child(request_id: int, argv: list, adoptable: bool):
+    # an adoptable child has to survive the helper, see the module docstring
+    preexec_fn = die_with_parent if sys.platform.startswith("linux") and not adoptable else None
+    output = asyncio.subprocess.DEVNULL if adoptable else asyncio.subprocess.PIPE
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=output,
+            stderr=output,
+            preexec_fn=preexec_fn,
+            start_new_session=adoptable,
+        )
+    except OSError as e:
+        emit({"event": "error", "id": request_id, "errno": e.errno, "message": str(e)})
+        return
+
+    children[request_id] = process
+    if adoptable:
+        adoptable_ids.add(request_id)
+    emit({"event": "spawned", "id": request_id, "pid": process.pid})
+    relays = [
+        relay(request_id, stream, name)
+        for stream, name in ((process.stdout, "stdout"), (process.stderr, "stderr"))
+        if stream
+    ]
+    await asyncio.gather(*relays, process.wait())
+    children.pop(request_id, None)
+    adoptable_ids.discard(request_id)
+    emit({"event": "exit", "id": request_id, "returncode": process.returncode})
+
+
+def handle(request: dict, tasks: set) -> bool:
+    """
+    Handle one request, returns False on shutdown.
+    """
+    op = request.get("op")
+    if op == "spawn":
+        task = asyncio.create_task(run_child(request["id"], request["argv"], bool(request.get("adoptable"))))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    elif op == "signal":
+        process = children.get(request["id"])
+        if process and process.returncode is None:
+            try:
+                process.send_signal(request["signal"])
+            except ProcessLookupError:
+                pass
+    elif op == "shutdown":
+        return False
+    return True
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    tasks: set = set()
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            # LNbits went away without a shutdown: keep the adoptable
+            # children running for the next start, stop everything else
+            await kill_children([request_id for request_id in children if request_id not in adoptable_ids])
+            sys.stdout.flush()
+            os._exit(0)
+        try:
+            if not handle(json.loads(line), tasks):
+                break
+        except (ValueError, KeyError, TypeError) as e:
+            emit({"event": "error", "id": None, "errno": None, "message": f"bad request: {e}"})
+
+    await kill_children(list(children))
+    if tasks:
+        await asyncio.wait(tasks, timeout=5)
+
+
+async def kill_children(request_ids: list):
+    """
+    Kill the children of `request_ids` and wait for them to exit.
+    """
+    processes = [children[request_id] for request_id in request_ids if children[request_id].returncode is None]
+    for process in processes:
+        process.kill()
+    if processes:
+        await asyncio.wait([asyncio.create_task(process.wait()) for process in processes], timeout=5)
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(main())
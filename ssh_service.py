@@ -1,91 +1,850 @@
 import asyncio
-import signal
 import os
-from typing import Dict, Optional
+import signal
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
 from loguru import logger
 
-from .models import SSHTunnel
-from .crud import get_ssh_tunnel_by_id, update_ssh_tunnel_connection_status
-from .helpers import save_private_key_to_temp_file, cleanup_temp_key_file, decrypt_private_key
+from .crud import get_ssh_tunnel_by_id
+from .events import tunnel_events
+from .helpers import cleanup_temp_key_file, decrypt_private_key, save_private_key_to_temp_file
+from .metrics import TUNNEL_FAILURES, TUNNEL_READY_SECONDS, TUNNEL_RECONNECTS, TUNNEL_STARTS, metrics
+from .models import SSHTunnel, SSHTunnelLogEntry
+from .reconciler import TunnelReconciler, tunnel_config
+from .reconnect import ReconnectScheduler
+from .runtime import RuntimeStore
+from .spawner import ChildProcess, process_spawner, spawn_process
+from .supervisor import TunnelState, TunnelSupervisor
+
+# Maximum number of tunnels brought up at the same time by start_tunnels()
+STARTUP_CONCURRENCY = 16
+# Maximum number of simultaneous handshakes against a single remote host
+STARTUP_PER_HOST_CONCURRENCY = 4
+# Seconds to wait for the remote forward to be established before giving up
+READY_TIMEOUT = 20.0
+
+# `ssh -v` prints one of these once the server has accepted the -R forward
+FORWARD_READY_MARKERS = (
+    "remote forward success",
+    "All remote forwarding requests processed",
+)
+
+# Number of ssh output lines kept in memory per tunnel
+LOG_BUFFER_SIZE = 500
+# Longer lines are truncated before they are stored
+LOG_LINE_MAX_LENGTH = 1024
+# An ssh log file is emptied once it was read past this many bytes
+LOG_FILE_MAX_SIZE = 1024 * 1024
+# Seconds between reads of an ssh log file while the forward is not ready
+# yet, and after
+LOG_POLL_INTERVAL = 0.05
+LOG_POLL_INTERVAL_READY = 1.0
+# Host the remote forwards connect to on this side
+LOCAL_FORWARD_HOST = "lnbits.embassy"
+# Seconds all tunnels together get to exit after SIGTERM on shutdown
+SHUTDOWN_DEADLINE = 10.0
+# Seconds to wait for tunnels to exit after SIGKILL
+SHUTDOWN_KILL_TIMEOUT = 2.0
+# Error messages in tunnel statuses are cut to this length
+STATUS_ERROR_EXCERPT = 200
+LOG_ERROR_WORDS = (
+    "error", "denied", "refused", "failed", "failure", "fatal", "timed out", "could not", "broken pipe",
+    "not responding",
+)
+
+
+def interleave_by_host(tunnels: list[SSHTunnel]) -> list[SSHTunnel]:
+    """
+    Order tunnels round-robin by remote host, keeping the original order
+    within each host. A server with many tunnels then cannot delay the
+    first tunnel of every other server.
+    """
+    by_host: dict[str, list[SSHTunnel]] = defaultdict(list)
+    for tunnel in tunnels:
+        by_host[tunnel.remote_server_url].append(tunnel)
+
+    ordered: list[SSHTunnel] = []
+    queues = list(by_host.values())
+    for i in range(max((len(q) for q in queues), default=0)):
+        ordered.extend(q[i] for q in queues if i < len(q))
+    return ordered
+
+
+def ssh_options(key_file_path: str) -> list[str]:
+    """
+    Options shared by every ssh connection made for a tunnel.
+    """
+    return [
+        "-o", "StrictHostKeyChecking=no",
+        "-o", "UserKnownHostsFile=/dev/null",
+        "-o", "ServerAliveInterval=30",
+        "-o", "ServerAliveCountMax=3",
+        "-o", "ConnectTimeout=10",
+        "-o", "ExitOnForwardFailure=yes",
+        "-i", key_file_path,
+    ]
+
+
+def forward_spec(tunnel: SSHTunnel, local_host: str = LOCAL_FORWARD_HOST) -> str:
+    """
+    The -R argument for the remote forward of a tunnel.
+    """
+    return f"127.0.0.1:{tunnel.remote_port}:{local_host}:{tunnel.local_port}"
+
+
+def tunnel_endpoint(tunnel: SSHTunnel) -> str:
+    """
+    The ssh destination of a tunnel. A `host:port` server url is passed as
+    an ssh:// URI, which is the only destination form that carries a port.
+    """
+    if tunnel.remote_server_url.count(":") == 1:
+        return f"ssh://{tunnel.remote_server_user}@{tunnel.remote_server_url}"
+    return f"{tunnel.remote_server_user}@{tunnel.remote_server_url}"
+
+
+def run_in_background(tasks: set[asyncio.Task], coro) -> asyncio.Task:
+    """
+    Run `coro` as a task kept in `tasks` until it is done, so it cannot be
+    garbage collected while it is still running.
+    """
+    task = asyncio.create_task(coro)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+
+def parse_log_level(line: str) -> str:
+    """
+    Map a line of ssh output to a log level.
+    """
+    if line.startswith("debug"):
+        return "debug"
+    lowered = line.lower()
+    if lowered.startswith("warning"):
+        return "warning"
+    if any(word in lowered for word in LOG_ERROR_WORDS):
+        return "error"
+    return "info"
+
+
+def create_ssh_log_file(key_file_path: str) -> str:
+    """
+    Create the file the ssh process of a tunnel writes its output to with
+    `-E`, next to its temporary key file and readable by us only.
+    """
+    log_file_path = key_file_path.removesuffix(".key") + ".log"
+    os.close(os.open(log_file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+    return log_file_path
+
+
+class TunnelLog:
+    """
+    Fixed-size ring buffer of the ssh output of one tunnel.
+    Readers drain stdout and stderr, or follow the log file ssh writes, for
+    the lifetime of the process, so ssh never blocks on a full pipe, and
+    `forward_ready` is set as soon as ssh reports the remote forward as
+    established. Error lines after that are passed to `on_error`.
+    """
+
+    def __init__(self, size: int = LOG_BUFFER_SIZE, on_error: Callable[[str], None] | None = None):
+        self.entries: deque[tuple[float, str, str, str]] = deque(maxlen=size)
+        self.forward_ready = asyncio.Event()
+        self.on_error = on_error
+        self._readers: list[asyncio.Task] = []
+
+    def attach(self, process: ChildProcess):
+        """
+        Start draining the output streams of a (new) ssh process.
+        """
+        self.forward_ready.clear()
+        self._readers = [
+            asyncio.create_task(self._drain(stream, name))
+            for stream, name in ((process.stdout, "stdout"), (process.stderr, "stderr"))
+            if stream
+        ]
+
+    def follow(self, path: str, running: Callable[[], bool], adopted: bool = False):
+        """
+        Start reading the log file an ssh process writes with `-E`, until
+        `running` returns False. For an `adopted` process only new lines
+        are read, and its forward is ready already.
+        """
+        self.forward_ready.clear()
+        if adopted:
+            self.forward_ready.set()
+        self._readers = [asyncio.create_task(self._follow(path, running, adopted))]
+
+    async def drained(self):
+        """
+        Wait until all output of the attached process has been read.
+        """
+        await asyncio.gather(*self._readers, return_exceptions=True)
+
+    def append(self, stream: str, line: str):
+        line = line[:LOG_LINE_MAX_LENGTH]
+        level = parse_log_level(line)
+        self.entries.append((time.time(), stream, level, line))
+        if any(marker in line for marker in FORWARD_READY_MARKERS):
+            self.forward_ready.set()
+        elif level == "error" and self.on_error and self.forward_ready.is_set():
+            self.on_error(line)
+
+    def tail(self, limit: int = LOG_BUFFER_SIZE, level: str | None = None) -> list[SSHTunnelLogEntry]:
+        entries = [e for e in self.entries if level is None or e[2] == level]
+        return [
+            SSHTunnelLogEntry(
+                timestamp=datetime.fromtimestamp(ts, timezone.utc),
+                stream=stream,
+                level=entry_level,
+                message=message,
+            )
+            for ts, stream, entry_level, message in entries[-limit:]
+        ]
+
+    async def _drain(self, stream: asyncio.StreamReader, name: str):
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # line longer than the stream buffer limit, the chunk is dropped
+                continue
+            if not line:
+                return
+            self.append(name, line.decode(errors="replace").rstrip())
+
+    async def _follow(self, path: str, running: Callable[[], bool], adopted: bool):
+        try:
+            f = open(path, "rb")
+        except OSError as e:
+            self.append("manager", f"Can not read the ssh log file: {e}")
+            return
+        with f:
+            if adopted:
+                f.seek(0, os.SEEK_END)
+            partial = b""
+            while True:
+                # read once more after the exit, for the last lines
+                alive = running()
+                lines = (partial + f.read()).split(b"\n")
+                partial = lines.pop()
+                for line in lines:
+                    self.append("stderr", line.decode(errors="replace").rstrip())
+                if f.tell() > LOG_FILE_MAX_SIZE:
+                    # ssh appends (O_APPEND), so it carries on at the start;
+                    # lines written since the read above are lost
+                    os.truncate(path, 0)
+                    f.seek(0)
+                if not alive:
+                    break
+                await asyncio.sleep(LOG_POLL_INTERVAL_READY if self.forward_ready.is_set() else LOG_POLL_INTERVAL)
+            if partial:
+                self.append("stderr", partial.decode(errors="replace").rstrip())
+
+
+async def wait_for_forward_ready(process: ChildProcess, log: TunnelLog, timeout: float) -> None:
+    """
+    Wait until the remote forward of `process` is reported as established.
+    Raises RuntimeError with the recent output if ssh exits first or the
+    forward is not ready within `timeout` seconds.
+    """
+    ready = asyncio.create_task(log.forward_ready.wait())
+    exited = asyncio.create_task(process.wait())
+    try:
+        await asyncio.wait({ready, exited}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        ready.cancel()
+        exited.cancel()
+
+    if log.forward_ready.is_set():
+        return
+
+    if process.returncode is None:
+        raise RuntimeError(
+            f"Remote forward not ready after {timeout}s: " + "\n".join(e.message for e in log.tail(10))
+        )
+
+    await log.drained()
+    raise RuntimeError(
+        f"SSH connection failed (exit code {process.returncode}): "
+        + "\n".join(e.message for e in log.tail(20) if e.level != "debug")
+    )
+
+
+def read_ssh_cmdline(pid: int) -> list[str] | None:
+    """
+    Read the command line of `pid` from /proc if it is an ssh client this
+    extension started: owned by us, run with `-N` and one of our temporary
+    key files. Returns None otherwise, e.g. when the PID was reused.
+    """
+    try:
+        if os.stat(f"/proc/{pid}").st_uid != os.getuid():
+            return None
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            argv = f.read().decode(errors="replace").split("\0")[:-1]
+    except OSError:
+        return None
+
+    if not argv or os.path.basename(argv[0]) != "ssh" or "-N" not in argv or "-i" not in argv[:-1]:
+        return None
+    key_file_path = argv[argv.index("-i") + 1]
+    if os.path.dirname(key_file_path) != tempfile.gettempdir() or not key_file_path.endswith(".key"):
+        return None
+    return argv
+
+
+async def wait_for_pid_exit(pid: int, timeout: float | None = None) -> bool:
+    """
+    Wait until a process that is not our child is gone.
+    Uses a pidfd where available, polling otherwise.
+    Returns False on timeout.
+    """
+    try:
+        pidfd = os.pidfd_open(pid)
+    except ProcessLookupError:
+        return True
+    except (AttributeError, OSError):
+        pidfd = None
+
+    if pidfd is not None:
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+        try:
+            await asyncio.wait_for(exited, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while deadline is None or time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        await asyncio.sleep(0.5)
+    return False
+
+
+async def kill_orphan_process(pid: int, timeout: float = 5.0):
+    """
+    Terminate a leftover ssh process, killing it if it does not exit in time.
+    """
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            return
+        if await wait_for_pid_exit(pid, timeout):
+            return
+
+
+class TunnelHandle(ABC):
+    """
+    A running remote forward, as returned by `TunnelBackend.open`.
+    """
+
+    backend = ""
+
+    @property
+    def pid(self) -> int | None:
+        return None
+
+    @property
+    @abstractmethod
+    def exit_code(self) -> int | None:
+        """
+        None while the forward is up, the exit code once it is gone.
+        """
+
+    @abstractmethod
+    async def wait(self):
+        """
+        Wait until the forward is gone, for whatever reason.
+        """
+
+    @abstractmethod
+    async def terminate(self):
+        """
+        Ask the forward to shut down gracefully.
+        """
+
+    def kill(self):
+        """
+        Force the forward down after `terminate` did not work in time.
+        Nothing to do by default.
+        """
+        return
+
+    def release(self):
+        """
+        Free local resources once the forward is gone.
+        Nothing to do by default.
+        """
+        return
+
+    def stats(self) -> dict:
+        return {}
+
+
+class TunnelBackend(ABC):
+    """
+    A way of running the remote forward of a tunnel.
+    """
+
+    name = ""
+
+    @abstractmethod
+    async def open(self, tunnel: SSHTunnel, log: TunnelLog) -> TunnelHandle:
+        """
+        Establish the remote forward of `tunnel`, writing output to `log`.
+        Returns once the forward is usable, raises if it could not be opened.
+        """
+
+    def adopt(self, tunnel: SSHTunnel, pid: int, argv: list[str], log: TunnelLog) -> TunnelHandle | None:
+        """
+        Take over the forward of `tunnel` still run by the ssh process `pid`
+        (command line `argv`) from before a restart of LNbits, writing its
+        further output to `log`.
+        Returns None if the process does not match the tunnel's configuration.
+        """
+        return None
+
+    async def close(self):
+        """
+        Release shared resources of the backend on shutdown.
+        Nothing to do by default.
+        """
+        return
+
+
+class ProcessHandle(TunnelHandle):
+    """
+    A forward run by its own `ssh` process.
+    """
+
+    backend = "openssh"
+
+    def __init__(self, process: ChildProcess, key_file_path: str, log_file_path: str | None = None):
+        self.process = process
+        self.key_file_path = key_file_path
+        self.log_file_path = log_file_path
+
+    @property
+    def pid(self) -> int | None:
+        return self.process.pid
+
+    @property
+    def exit_code(self) -> int | None:
+        return self.process.returncode
+
+    async def wait(self):
+        await self.process.wait()
+
+    async def terminate(self):
+        if self.process.returncode is None:
+            self.process.terminate()
+
+    def kill(self):
+        if self.process.returncode is None:
+            self.process.kill()
+
+    def release(self):
+        cleanup_temp_key_file(self.key_file_path)
+        if self.log_file_path:
+            cleanup_temp_key_file(self.log_file_path)
+
+
+class AdoptedProcessHandle(TunnelHandle):
+    """
+    A forward run by an `ssh` process left over from a previous run of
+    LNbits. It is not our child, so it is watched and signalled by PID; its
+    output is still read from its log file.
+    """
+
+    backend = "openssh"
+
+    def __init__(self, pid: int, key_file_path: str, log_file_path: str | None):
+        self._pid = pid
+        self.key_file_path = key_file_path
+        self.log_file_path = log_file_path
+        self._exit_code: int | None = None
+
+    @property
+    def is_running(self) -> bool:
+        try:
+            os.kill(self._pid, 0)
+        except ProcessLookupError:
+            return False
+        return self._exit_code is None
+
+    @property
+    def pid(self) -> int | None:
+        return self._pid
+
+    @property
+    def exit_code(self) -> int | None:
+        # the real exit status is only reported to the parent process
+        return self._exit_code
+
+    async def wait(self):
+        await wait_for_pid_exit(self._pid)
+        if self._exit_code is None:
+            self._exit_code = -1
+
+    async def terminate(self):
+        os.kill(self._pid, signal.SIGTERM)
+
+    def kill(self):
+        try:
+            os.kill(self._pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def release(self):
+        cleanup_temp_key_file(self.key_file_path)
+        if self.log_file_path:
+            cleanup_temp_key_file(self.log_file_path)
+
+
+class OpenSSHBackend(TunnelBackend):
+    """
+    Runs forwards with the OpenSSH client, one `ssh` process per tunnel.
+    """
+
+    name = "openssh"
+
+    def __init__(self, ready_timeout: float, local_host: str):
+        self.ready_timeout = ready_timeout
+        self.local_host = local_host
+
+    async def open(self, tunnel: SSHTunnel, log: TunnelLog) -> TunnelHandle:
+        key_file_path = save_private_key_to_temp_file(decrypt_private_key(tunnel.private_key))
+        log_file_path = None
+        try:
+            log_file_path = create_ssh_log_file(key_file_path)
+            ssh_command = [
+                "ssh",
+                "-N",
+                "-v",  # Add verbose output for debugging
+                # to a file, not a pipe: a pipe dies with whoever reads it,
+                # and ssh with it (SIGPIPE), which an adopted ssh must outlive
+                "-E", log_file_path,
+                *ssh_options(key_file_path),
+                "-R", forward_spec(tunnel, self.local_host),
+                tunnel_endpoint(tunnel),
+            ]
+
+            logger.info(f"Starting SSH tunnel: {' '.join(ssh_command)}")
+            logger.info(f"Using public key: {tunnel.public_key}")
+
+            # adopted by the next run if LNbits goes away without a shutdown
+            process = await spawn_process(*ssh_command, adoptable=True)
+            log.follow(log_file_path, lambda: process.returncode is None)
+
+            try:
+                await wait_for_forward_ready(process, log, self.ready_timeout)
+            except RuntimeError:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                raise
+        except BaseException:
+            cleanup_temp_key_file(key_file_path)
+            if log_file_path:
+                cleanup_temp_key_file(log_file_path)
+            raise
+
+        return ProcessHandle(process, key_file_path, log_file_path)
+
+    def adopt(self, tunnel: SSHTunnel, pid: int, argv: list[str], log: TunnelLog) -> TunnelHandle | None:
+        if argv[-1] != tunnel_endpoint(tunnel) or forward_spec(tunnel, self.local_host) not in argv:
+            return None
+        key_file_path = argv[argv.index("-i") + 1]
+        try:
+            with open(key_file_path) as f:
+                if f.read() != decrypt_private_key(tunnel.private_key):
+                    return None
+        except OSError:
+            return None
+        log_file_path = argv[argv.index("-E") + 1] if "-E" in argv[:-1] else None
+        handle = AdoptedProcessHandle(pid, key_file_path, log_file_path)
+        if log_file_path:
+            log.follow(log_file_path, lambda: handle.is_running, adopted=True)
+        return handle
+
+
+@dataclass
+class TunnelHealth:
+    """
+    In-memory health of one tunnel, kept next to its persisted `TunnelRuntime`.
+    """
+
+    starting_since: float | None = None
+    time_to_ready: float | None = None
+    last_exit_code: int | None = None
+    last_log_error: str | None = None
+    consecutive_failures: int = 0
+
+
+def excerpt(message: str | None) -> str | None:
+    if message is None or len(message) <= STATUS_ERROR_EXCERPT:
+        return message
+    return message[: STATUS_ERROR_EXCERPT - 3] + "..."
+
+
+async def terminate_handles(handles: dict[str, TunnelHandle], deadline: float) -> int:
+    """
+    Ask every handle to terminate at once and kill those still running
+    after `deadline` seconds. Returns the number of handles killed.
+    """
+    started_at = time.monotonic()
+
+    async def _terminate(tunnel_id: str, handle: TunnelHandle):
+        try:
+            await handle.terminate()
+        except ProcessLookupError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to terminate tunnel {tunnel_id}: {e}")
+
+    await asyncio.gather(*[_terminate(tunnel_id, handle) for tunnel_id, handle in handles.items()])
+    waiters = {asyncio.create_task(handle.wait()): handle for handle in handles.values()}
+    if not waiters:
+        return 0
+    remaining = max(0.0, deadline - (time.monotonic() - started_at))
+    _, pending = await asyncio.wait(waiters, timeout=remaining)
+
+    killed = len(pending)
+    if pending:
+        logger.warning(f"{killed} tunnels did not terminate within {deadline}s, killing them")
+        for waiter in pending:
+            waiters[waiter].kill()
+        _, pending = await asyncio.wait(pending, timeout=SHUTDOWN_KILL_TIMEOUT)
+        for waiter in pending:
+            waiter.cancel()
+    return killed
 
 
 class SSHTunnelManager:
-    def __init__(self):
-        self.active_tunnels: Dict[str, asyncio.subprocess.Process] = {}
-        self.key_files: Dict[str, str] = {}
+    def __init__(
+        self,
+        startup_concurrency: int = STARTUP_CONCURRENCY,
+        startup_per_host_concurrency: int = STARTUP_PER_HOST_CONCURRENCY,
+        ready_timeout: float = READY_TIMEOUT,
+        local_host: str = LOCAL_FORWARD_HOST,
+    ):
+        self.active_tunnels: dict[str, TunnelHandle] = {}
+        self.logs: dict[str, TunnelLog] = {}
+        self.reconnects = ReconnectScheduler(self._reconnect)
+        self.supervisor = TunnelSupervisor(self._running_processes, on_transition=self._publish_state)
+        self.reconciler = TunnelReconciler(self)
+        self.runtime = RuntimeStore(on_error=self.supervisor.request_audit)
+        self.configs: dict[str, tuple] = {}
+        # wallet of every tunnel seen, to route its state changes to
+        # subscribers and to check ownership without a database lookup
+        self.wallets: dict[str, str] = {}
+        self.health: dict[str, TunnelHealth] = defaultdict(TunnelHealth)
+        self._starting: set[str] = set()
+        self._monitors: set[asyncio.Task] = set()
+        self.startup_concurrency = startup_concurrency
+        self.startup_per_host_concurrency = startup_per_host_concurrency
+        self.ready_timeout = ready_timeout
+        self.local_host = local_host
+        self.backends: dict[str, TunnelBackend] = {
+            OpenSSHBackend.name: OpenSSHBackend(ready_timeout, local_host),
+        }
+
+    def get_backend(self, name: str) -> TunnelBackend:
+        """
+        Get the backend a tunnel selected, loading optional backends on first use.
+        """
+        if name not in self.backends:
+            if name != "asyncssh":
+                raise ValueError(f"Unknown tunnel backend: {name}")
+            try:
+                from .asyncssh_backend import AsyncSSHBackend
+            except ImportError as exc:
+                raise RuntimeError("The asyncssh backend requires the 'asyncssh' package") from exc
+            self.backends[name] = AsyncSSHBackend(self.ready_timeout, self.local_host)
+        return self.backends[name]
+
+    async def start_tunnels(self, tunnels: list[SSHTunnel]) -> dict:
+        """
+        Start many tunnels with bounded parallelism.
+        At most `startup_concurrency` tunnels start at once, and at most
+        `startup_per_host_concurrency` of them against the same remote host.
+        Returns a report with the total wall time and per-tunnel time to ready.
+        """
+        global_slots = asyncio.Semaphore(max(1, self.startup_concurrency))
+        host_slots: dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(max(1, self.startup_per_host_concurrency))
+        )
+        time_to_ready: dict[str, float] = {}
+        failed: list[str] = []
+        started_at = time.monotonic()
+
+        async def _start(tunnel: SSHTunnel):
+            async with host_slots[tunnel.remote_server_url], global_slots:
+                tunnel_started_at = time.monotonic()
+                try:
+                    success = await self.start_tunnel(tunnel)
+                except Exception as e:
+                    logger.error(f"Error starting tunnel {tunnel.name} ({tunnel.id}): {e}")
+                    success = False
+                if success:
+                    time_to_ready[tunnel.id] = round(time.monotonic() - tunnel_started_at, 3)
+                    logger.info(
+                        f"Started tunnel {tunnel.name} ({tunnel.id}) in {time_to_ready[tunnel.id]}s"
+                    )
+                else:
+                    failed.append(tunnel.id)
+                    logger.error(f"Failed to start tunnel: {tunnel.name} ({tunnel.id})")
+
+        await asyncio.gather(*[_start(tunnel) for tunnel in interleave_by_host(tunnels)])
+
+        wall_time = round(time.monotonic() - started_at, 3)
+        logger.info(
+            f"Started {len(time_to_ready)}/{len(tunnels)} tunnels in {wall_time}s "
+            f"(concurrency {self.startup_concurrency}, per host {self.startup_per_host_concurrency})"
+        )
+        return {
+            "total": len(tunnels),
+            "started": len(time_to_ready),
+            "failed": failed,
+            "wall_time": wall_time,
+            "time_to_ready": time_to_ready,
+        }
         
+    async def adopt_tunnels(self, tunnels: list[SSHTunnel]) -> dict:
+        """
+        Reconcile the stored PIDs of `tunnels` with the processes that are
+        still running after a restart of LNbits. ssh processes matching
+        their tunnel are adopted as they are, without reconnecting; ssh
+        processes of ours that can not be adopted are stopped so they no
+        longer hold the remote port.
+        """
+        adopted: list[str] = []
+        killed: list[int] = []
+        for tunnel in tunnels:
+            pid = tunnel.process_id
+            if not pid or tunnel.id in self.active_tunnels:
+                continue
+            argv = read_ssh_cmdline(pid)
+            # whether the tunnel is started again or marked disconnected is
+            # up to the reconciler
+            if argv is None:
+                self.runtime.update(tunnel.id, process_id=None)
+                continue
+
+            backend = self.backends.get(tunnel.backend)
+            handle = backend.adopt(tunnel, pid, argv, self._get_log(tunnel.id)) if backend else None
+            self.wallets[tunnel.id] = tunnel.wallet_id
+            if not handle:
+                logger.warning(f"Stopping leftover ssh process {pid} of tunnel {tunnel.id}")
+                await kill_orphan_process(pid)
+                cleanup_temp_key_file(argv[argv.index("-i") + 1])
+                if "-E" in argv[:-1]:
+                    cleanup_temp_key_file(argv[argv.index("-E") + 1])
+                self.runtime.update(tunnel.id, process_id=None)
+                killed.append(pid)
+                continue
+
+            self.active_tunnels[tunnel.id] = handle
+            self.configs[tunnel.id] = tunnel_config(tunnel)
+            self.supervisor.transition(tunnel.id, TunnelState.STARTING)
+            self.supervisor.transition(tunnel.id, TunnelState.READY)
+            self._get_log(tunnel.id).append("manager", f"Adopted ssh process {pid} from a previous run")
+            run_in_background(self._monitors, self._monitor_tunnel(tunnel.id, handle))
+            adopted.append(tunnel.id)
+            logger.info(f"Adopted running ssh process {pid} for tunnel {tunnel.id}")
+
+        try:
+            await self.runtime.flush()
+        except Exception as e:
+            logger.error(f"Failed to clear the process ids of gone tunnels: {e}")
+            self.supervisor.request_audit()
+
+        if adopted or killed:
+            logger.info(f"Adopted {len(adopted)} running tunnels, stopped {len(killed)} leftover ssh processes")
+        return {"adopted": adopted, "killed": killed}
+
     async def start_tunnel(self, tunnel: SSHTunnel) -> bool:
         """
         Start SSH tunnel for the given configuration.
+        The tunnel is marked connected once its backend reports the remote
+        forward as established, or fails after `ready_timeout` seconds.
         Returns True if successful, False otherwise.
         """
-        if tunnel.id in self.active_tunnels:
+        if self.is_running_or_starting(tunnel.id):
             logger.warning(f"Tunnel {tunnel.id} is already active")
             return False
-            
+
+        self._starting.add(tunnel.id)
         try:
-            private_key = decrypt_private_key(tunnel.private_key)
-            public_key = tunnel.public_key
-            key_file_path = save_private_key_to_temp_file(private_key)
-            self.key_files[tunnel.id] = key_file_path
-            
-            ssh_command = [
-                "ssh",
-                "-N",
-                "-v",  # Add verbose output for debugging
-                "-o", "StrictHostKeyChecking=no",
-                "-o", "UserKnownHostsFile=/dev/null",
-                "-o", "ServerAliveInterval=30",
-                "-o", "ServerAliveCountMax=3",
-                "-o", "ConnectTimeout=10",
-                "-i", key_file_path,
-                "-R", f"127.0.0.1:{tunnel.remote_port}:lnbits.embassy:{tunnel.local_port}",
-                f"{tunnel.remote_server_user}@{tunnel.remote_server_url}"
-            ]
-            
-            logger.info(f"Starting SSH tunnel: {' '.join(ssh_command[:-1])} {tunnel.remote_server_user}@{tunnel.remote_server_url}")
-            logger.info(f"Using public key: {public_key}")
-            
-            process = await asyncio.create_subprocess_exec(
-                *ssh_command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+            return await self._start_tunnel(tunnel)
+        finally:
+            self._starting.discard(tunnel.id)
+
+    async def _start_tunnel(self, tunnel: SSHTunnel) -> bool:
+        self.wallets[tunnel.id] = tunnel.wallet_id
+        health = self.health[tunnel.id]
+        health.starting_since = time.monotonic()
+        self.supervisor.transition(tunnel.id, TunnelState.STARTING)
+        log = self._get_log(tunnel.id)
+        try:
+            backend = self.get_backend(tunnel.backend)
+            handle = await backend.open(tunnel, log)
+
+            self.active_tunnels[tunnel.id] = handle
+            self.configs[tunnel.id] = tunnel_config(tunnel)
+            time_to_ready = time.monotonic() - health.starting_since
+            health.time_to_ready = round(time_to_ready, 3)
+            health.consecutive_failures = 0
+            TUNNEL_STARTS.inc(tunnel.backend, "success")
+            TUNNEL_READY_SECONDS.observe(time_to_ready, tunnel.backend)
+            self.supervisor.transition(tunnel.id, TunnelState.READY)
+
+            self.runtime.update(
+                tunnel.id, is_connected=True, process_id=handle.pid, started_at=datetime.now(timezone.utc)
             )
-            
-            # Wait a moment to check for immediate errors
-            await asyncio.sleep(2)
-            
-            if process.returncode is not None:
-                # Process already exited, read error output
-                stderr_output = await process.stderr.read()
-                stdout_output = await process.stdout.read()
-                error_msg = stderr_output.decode() + stdout_output.decode()
-                logger.error(f"SSH tunnel failed to start: {error_msg}")
-                raise RuntimeError(f"SSH connection failed: {error_msg}")
-            
-            self.active_tunnels[tunnel.id] = process
-            
-            await update_ssh_tunnel_connection_status(tunnel.id, True, process.pid)
-            
-            logger.info(f"SSH tunnel {tunnel.id} started with PID {process.pid}")
-            
-            asyncio.create_task(self._monitor_tunnel(tunnel.id))
-            
+
+            logger.info(f"SSH tunnel {tunnel.id} started ({backend.name}, PID {handle.pid})")
+
+            run_in_background(self._monitors, self._monitor_tunnel(tunnel.id, handle))
+
             return True
-            
-        except FileNotFoundError:
-            logger.error(f"SSH command not found. Please ensure SSH client is installed.")
-            await self._cleanup_tunnel_resources(tunnel.id)
-            return False
+
+        except FileNotFoundError as e:
+            self.runtime.update(tunnel.id, last_error=f"SSH command not found: {e}")
+            logger.error("SSH command not found. Please ensure SSH client is installed.")
         except PermissionError as e:
+            self.runtime.update(tunnel.id, last_error=f"Permission denied: {e}")
             logger.error(f"Permission denied when creating key file for tunnel {tunnel.id}: {e}")
-            await self._cleanup_tunnel_resources(tunnel.id)
-            return False
         except Exception as e:
+            self.runtime.update(tunnel.id, last_error=f"Failed to start tunnel: {e}")
+            log.append("manager", f"Failed to start tunnel: {e}")
             logger.error(f"Failed to start SSH tunnel {tunnel.id}: {e}")
-            await self._cleanup_tunnel_resources(tunnel.id)
-            return False
-    
+        health.consecutive_failures += 1
+        TUNNEL_STARTS.inc(tunnel.backend, "failure")
+        TUNNEL_FAILURES.inc(tunnel.backend, "start_failed")
+
+        # a failed reconnect attempt stays queued in the reconnect scheduler
+        self.supervisor.transition(
+            tunnel.id,
+            TunnelState.BACKING_OFF if self.reconnects.is_pending(tunnel.id) else TunnelState.STOPPED,
+        )
+        await self._cleanup_tunnel_resources(tunnel.id)
+        return False
+
     async def stop_tunnel(self, tunnel_id: str, manual_disconnect: bool = True) -> bool:
         """
         Stop SSH tunnel.
@@ -94,43 +853,48 @@ class SSHTunnelManager:
             manual_disconnect: If True, prevents auto-reconnection
         Returns True if successful, False otherwise.
         """
-        if tunnel_id not in self.active_tunnels:
+        self.reconnects.cancel(tunnel_id)
+
+        if manual_disconnect:
+            self.runtime.update(tunnel_id, reconnect_count=0)
+            tunnel = await get_ssh_tunnel_by_id(tunnel_id)
+            if tunnel and tunnel.auto_reconnect:
+                tunnel.auto_reconnect = False
+                from .crud import update_ssh_tunnel
+                await update_ssh_tunnel(tunnel)
+
+        # removing the handle first tells _monitor_tunnel this exit is intended
+        handle = self.active_tunnels.pop(tunnel_id, None)
+        self.supervisor.transition(tunnel_id, TunnelState.STOPPED)
+        if not handle:
             logger.warning(f"Tunnel {tunnel_id} is not active")
             return True
-            
+
         try:
-            process = self.active_tunnels[tunnel_id]
-            
-            if manual_disconnect:
-                tunnel = await get_ssh_tunnel_by_id(tunnel_id)
-                if tunnel:
-                    tunnel.auto_reconnect = False
-                    from .crud import update_ssh_tunnel
-                    await update_ssh_tunnel(tunnel)
-            
-            process.terminate()
-            
+            await handle.terminate()
+
             try:
-                await asyncio.wait_for(process.wait(), timeout=5.0)
+                await asyncio.wait_for(handle.wait(), timeout=5.0)
             except asyncio.TimeoutError:
                 logger.warning(f"Tunnel {tunnel_id} did not terminate gracefully, killing...")
-                process.kill()
-                await process.wait()
-            
-            await self._cleanup_tunnel_resources(tunnel_id)
-            
+                handle.kill()
+                await handle.wait()
+
+            await self._cleanup_tunnel_resources(tunnel_id, handle)
+
             logger.info(f"SSH tunnel {tunnel_id} stopped")
             return True
-            
+
         except ProcessLookupError:
             logger.warning(f"Process for tunnel {tunnel_id} was already terminated")
-            await self._cleanup_tunnel_resources(tunnel_id)
+            await self._cleanup_tunnel_resources(tunnel_id, handle)
             return True
         except Exception as e:
             logger.error(f"Failed to stop SSH tunnel {tunnel_id}: {e}")
-            await self._cleanup_tunnel_resources(tunnel_id)
+            handle.kill()
+            await self._cleanup_tunnel_resources(tunnel_id, handle)
             return False
-    
+
     async def restart_tunnel(self, tunnel_id: str) -> bool:
         """
         Restart an SSH tunnel.
@@ -140,79 +904,216 @@ class SSHTunnelManager:
             logger.error(f"Tunnel {tunnel_id} not found")
             return False
             
+        # stop_tunnel returns once the old process is gone and the port is free
         await self.stop_tunnel(tunnel_id, manual_disconnect=False)
-        await asyncio.sleep(1)
         return await self.start_tunnel(tunnel)
     
+    def track(self, tunnels: list[SSHTunnel]):
+        """
+        Remember the wallet of `tunnels`, e.g. of every tunnel a
+        reconciliation pass loaded, so their status is served from memory.
+        """
+        self.wallets.update((tunnel.id, tunnel.wallet_id) for tunnel in tunnels)
+
     async def get_tunnel_status(self, tunnel_id: str) -> dict:
         """
-        Get status information for a tunnel.
+        Get status information for a tunnel, all from memory.
         """
-        is_active = tunnel_id in self.active_tunnels
-        process_id = None
-        
-        if is_active:
-            process = self.active_tunnels[tunnel_id]
-            process_id = process.pid
-            
+        handle = self.active_tunnels.get(tunnel_id)
+        runtime = self.runtime.get(tunnel_id)
+        health = self.health.get(tunnel_id) or TunnelHealth()
+        uptime = None
+        if handle and runtime.started_at:
+            uptime = round(max(0.0, time.time() - runtime.started_at.timestamp()), 3)
+
         return {
             "tunnel_id": tunnel_id,
-            "is_active": is_active,
-            "process_id": process_id
+            "is_active": handle is not None,
+            "process_id": handle.pid if handle else None,
+            "backend": handle.backend if handle else None,
+            "state": self.supervisor.get_state(tunnel_id).value,
+            "state_since": self.supervisor.since.get(tunnel_id),
+            "started_at": runtime.started_at,
+            "uptime": uptime,
+            "time_to_ready": health.time_to_ready,
+            "reconnect_count": runtime.reconnect_count,
+            "consecutive_failures": health.consecutive_failures,
+            "last_exit_code": health.last_exit_code,
+            "last_error": excerpt(runtime.last_error),
+            "last_log_error": excerpt(health.last_log_error),
+            "stats": handle.stats() if handle else {},
+            "reconnect": self.reconnects.get_state(tunnel_id),
         }
-    
-    async def _monitor_tunnel(self, tunnel_id: str):
+
+    async def get_wallet_tunnel_statuses(self, wallet_id: str) -> list[dict]:
         """
-        Monitor tunnel process and handle disconnections.
+        Status of every known tunnel of a wallet.
+        """
+        return [
+            await self.get_tunnel_status(tunnel_id)
+            for tunnel_id, owner in self.wallets.items()
+            if owner == wallet_id
+        ]
+
+    async def _monitor_tunnel(self, tunnel_id: str, handle: TunnelHandle):
+        """
+        Monitor tunnel forward and hand unexpected exits to the reconnect scheduler.
         """
         try:
-            process = self.active_tunnels.get(tunnel_id)
-            if not process:
+            await handle.wait()
+            self.health[tunnel_id].last_exit_code = handle.exit_code
+
+            if self.active_tunnels.get(tunnel_id) is not handle:
+                # stopped on purpose by stop_tunnel
                 return
-                
-            await process.wait()
-            
-            logger.warning(f"SSH tunnel {tunnel_id} process ended")
-            
+
+            self.health[tunnel_id].consecutive_failures += 1
+            TUNNEL_FAILURES.inc(handle.backend, "unexpected_exit")
+            logger.warning(f"SSH tunnel {tunnel_id} ended with exit code {handle.exit_code}")
+            self.runtime.update(tunnel_id, last_error=f"Tunnel ended with exit code {handle.exit_code}")
+            await self._cleanup_tunnel_resources(tunnel_id, handle)
+
             tunnel = await get_ssh_tunnel_by_id(tunnel_id)
-            if not tunnel:
-                await self._cleanup_tunnel_resources(tunnel_id)
-                return
-                
-            await update_ssh_tunnel_connection_status(tunnel_id, False, None)
-            
-            if tunnel.auto_reconnect:
-                logger.info(f"Auto-reconnecting tunnel {tunnel_id}")
-                await asyncio.sleep(5)
-                await self.restart_tunnel(tunnel_id)
+            if tunnel and tunnel.auto_reconnect:
+                self.schedule_reconnect(tunnel)
             else:
-                await self._cleanup_tunnel_resources(tunnel_id)
-                
+                self.supervisor.transition(tunnel_id, TunnelState.STOPPED)
+
         except Exception as e:
             logger.error(f"Error monitoring tunnel {tunnel_id}: {e}")
-            await self._cleanup_tunnel_resources(tunnel_id)
-    
-    async def _cleanup_tunnel_resources(self, tunnel_id: str):
+            self.supervisor.transition(tunnel_id, TunnelState.STOPPED)
+            await self._cleanup_tunnel_resources(tunnel_id, handle)
+
+    def is_running_or_starting(self, tunnel_id: str) -> bool:
+        return tunnel_id in self.active_tunnels or tunnel_id in self._starting
+
+    def schedule_reconnect(self, tunnel: SSHTunnel):
+        logger.info(f"Scheduling reconnect of tunnel {tunnel.id}")
+        self.reconnects.schedule(tunnel.id, tunnel.remote_server_url)
+        self.supervisor.transition(tunnel.id, TunnelState.BACKING_OFF)
+        TUNNEL_RECONNECTS.inc()
+        # written along with the outcome of the attempt
+        self.runtime.update(tunnel.id, reconnect_count=self.runtime.get(tunnel.id).reconnect_count + 1)
+
+    async def _reconnect(self, tunnel_id: str) -> bool | None:
+        """
+        Reconnect attempt made by the reconnect scheduler.
+        Returns None if the tunnel was deleted or should no longer reconnect.
+        """
+        tunnel = await get_ssh_tunnel_by_id(tunnel_id)
+        if not tunnel or not tunnel.auto_reconnect:
+            self.supervisor.transition(tunnel_id, TunnelState.STOPPED)
+            return None
+        if self.is_running_or_starting(tunnel_id):
+            return True
+        logger.info(f"Auto-reconnecting tunnel {tunnel_id}")
+        return await self.start_tunnel(tunnel)
+
+    async def _cleanup_tunnel_resources(self, tunnel_id: str, handle: TunnelHandle | None = None):
         """
         Clean up resources for a tunnel.
         """
-        if tunnel_id in self.active_tunnels:
-            del self.active_tunnels[tunnel_id]
-            
-        if tunnel_id in self.key_files:
-            cleanup_temp_key_file(self.key_files[tunnel_id])
-            del self.key_files[tunnel_id]
-            
-        await update_ssh_tunnel_connection_status(tunnel_id, False, None)
-    
-    async def stop_all_tunnels(self):
+        if handle is None or self.active_tunnels.get(tunnel_id) is handle:
+            self.active_tunnels.pop(tunnel_id, None)
+
+        if handle:
+            handle.release()
+
+        self.runtime.update(tunnel_id, is_connected=False, process_id=None)
+
+    def _get_log(self, tunnel_id: str) -> TunnelLog:
+        if tunnel_id not in self.logs:
+            self.logs[tunnel_id] = TunnelLog(on_error=lambda line: self._report_log_error(tunnel_id, line))
+        return self.logs[tunnel_id]
+
+    def _report_log_error(self, tunnel_id: str, line: str):
+        self.health[tunnel_id].last_log_error = line
+        self.supervisor.report_error(tunnel_id)
+
+    def _publish_state(self, tunnel_id: str, state: TunnelState):
         """
-        Stop all active tunnels.
+        Push a state change to the event subscribers of the tunnel's wallet.
         """
-        tunnel_ids = list(self.active_tunnels.keys())
-        for tunnel_id in tunnel_ids:
-            await self.stop_tunnel(tunnel_id, manual_disconnect=True)
-    
+        wallet_id = self.wallets.get(tunnel_id)
+        if not wallet_id:
+            return
+        handle = self.active_tunnels.get(tunnel_id)
+        is_connected = state in (TunnelState.READY, TunnelState.DEGRADED)
+        tunnel_events.publish(
+            wallet_id,
+            "status",
+            {
+                "id": tunnel_id,
+                "state": state.value,
+                "is_connected": is_connected,
+                "process_id": handle.pid if handle and is_connected else None,
+            },
+        )
+
+    def _running_processes(self) -> dict[str, int | None]:
+        return {tunnel_id: handle.pid for tunnel_id, handle in self.active_tunnels.items()}
+
+    async def stop_all_tunnels(self, deadline: float = SHUTDOWN_DEADLINE) -> dict:
+        """
+        Stop all active tunnels on shutdown.
+        Every tunnel is asked to terminate at once, all of them share one
+        `deadline`, and whatever is still running after it is killed. The
+        tunnels stay marked connected, only their process ids are cleared,
+        so the reconciler brings them back on the next boot; it marks those
+        it does not bring back disconnected.
+        Returns the number of tunnels stopped and killed and the duration.
+        """
+        started_at = time.monotonic()
+        self.reconciler.stop()
+        self.reconnects.stop()
+        self.supervisor.stop()
+
+        # with the handles gone, _monitor_tunnel treats every exit as intended
+        handles = dict(self.active_tunnels)
+        self.active_tunnels.clear()
+        killed = await terminate_handles(handles, deadline)
+
+        for tunnel_id, handle in handles.items():
+            handle.release()
+            self.supervisor.transition(tunnel_id, TunnelState.STOPPED)
+            self.runtime.update(tunnel_id, process_id=None)
+        try:
+            await self.runtime.close()
+        except Exception as e:
+            logger.error(f"Failed to write tunnel runtime state on shutdown: {e}")
+
+        for backend in self.backends.values():
+            await backend.close()
+        await process_spawner.stop()
+
+        duration = round(time.monotonic() - started_at, 3)
+        logger.info(f"Stopped {len(handles)} SSH tunnels in {duration}s ({killed} killed)")
+        return {"stopped": len(handles), "killed": killed, "duration": duration}
+
+    def get_tunnel_logs(
+        self, tunnel_id: str, limit: int = LOG_BUFFER_SIZE, level: str | None = None
+    ) -> list[SSHTunnelLogEntry]:
+        """
+        Get the most recent ssh output lines of a tunnel, oldest first.
+        """
+        log = self.logs.get(tunnel_id)
+        if not log:
+            return []
+        return log.tail(limit, level)
+
+    def forget_tunnel(self, tunnel_id: str):
+        """
+        Drop all in-memory state kept for a deleted tunnel.
+        """
+        self.reconnects.cancel(tunnel_id)
+        self.supervisor.forget(tunnel_id)
+        self.configs.pop(tunnel_id, None)
+        self.wallets.pop(tunnel_id, None)
+        self.health.pop(tunnel_id, None)
+        self.runtime.forget(tunnel_id)
+        self.logs.pop(tunnel_id, None)
+
+
     async def get_all_active_tunnels(self) -> list[str]:
         """
         Get list of all active tunnel IDs.
@@ -220,4 +1121,30 @@ class SSHTunnelManager:
         return list(self.active_tunnels.keys())
 
 
-tunnel_manager = SSHTunnelManager()
\ No newline at end of file
+tunnel_manager = SSHTunnelManager()
+
+metrics.gauge(
+    "cloud_connect_tunnels",
+    "Tunnels known to the supervisor by state.",
+    lambda: {(state,): count for state, count in tunnel_manager.supervisor.stats()["states"].items()},
+    ("state",),
+)
+metrics.gauge(
+    "cloud_connect_active_tunnels",
+    "Running tunnel forwards by backend.",
+    lambda: {
+        (backend,): sum(handle.backend == backend for handle in tunnel_manager.active_tunnels.values())
+        for backend in tunnel_manager.backends
+    },
+    ("backend",),
+)
+metrics.gauge(
+    "cloud_connect_reconnects_pending",
+    "Tunnels waiting for a reconnect attempt.",
+    lambda: {(): len(tunnel_manager.reconnects.entries)},
+)
+metrics.gauge(
+    "cloud_connect_runtime_queue_depth",
+    "Tunnels with status changes not yet written to the database.",
+    lambda: {(): tunnel_manager.runtime.pending},
+)
@@ -69,9 +69,15 @@ window.app = Vue.createApp({
           local_port: null,
           remote_port: null,
           auto_reconnect: true,
-          startup_enabled: false
+          startup_enabled: false,
+          backend: 'openssh'
         }
       },
+      // only the backends installed on this LNbits, see views.index
+      sshTunnelBackendOptions: [
+        {label: 'OpenSSH', value: 'openssh'},
+        {label: 'asyncssh (in-process)', value: 'asyncssh'}
+      ].filter(option => window.sshTunnelBackends.includes(option.value)),
       sshTunnelDetailsDialog: {
         show: false,
         data: {}
@@ -96,7 +102,9 @@ window.app = Vue.createApp({
           descending: true,
           rowsNumber: 10
         }
-      }
+      },
+      sshTunnelEvents: null,
+      sshTunnelPollTimer: null
     }
   },
   watch: {
@@ -331,7 +339,8 @@ window.app = Vue.createApp({
         local_port: null,
         remote_port: null,
         auto_reconnect: true,
-        startup_enabled: false
+        startup_enabled: false,
+        backend: 'openssh'
       }
       this.sshTunnelFormDialog.show = true
     },
@@ -397,19 +406,25 @@ window.app = Vue.createApp({
         })
         
         await this.getSSHTunnels()
-        
-        // Auto-refresh tunnel status
-        if (action === 'connect') {
-          setTimeout(() => this.getSSHTunnels(), 2000)
-        }
       } catch (error) {
         LNbits.utils.notifyApiError(error)
       }
     },
 
     async showSSHTunnelDetails(tunnel) {
+      // the list has no key material, the public key is loaded on demand
       this.sshTunnelDetailsDialog.data = {...tunnel}
       this.sshTunnelDetailsDialog.show = true
+      try {
+        const {data} = await LNbits.api.request(
+          'GET',
+          `/lnbits_cloud_connect/api/v1/ssh-tunnels/${tunnel.id}`,
+          null
+        )
+        this.sshTunnelDetailsDialog.data = data
+      } catch (error) {
+        LNbits.utils.notifyApiError(error)
+      }
     },
 
     async deleteSSHTunnel(tunnelId) {
@@ -433,6 +448,70 @@ window.app = Vue.createApp({
         })
     },
 
+    subscribeSSHTunnelEvents() {
+      // live status from the server, polling only while the stream is down
+      if (!window.EventSource) {
+        this.startSSHTunnelPolling()
+        return
+      }
+      const events = new EventSource(
+        '/lnbits_cloud_connect/api/v1/ssh-tunnels/events'
+      )
+      events.addEventListener('open', () => {
+        if (this.sshTunnelPollTimer) {
+          this.stopSSHTunnelPolling()
+          // catch up on changes missed while the stream was down
+          this.getSSHTunnels()
+        }
+      })
+      events.addEventListener('error', () => this.startSSHTunnelPolling())
+      events.addEventListener('status', event => {
+        const status = JSON.parse(event.data)
+        const tunnel = this.sshTunnelList.find(t => t.id === status.id)
+        if (tunnel) {
+          tunnel.is_connected = status.is_connected
+          tunnel.process_id = status.process_id
+        }
+      })
+      events.addEventListener('resync', () => this.getSSHTunnels())
+      this.sshTunnelEvents = events
+    },
+
+    startSSHTunnelPolling() {
+      if (this.sshTunnelPollTimer) return
+      this.sshTunnelPollTimer = setInterval(() => {
+        this.getSSHTunnels()
+      }, 30000) // Refresh every 30 seconds
+    },
+
+    stopSSHTunnelPolling() {
+      clearInterval(this.sshTunnelPollTimer)
+      this.sshTunnelPollTimer = null
+    },
+
+    async loadDashboard() {
+      // everything shown on load in one request, the single calls as fallback
+      try {
+        const {data} = await LNbits.api.request(
+          'GET',
+          '/lnbits_cloud_connect/api/v1/dashboard',
+          null
+        )
+        this.currencyOptions = ['sat', ...data.currencies]
+        this.ownerDataList = data.owner_data.data
+        this.ownerDataTable.pagination.rowsNumber = data.owner_data.total
+        this.clientDataList = data.client_data.data
+        this.clientDataTable.pagination.rowsNumber = data.client_data.total
+        this.sshTunnelList = data.ssh_tunnels.data
+        this.sshTunnelTable.pagination.rowsNumber = data.ssh_tunnels.total
+      } catch (error) {
+        this.fetchCurrencies()
+        this.getOwnerData()
+        this.getClientData()
+        this.getSSHTunnels()
+      }
+    },
+
     //////////////// Utils ////////////////////////
     dateFromNow(date) {
       return moment(date).fromNow()
@@ -465,14 +544,11 @@ window.app = Vue.createApp({
   //////LIFECYCLE FUNCTIONS RUNNING ON PAGE LOAD/////
   ///////////////////////////////////////////////////
   async created() {
-    this.fetchCurrencies()
-    this.getOwnerData()
-    this.getClientData()
-    this.getSSHTunnels()
-    
-    // Set up periodic refresh for SSH tunnel status
-    setInterval(() => {
-      this.getSSHTunnels()
-    }, 30000) // Refresh every 30 seconds
+    this.loadDashboard()
+    this.subscribeSSHTunnelEvents()
+  },
+  unmounted() {
+    if (this.sshTunnelEvents) this.sshTunnelEvents.close()
+    this.stopSSHTunnelPolling()
   }
 })
\ No newline at end of file
@@ -0,0 +1,200 @@
+import asyncio
+import time
+from collections import Counter
+from collections.abc import Callable
+from enum import Enum
+
+from loguru import logger
+
+from .crud import (
+    get_connected_ssh_tunnel_ids,
+    mark_ssh_tunnels_connected,
+    mark_ssh_tunnels_disconnected,
+)
+from .metrics import LOOP_DURATION_SECONDS, LOOP_ERRORS
+
+# Seconds between full audits of the database against the running tunnels;
+# events keep the database current, the audit only catches what they missed
+AUDIT_INTERVAL = 300.0
+# Seconds without new errors before a degraded tunnel is ready again
+DEGRADED_RECOVERY = 60.0
+# Tunnels per batched UPDATE statement
+AUDIT_BATCH_SIZE = 500
+
+
+class TunnelState(str, Enum):
+    STARTING = "starting"
+    READY = "ready"
+    DEGRADED = "degraded"
+    BACKING_OFF = "backing_off"
+    STOPPED = "stopped"
+
+
+TRANSITIONS = {
+    # a failed start can be queued for a retry
+    TunnelState.STOPPED: {TunnelState.STARTING, TunnelState.BACKING_OFF},
+    TunnelState.STARTING: {TunnelState.READY, TunnelState.BACKING_OFF, TunnelState.STOPPED},
+    TunnelState.READY: {TunnelState.DEGRADED, TunnelState.BACKING_OFF, TunnelState.STOPPED},
+    TunnelState.DEGRADED: {TunnelState.READY, TunnelState.BACKING_OFF, TunnelState.STOPPED},
+    TunnelState.BACKING_OFF: {TunnelState.STARTING, TunnelState.STOPPED},
+}
+
+
+class TunnelSupervisor:
+    """
+    Per-tunnel state machine driven by the tunnel manager's events
+    (start, ready, error output, exit, stop), plus a periodic audit that
+    repairs the connection status in the database with set-based updates
+    and counts every drift it finds.
+
+    `running` returns the PID (or None) of every tunnel that is up;
+    `on_transition` is called with every state change as it happens.
+    """
+
+    def __init__(
+        self,
+        running: Callable[[], dict[str, int | None]],
+        audit_interval: float = AUDIT_INTERVAL,
+        degraded_recovery: float = DEGRADED_RECOVERY,
+        on_transition: Callable[[str, TunnelState], None] | None = None,
+    ):
+        self.running = running
+        self.on_transition = on_transition
+        self.audit_interval = audit_interval
+        self.degraded_recovery = degraded_recovery
+        self.states: dict[str, TunnelState] = {}
+        self.since: dict[str, float] = {}
+        self.drift: Counter = Counter()
+        self.last_audit: float | None = None
+        self._recovery: dict[str, asyncio.TimerHandle] = {}
+        self._audit_requested = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def get_state(self, tunnel_id: str) -> TunnelState:
+        return self.states.get(tunnel_id, TunnelState.STOPPED)
+
+    def transition(self, tunnel_id: str, state: TunnelState):
+        """
+        Record a state change. Unexpected transitions are still applied,
+        since the event reflects what actually happened, but are counted.
+        """
+        current = self.get_state(tunnel_id)
+        if current == state:
+            return
+        if state not in TRANSITIONS[current]:
+            self.drift["invalid_transition"] += 1
+            logger.debug(f"Tunnel {tunnel_id}: unexpected transition {current.value} -> {state.value}")
+        if state != TunnelState.DEGRADED:
+            self._cancel_recovery(tunnel_id)
+        self.states[tunnel_id] = state
+        self.since[tunnel_id] = time.time()
+        if self.on_transition:
+            self.on_transition(tunnel_id, state)
+
+    def report_error(self, tunnel_id: str):
+        """
+        A ready tunnel reported an error (e.g. the local service refused a
+        forwarded connection). It is degraded until no further errors
+        arrive for `degraded_recovery` seconds.
+        """
+        if self.get_state(tunnel_id) not in (TunnelState.READY, TunnelState.DEGRADED):
+            return
+        self.transition(tunnel_id, TunnelState.DEGRADED)
+        self._cancel_recovery(tunnel_id)
+        self._recovery[tunnel_id] = asyncio.get_running_loop().call_later(
+            self.degraded_recovery, self._recover, tunnel_id
+        )
+
+    def forget(self, tunnel_id: str):
+        self._cancel_recovery(tunnel_id)
+        self.states.pop(tunnel_id, None)
+        self.since.pop(tunnel_id, None)
+
+    def request_audit(self):
+        """
+        Wake the audit loop early, e.g. after a status write failed.
+        """
+        self._audit_requested.set()
+
+    def start(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for handle in self._recovery.values():
+            handle.cancel()
+        self._recovery.clear()
+
+    def stats(self) -> dict:
+        return {
+            "states": dict(Counter(state.value for state in self.states.values())),
+            "drift": dict(self.drift),
+            "last_audit": self.last_audit,
+        }
+
+    async def audit(self) -> dict:
+        """
+        Compare the connection status in the database with the running
+        tunnels and fix every difference in batched updates. Only rows this
+        node wrote are compared, so nodes sharing a database leave each
+        other's tunnels alone.
+        Returns the ids that were marked disconnected and connected.
+        """
+        marked = await get_connected_ssh_tunnel_ids()
+        running = self.running()
+
+        stale = sorted(set(marked) - set(running))
+        missing = {tunnel_id: pid for tunnel_id, pid in running.items() if tunnel_id not in marked}
+        wrong_pid = {
+            tunnel_id: pid for tunnel_id, pid in running.items() if tunnel_id in marked and marked[tunnel_id] != pid
+        }
+
+        for batch in batches(stale):
+            await mark_ssh_tunnels_disconnected(batch)
+        connected = {**missing, **wrong_pid}
+        for batch in batches(sorted(connected)):
+            await mark_ssh_tunnels_connected({tunnel_id: connected[tunnel_id] for tunnel_id in batch})
+
+        self.drift["db_connected_not_running"] += len(stale)
+        self.drift["db_disconnected_running"] += len(missing)
+        self.drift["db_wrong_process_id"] += len(wrong_pid)
+        self.last_audit = time.time()
+        if stale or connected:
+            logger.warning(
+                f"Tunnel status drift repaired: {len(stale)} marked disconnected, {len(connected)} marked connected"
+            )
+        return {"disconnected": stale, "connected": sorted(connected)}
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._audit_requested.wait(), timeout=self.audit_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._audit_requested.clear()
+            try:
+                with LOOP_DURATION_SECONDS.time("audit"):
+                    await self.audit()
+            except Exception as e:
+                LOOP_ERRORS.inc("audit")
+                logger.error(f"Error auditing SSH tunnel status: {e}")
+
+    def _recover(self, tunnel_id: str):
+        self._recovery.pop(tunnel_id, None)
+        if self.get_state(tunnel_id) == TunnelState.DEGRADED:
+            self.transition(tunnel_id, TunnelState.READY)
+
+    def _cancel_recovery(self, tunnel_id: str):
+        handle = self._recovery.pop(tunnel_id, None)
+        if handle:
+            handle.cancel()
+
+
+def batches(items: list[str]) -> list[list[str]]:
+    """
+    Split tunnel ids into chunks small enough for one UPDATE statement.
+    """
+    return [items[i : i + AUDIT_BATCH_SIZE] for i in range(0, len(items), AUDIT_BATCH_SIZE)]
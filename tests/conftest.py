@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from lnbits.db import SQLITE, Database
+from lnbits.settings import settings
+
+from .. import crud, migrations, reconciler, runtime, ssh_service, supervisor
+from ..cache import TunnelCache
+from ..helpers import generate_ssh_keypair
+from ..models import SSHTunnel, TunnelRuntime
+
+
+class FakeTunnelStore:
+    """
+    In-memory stand-in for the ssh_tunnels table used by the tunnel manager.
+    """
+
+    def __init__(self):
+        self.tunnels: dict[str, SSHTunnel] = {}
+        self.status: dict[str, tuple[bool, int | None]] = {}
+        self.batches: list[list[str]] = []
+        self.writes = 0
+
+    async def get_ssh_tunnel_by_id(self, tunnel_id: str) -> SSHTunnel | None:
+        return self.tunnels.get(tunnel_id)
+
+    async def get_tunnel_runtimes(self) -> list[TunnelRuntime]:
+        return [
+            TunnelRuntime(tunnel_id=tunnel_id, is_connected=connected, process_id=pid)
+            for tunnel_id, (connected, pid) in self.status.items()
+        ]
+
+    async def upsert_tunnel_runtimes(self, runtimes: list[TunnelRuntime]) -> None:
+        self.writes += len(runtimes)
+        for row in runtimes:
+            self.status[row.tunnel_id] = (row.is_connected, row.process_id)
+
+    async def update_ssh_tunnel(self, data: SSHTunnel) -> SSHTunnel:
+        self.tunnels[data.id] = data
+        return data
+
+    async def get_all_ssh_tunnels(self) -> list[SSHTunnel]:
+        return list(self.tunnels.values())
+
+    async def get_connected_ssh_tunnel_ids(self) -> dict[str, int | None]:
+        return {tunnel_id: pid for tunnel_id, (connected, pid) in self.status.items() if connected}
+
+    async def mark_ssh_tunnels_disconnected(self, tunnel_ids: list[str]) -> None:
+        self.batches.append(list(tunnel_ids))
+        for tunnel_id in tunnel_ids:
+            self.status[tunnel_id] = (False, None)
+
+    async def mark_ssh_tunnels_connected(self, process_ids: dict[str, int | None]) -> None:
+        self.batches.append(list(process_ids))
+        for tunnel_id, pid in process_ids.items():
+            self.status[tunnel_id] = (True, pid)
+
+
+@pytest.fixture
+def tunnel_store(monkeypatch) -> FakeTunnelStore:
+    store = FakeTunnelStore()
+    monkeypatch.setattr(ssh_service, "get_ssh_tunnel_by_id", store.get_ssh_tunnel_by_id)
+    monkeypatch.setattr(runtime, "get_tunnel_runtimes", store.get_tunnel_runtimes)
+    monkeypatch.setattr(runtime, "upsert_tunnel_runtimes", store.upsert_tunnel_runtimes)
+    monkeypatch.setattr(crud, "update_ssh_tunnel", store.update_ssh_tunnel)
+    for name in ("get_connected_ssh_tunnel_ids", "mark_ssh_tunnels_disconnected", "mark_ssh_tunnels_connected"):
+        monkeypatch.setattr(supervisor, name, getattr(store, name))
+    monkeypatch.setattr(reconciler, "get_all_ssh_tunnels", store.get_all_ssh_tunnels)
+    return store
+
+
+@pytest.fixture(scope="session")
+def keypair() -> tuple[str, str]:
+    return generate_ssh_keypair()
+
+
+@pytest_asyncio.fixture
+async def ssh_server(keypair):
+    """
+    In-process SSH server accepting the test keypair and remote forwards.
+    Yields the `host:port` it listens on.
+    """
+    asyncssh = pytest.importorskip("asyncssh")
+
+    class StandInServer(asyncssh.SSHServer):
+        def server_requested(self, listen_host: str, listen_port: int) -> bool:
+            return True
+
+    server = await asyncssh.create_server(
+        StandInServer,
+        "127.0.0.1",
+        0,
+        server_host_keys=[asyncssh.generate_private_key("ssh-ed25519")],
+        authorized_client_keys=asyncssh.import_authorized_keys(keypair[1]),
+    )
+    port = server.sockets[0].getsockname()[1]
+    yield f"127.0.0.1:{port}"
+    server.close()
+    await server.wait_closed()
+
+
+@pytest_asyncio.fixture
+async def echo_server():
+    """
+    Local service the tunnels forward to. Yields its port.
+    """
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        data = await reader.read(1024)
+        writer.write(b"echo:" + data)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    yield server.sockets[0].getsockname()[1]
+    server.close()
+    await server.wait_closed()
+
+
+@pytest_asyncio.fixture
+async def spawner():
+    """
+    Runs the global process spawner for the duration of a test.
+    """
+    from ..spawner import process_spawner
+
+    await process_spawner.start()
+    yield process_spawner
+    await process_spawner.stop()
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path, monkeypatch):
+    """
+    Fully migrated extension database in a temporary data folder,
+    used by the crud functions for the duration of a test.
+    With LNBITS_DATABASE_URL set the tests run against that PostgreSQL
+    database instead, in a freshly recreated extension schema.
+    """
+    monkeypatch.setattr(settings, "lnbits_data_folder", str(tmp_path))
+    database = Database("ext_lnbits_cloud_connect")
+    async with database.connect() as conn:
+        if database.type != SQLITE:
+            await conn.execute("DROP SCHEMA lnbits_cloud_connect CASCADE")
+            await conn.execute("CREATE SCHEMA lnbits_cloud_connect")
+        for name in sorted(n for n in dir(migrations) if n[:1] == "m" and n[1:4].isdigit()):
+            await getattr(migrations, name)(conn)
+    monkeypatch.setattr(crud, "db", database)
+    monkeypatch.setattr(crud, "tunnel_cache", TunnelCache())
+    yield database
+    await database.engine.dispose()
@@ -0,0 +1,66 @@
+import pytest
+
+from .. import crud
+from ..cache import TunnelCache
+from ..models import CreateSSHTunnel, SSHTunnel, TunnelRuntime
+
+
+def make_tunnel_data(**kwargs) -> CreateSSHTunnel:
+    return CreateSSHTunnel(
+        **{
+            "name": "t",
+            "remote_server_user": "lnbits",
+            "remote_server_url": "cloud.example.com",
+            "local_port": 5000,
+            "remote_port": 9000,
+            **kwargs,
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_served_from_cache_until_a_write(db, keypair):
+    tunnel = await crud.create_ssh_tunnel("wallet", make_tunnel_data(), *keypair)
+    cache = crud.tunnel_cache
+
+    assert (await crud.get_ssh_tunnel_by_id(tunnel.id)).name == "t"
+    assert (await crud.get_ssh_tunnel(tunnel.id, "wallet")).name == "t"
+    assert (await crud.get_ssh_tunnel_summary(tunnel.id, "wallet")).name == "t"
+    assert await crud.get_ssh_tunnel(tunnel.id, "other wallet") is None
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    # copies are handed out, so callers cannot change the cached row
+    cached = await crud.get_ssh_tunnel_by_id(tunnel.id)
+    cached.name = "changed"
+    assert (await crud.get_ssh_tunnel_by_id(tunnel.id)).name == "t"
+
+    await crud.update_ssh_tunnel(cached)
+    assert (await crud.get_ssh_tunnel_by_id(tunnel.id)).name == "changed"
+    await crud.upsert_tunnel_runtimes([TunnelRuntime(tunnel_id=tunnel.id, is_connected=True, process_id=1234)])
+    assert (await crud.get_ssh_tunnel_by_id(tunnel.id)).process_id == 1234
+    await crud.mark_ssh_tunnels_disconnected([tunnel.id])
+    assert not (await crud.get_ssh_tunnel_by_id(tunnel.id)).is_connected
+    await crud.mark_ssh_tunnels_connected({tunnel.id: 99})
+    assert (await crud.get_ssh_tunnel_by_id(tunnel.id)).process_id == 99
+    await crud.delete_ssh_tunnel(tunnel.id, "wallet")
+    assert await crud.get_ssh_tunnel_by_id(tunnel.id) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_cache_is_bounded_and_expires(keypair, monkeypatch):
+    cache = TunnelCache(size=2, ttl=10)
+    now = 1000.0
+    monkeypatch.setattr("time.monotonic", lambda: now)
+    tunnels = [
+        SSHTunnel(**make_tunnel_data().dict(), id=f"t{i}", wallet_id="w", private_key="k", public_key="p")
+        for i in range(3)
+    ]
+    for tunnel in tunnels:
+        cache.put(tunnel)
+    assert cache.get("t0") == (False, None)
+    assert cache.get("t2")[0]
+    assert cache.evictions == 1
+
+    now += 10
+    assert cache.get("t2") == (False, None)
+    assert cache.stats()["size"] == 1
@@ -0,0 +1,216 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from lnbits.db import Filters
+from sqlalchemy.exc import IntegrityError
+
+from .. import crud, pagination
+from ..models import (
+    CreateClientData,
+    CreateOwnerData,
+    CreateSSHTunnel,
+    OwnerData,
+    OwnerDataFilters,
+    SSHTunnelFilters,
+    SSHTunnelSummary,
+    TunnelRuntime,
+)
+
+
+@pytest.mark.asyncio
+async def test_client_data_paginated_only_returns_own_data(db):
+    mine = [await crud.create_owner_data("alice", CreateOwnerData(name=f"o{i}")) for i in range(3)]
+    theirs = await crud.create_owner_data("bob", CreateOwnerData(name="b"))
+    for owner_data in [*mine, theirs]:
+        for i in range(2):
+            await crud.create_client_data(owner_data.id, CreateClientData(name=f"c{i}"))
+
+    page = await crud.get_client_data_paginated("alice")
+    assert page.total == 6
+    assert {c.owner_data_id for c in page.data} == {o.id for o in mine}
+
+    page = await crud.get_client_data_paginated("alice", owner_data_id=mine[1].id)
+    assert page.total == 2
+    assert {c.owner_data_id for c in page.data} == {mine[1].id}
+
+    # someone else's owner data yields nothing instead of leaking it
+    page = await crud.get_client_data_paginated("alice", owner_data_id=theirs.id)
+    assert page.total == 0
+
+    assert (await crud.get_client_data_paginated("carol")).total == 0
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_cover_every_row_once(db):
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i in range(23):
+        # pairs of rows share a timestamp, so the id has to break ties
+        owner_data = OwnerData(
+            id=f"id{i:02}", user_id="alice", name=None, created_at=created_at + timedelta(seconds=i // 2)
+        )
+        await db.insert("lnbits_cloud_connect.owner_data", owner_data)
+
+    for direction in ("asc", "desc"):
+        filters = Filters(limit=5, sortby="created_at", direction=direction, model=OwnerDataFilters)
+        seen, cursor, pages = [], "", 0
+        while cursor is not None:
+            page = await crud.get_owner_data_paginated("alice", filters, cursor=cursor)
+            assert page.total is None
+            seen += [o.id for o in page.data]
+            cursor = page.next_cursor
+            pages += 1
+        expected = [f"id{i:02}" for i in range(23)]
+        assert seen == (expected if direction == "asc" else expected[::-1])
+        assert pages == 5
+
+
+@pytest.mark.asyncio
+async def test_cursor_total_is_optional_and_cached(db, monkeypatch):
+    monkeypatch.setattr(pagination, "_totals", {})
+    for i in range(3):
+        await crud.create_owner_data("alice", CreateOwnerData(name=f"o{i}"))
+
+    page = await crud.get_owner_data_paginated("alice", cursor="", with_total=True)
+    assert page.total == 3
+    await crud.create_owner_data("alice", CreateOwnerData(name="o3"))
+    page = await crud.get_owner_data_paginated("alice", cursor="", with_total=True)
+    assert page.total == 3
+    assert len(page.data) == 4
+
+    pagination._totals.clear()
+    page = await crud.get_owner_data_paginated("alice", cursor="", with_total=True)
+    assert page.total == 4
+
+
+@pytest.mark.asyncio
+async def test_cursor_rejects_foreign_sort_order(db):
+    await crud.create_owner_data("alice", CreateOwnerData(name="a"))
+    await crud.create_owner_data("alice", CreateOwnerData(name="b"))
+    page = await crud.get_owner_data_paginated("alice", Filters(limit=1), cursor="")
+    assert page.next_cursor
+
+    desc = Filters(limit=1, direction="desc")
+    with pytest.raises(ValueError):
+        await crud.get_owner_data_paginated("alice", desc, cursor=page.next_cursor)
+    with pytest.raises(ValueError):
+        await crud.get_owner_data_paginated("alice", cursor="not-a-cursor")
+    # owner data names can be NULL, which keyset paging cannot order by
+    with pytest.raises(ValueError):
+        await crud.get_owner_data_paginated("alice", Filters(sortby="name"), cursor="")
+
+
+@pytest.mark.asyncio
+async def test_tunnel_list_leaves_out_key_material(db, keypair):
+    data = CreateSSHTunnel(
+        name="t", remote_server_user="lnbits", remote_server_url="cloud.example.com", local_port=5000, remote_port=9000
+    )
+    tunnel = await crud.create_ssh_tunnel("wallet", data, keypair[0], keypair[1])
+
+    page = await crud.get_ssh_tunnels_paginated("wallet")
+    assert page.total == 1
+    assert isinstance(page.data[0], SSHTunnelSummary)
+    assert "private_key" not in page.data[0].dict()
+    summary = await crud.get_ssh_tunnel_summary(tunnel.id, "wallet")
+    assert summary and "public_key" not in summary.dict()
+
+    full = await crud.get_ssh_tunnel(tunnel.id, "wallet")
+    assert full and full.private_key == keypair[0]
+
+
+@pytest.mark.asyncio
+async def test_runtime_state_is_kept_apart_from_the_config_row(db, keypair):
+    data = CreateSSHTunnel(
+        name="t", remote_server_user="lnbits", remote_server_url="cloud.example.com", local_port=5000, remote_port=9000
+    )
+    tunnel = await crud.create_ssh_tunnel("wallet", data, keypair[0], keypair[1])
+    assert not (await crud.get_ssh_tunnel_by_id(tunnel.id)).is_connected
+    config_query = "SELECT * FROM lnbits_cloud_connect.ssh_tunnels"
+    config_row = await db.fetchone(config_query)
+
+    for pid in (100, 101):
+        await crud.upsert_tunnel_runtimes([TunnelRuntime(tunnel_id=tunnel.id, is_connected=True, process_id=pid)])
+    loaded = await crud.get_ssh_tunnel_by_id(tunnel.id)
+    assert (loaded.is_connected, loaded.process_id) == (True, 101)
+    assert await db.fetchone(config_query) == config_row
+    assert await crud.get_connected_ssh_tunnel_ids() == {tunnel.id: 101}
+
+    # config writes leave the runtime state alone
+    loaded.name = "renamed"
+    loaded.is_connected = False
+    await crud.update_ssh_tunnel(loaded)
+    assert (await crud.get_ssh_tunnel_by_id(tunnel.id)).is_connected
+
+    await crud.mark_ssh_tunnels_disconnected([tunnel.id])
+    assert await crud.get_connected_ssh_tunnel_ids() == {}
+    page = await crud.get_ssh_tunnels_paginated("wallet", Filters(sortby="is_connected", model=SSHTunnelFilters))
+    assert [t.is_connected for t in page.data] == [False]
+
+    await crud.delete_ssh_tunnel(tunnel.id, "wallet")
+    assert await crud.get_tunnel_runtimes() == []
+
+
+@pytest.mark.asyncio
+async def test_runtime_and_flag_queries_round_trip(db, keypair):
+    created = []
+    for i, startup_enabled in enumerate((True, False)):
+        data = CreateSSHTunnel(
+            name=f"t{i}",
+            remote_server_user="lnbits",
+            remote_server_url="cloud.example.com",
+            local_port=5000,
+            remote_port=9000 + i,
+            startup_enabled=startup_enabled,
+        )
+        created.append(await crud.create_ssh_tunnel("wallet", data, keypair[0], keypair[1]))
+    assert [t.id for t in await crud.get_startup_enabled_ssh_tunnels()] == [created[0].id]
+
+    started_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    runtime = TunnelRuntime(
+        tunnel_id=created[0].id,
+        is_connected=True,
+        process_id=7,
+        last_error="x",
+        started_at=started_at,
+        reconnect_count=3,
+    )
+    await crud.upsert_tunnel_runtimes([runtime])
+    assert await crud.get_tunnel_runtimes() == [runtime]
+
+    await crud.mark_ssh_tunnels_connected({created[1].id: 8})
+    assert await crud.get_connected_ssh_tunnel_ids() == {created[0].id: 7, created[1].id: 8}
+    assert {t.id for t in await crud.get_connected_ssh_tunnels()} == {t.id for t in created}
+
+
+@pytest.mark.asyncio
+async def test_runtime_upsert_is_one_transaction(db, monkeypatch):
+    monkeypatch.setattr(crud, "RUNTIME_UPSERT_BATCH_SIZE", 1)
+    written = TunnelRuntime(tunnel_id="t0", is_connected=True, process_id=1)
+    await crud.upsert_tunnel_runtimes([written])
+
+    # the second statement violates NOT NULL, after the first one ran
+    changed = written.copy(update={"process_id": 2})
+    broken = TunnelRuntime(tunnel_id="t1").copy(update={"reconnect_count": None})
+    with pytest.raises(IntegrityError):
+        await crud.upsert_tunnel_runtimes([changed, broken])
+    assert await crud.get_tunnel_runtimes() == [written]
+
+    await crud.upsert_tunnel_runtimes([changed, TunnelRuntime(tunnel_id="t1")])
+    assert [runtime.process_id for runtime in await crud.get_tunnel_runtimes()] == [2, None]
+
+
+@pytest.mark.asyncio
+async def test_nodes_sharing_a_database_only_see_their_own_tunnels(db, monkeypatch):
+    await crud.mark_ssh_tunnels_connected({"mine": 1})
+    node_id = crud.NODE_ID
+    monkeypatch.setattr(crud, "NODE_ID", "other-node:5000")
+    await crud.upsert_tunnel_runtimes([TunnelRuntime(tunnel_id="theirs", is_connected=True, process_id=2)])
+    assert await crud.get_connected_ssh_tunnel_ids() == {"theirs": 2}
+
+    # rows written before node ids existed count as local to every node
+    await db.execute("UPDATE lnbits_cloud_connect.tunnel_runtime SET node_id = NULL WHERE tunnel_id = 'mine'")
+    assert await crud.get_connected_ssh_tunnel_ids() == {"mine": 1, "theirs": 2}
+    monkeypatch.setattr(crud, "NODE_ID", node_id)
+    assert await crud.get_connected_ssh_tunnel_ids() == {"mine": 1}
+
+    await crud.mark_ssh_tunnels_disconnected(["mine", "theirs"])
+    assert {runtime.tunnel_id for runtime in await crud.get_tunnel_runtimes() if runtime.is_connected} == {"theirs"}
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from ..events import TunnelEvents, tunnel_events
+from ..ssh_service import SSHTunnelManager
+from ..supervisor import TunnelState
+
+
+@pytest.mark.asyncio
+async def test_events_are_scoped_per_wallet():
+    events = TunnelEvents(queue_size=2)
+    mine = events.subscribe("w1")
+    other = events.subscribe("w2")
+
+    events.publish("w1", "status", {"id": "t0"})
+    assert mine.get_nowait() == ("status", {"id": "t0"})
+    assert other.empty()
+
+    # a subscriber that falls behind is told to reload instead
+    for i in range(3):
+        events.publish("w1", "status", {"id": f"t{i}"})
+    assert mine.get_nowait() == ("resync", {})
+    assert mine.empty()
+    assert events.stats()["dropped"] == 1
+
+    events.unsubscribe("w1", mine)
+    events.unsubscribe("w2", other)
+    assert events.stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_formats_server_sent_events():
+    events = TunnelEvents()
+    stream = events.stream("w1", keepalive=0.01)
+    assert await stream.__anext__() == "retry: 5000\n\n"
+    assert await stream.__anext__() == ": keepalive\n\n"
+
+    events.publish("w1", "status", {"id": "t0", "is_connected": True})
+    assert await stream.__anext__() == 'event: status\ndata: {"id": "t0", "is_connected": true}\n\n'
+    await stream.aclose()
+    assert events.stats()["subscribers"] == 0
+
+
+@pytest.mark.asyncio
+async def test_manager_publishes_state_changes_to_the_tunnel_wallet():
+    manager = SSHTunnelManager()
+    manager.wallets["t0"] = "w1"
+    queue = tunnel_events.subscribe("w1")
+    try:
+        manager.supervisor.transition("t0", TunnelState.STARTING)
+        manager.supervisor.transition("t1", TunnelState.STARTING)
+        event, data = await asyncio.wait_for(queue.get(), timeout=1)
+        assert event == "status"
+        assert data == {"id": "t0", "state": "starting", "is_connected": False, "process_id": None}
+        assert queue.empty()
+    finally:
+        tunnel_events.unsubscribe("w1", queue)
@@ -9,3 +9,40 @@ from .. import lnbits_cloud_connect_ext
 async def test_router():
     router = APIRouter()
     router.include_router(lnbits_cloud_connect_ext)
+
+
+@pytest.mark.asyncio
+async def test_startup_starts_the_supervisor(monkeypatch):
+    from .. import start_startup_tunnels
+    from ..keypool import key_pool
+    from ..metrics import loop_lag_monitor
+    from ..spawner import process_spawner
+    from ..ssh_service import tunnel_manager
+
+    async def nothing():
+        pass
+
+    monkeypatch.setattr(key_pool, "start", lambda: None)
+    monkeypatch.setattr(process_spawner, "start", nothing)
+    monkeypatch.setattr(tunnel_manager.reconciler, "start", nothing)
+
+    await start_startup_tunnels()
+    try:
+        assert tunnel_manager.supervisor._task and not tunnel_manager.supervisor._task.done()
+    finally:
+        tunnel_manager.supervisor.stop()
+        loop_lag_monitor.stop()
+
+
+def test_start_schedules_the_invoice_listener(monkeypatch):
+    from .. import lnbits_cloud_connect_start, scheduled_tasks, start_startup_tunnels, wait_for_paid_invoices
+
+    scheduled = []
+    monkeypatch.setitem(
+        lnbits_cloud_connect_start.__globals__,
+        "create_permanent_unique_task",
+        lambda name, func: scheduled.append(func),
+    )
+    lnbits_cloud_connect_start()
+    del scheduled_tasks[-2:]
+    assert scheduled == [start_startup_tunnels, wait_for_paid_invoices]
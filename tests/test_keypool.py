@@ -0,0 +1,41 @@
+import pytest
+
+from ..helpers import generate_ssh_keypair
+from ..keypool import KeyPool
+
+
+def test_key_types():
+    private_key, public_key = generate_ssh_keypair()
+    assert "OPENSSH PRIVATE KEY" in private_key
+    assert public_key.startswith("ssh-ed25519 ")
+    private_key, public_key = generate_ssh_keypair("rsa")
+    assert "BEGIN PRIVATE KEY" in private_key
+    assert public_key.startswith("ssh-rsa ")
+    with pytest.raises(ValueError):
+        generate_ssh_keypair("dsa")
+
+
+@pytest.mark.asyncio
+async def test_pool_hands_out_ready_keys_once():
+    pool = KeyPool(size=2)
+    pool.start()
+    await pool._task
+    assert pool.stats()["ready"] == 2
+
+    first = await pool.take()
+    second = await pool.take()
+    assert first != second
+    assert pool.stats()["hits"] == 2
+    await pool._task
+    assert pool.stats()["ready"] == 2
+    assert first not in pool._keys
+    await pool.stop()
+
+
+@pytest.mark.asyncio
+async def test_disabled_pool_generates_on_demand():
+    pool = KeyPool(size=0)
+    _, public_key = await pool.take()
+    assert public_key.startswith("ssh-ed25519 ")
+    assert pool.stats() == {"size": 0, "ready": 0, "hits": 0, "misses": 1}
+    assert pool._task is None
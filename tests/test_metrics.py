@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+
+from ..metrics import MAX_SERIES, Histogram, LoopLagMonitor, MetricsRegistry
+
+
+def test_counters_and_histograms_render_prometheus_text():
+    registry = MetricsRegistry()
+    starts = registry.counter("starts_total", "Starts.", ("backend", "result"))
+    ready = registry.histogram("ready_seconds", "Ready.", ("backend",), buckets=(0.5, 1.0))
+    registry.gauge("queue_depth", "Queued.", lambda: {(): 3})
+
+    starts.inc("openssh", "success")
+    starts.inc("openssh", "success")
+    starts.inc("openssh", "failure")
+    ready.observe(0.2, "openssh")
+    ready.observe(0.7, "openssh")
+    ready.observe(4.0, "openssh")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE starts_total counter" in lines
+    assert 'starts_total{backend="openssh",result="success"} 2' in lines
+    assert 'starts_total{backend="openssh",result="failure"} 1' in lines
+    assert 'ready_seconds_bucket{backend="openssh",le="0.5"} 1' in lines
+    assert 'ready_seconds_bucket{backend="openssh",le="1.0"} 2' in lines
+    assert 'ready_seconds_bucket{backend="openssh",le="+Inf"} 3' in lines
+    assert 'ready_seconds_sum{backend="openssh"} 4.9' in lines
+    assert 'ready_seconds_count{backend="openssh"} 3' in lines
+    assert "queue_depth 3" in lines
+
+    with pytest.raises(ValueError):
+        starts.inc("openssh")
+    with pytest.raises(ValueError):
+        registry.counter("starts_total", "Again.")
+
+
+def test_label_sets_are_bounded():
+    registry = MetricsRegistry()
+    counter = registry.counter("per_tunnel_total", "A label it should not have.", ("tunnel",))
+    for i in range(MAX_SERIES * 3):
+        counter.inc(f"t{i}")
+    assert len(counter.values) == MAX_SERIES
+    assert counter.dropped == MAX_SERIES * 2
+    # label sets already kept still count
+    counter.inc("t0")
+    assert counter.get("t0") == 2
+
+    registry.gauge("broken", "Fails to collect.", lambda: 1 / 0)
+    assert "# TYPE broken gauge" in registry.render()
+
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor_sees_a_blocked_loop():
+    lag = Histogram("lag_seconds", "Lag.", buckets=(0.01, 0.1))
+    monitor = LoopLagMonitor(lag, interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.02)
+    time.sleep(0.15)
+    await asyncio.sleep(0.02)
+    monitor.stop()
+    assert lag.count() >= 1
+    counts, (total, _) = lag.series[()]
+    assert counts[-1] >= 1
+    assert total >= 0.1
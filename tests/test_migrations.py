@@ -0,0 +1,35 @@
+import pytest
+from lnbits.db import DB_TYPE, SQLITE, Database
+from lnbits.settings import settings
+
+from .. import migrations
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(DB_TYPE != SQLITE, reason="reads SQLite query plans")
+async def test_lookups_use_indexes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "lnbits_data_folder", str(tmp_path))
+    db = Database("ext_lnbits_cloud_connect")
+    async with db.connect() as conn:
+        for name in sorted(n for n in dir(migrations) if n[:1] == "m" and n[1:4].isdigit()):
+            await getattr(migrations, name)(conn)
+
+    lookups = {
+        "SELECT * FROM lnbits_cloud_connect.ssh_tunnels WHERE wallet_id = 'w' ORDER BY created_at": (
+            "idx_ssh_tunnels_wallet_id_created_at"
+        ),
+        "SELECT tunnel_id, process_id FROM lnbits_cloud_connect.tunnel_runtime WHERE is_connected = TRUE": (
+            "idx_tunnel_runtime_connected"
+        ),
+        "SELECT * FROM lnbits_cloud_connect.ssh_tunnels WHERE startup_enabled = TRUE": "idx_ssh_tunnels_startup",
+        "SELECT id FROM lnbits_cloud_connect.owner_data WHERE user_id = 'u'": "idx_owner_data_user_id_created_at",
+        "SELECT * FROM lnbits_cloud_connect.client_data WHERE owner_data_id = 'o' ORDER BY created_at": (
+            "idx_client_data_owner_data_id_created_at"
+        ),
+    }
+    try:
+        for query, index in lookups.items():
+            plan = await db.fetchall(f"EXPLAIN QUERY PLAN {query}")
+            assert any(index in row["detail"] for row in plan), plan
+    finally:
+        await db.engine.dispose()
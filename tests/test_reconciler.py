@@ -0,0 +1,151 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from ..models import SSHTunnel
+from ..ssh_service import SSHTunnelManager, TunnelBackend, TunnelHandle, TunnelLog
+
+
+class FakeHandle(TunnelHandle):
+    backend = "fake"
+
+    def __init__(self):
+        self.closed = asyncio.Event()
+
+    @property
+    def exit_code(self):
+        return 0 if self.closed.is_set() else None
+
+    async def wait(self):
+        await self.closed.wait()
+
+    async def terminate(self):
+        self.closed.set()
+
+
+class FakeBackend(TunnelBackend):
+    """
+    Opens forwards instantly, or fails them for the tunnels in `failing`.
+    """
+
+    name = "fake"
+
+    def __init__(self):
+        self.opened: Counter = Counter()
+        self.failing: set[str] = set()
+
+    async def open(self, tunnel: SSHTunnel, log: TunnelLog) -> TunnelHandle:
+        await asyncio.sleep(0.01)
+        self.opened[tunnel.id] += 1
+        if tunnel.id in self.failing:
+            raise RuntimeError("remote host unreachable")
+        return FakeHandle()
+
+
+def make_tunnel(tunnel_id: str, **kwargs) -> SSHTunnel:
+    return SSHTunnel(
+        id=tunnel_id,
+        wallet_id="wallet",
+        name=tunnel_id,
+        remote_server_user="lnbits",
+        remote_server_url="cloud.example.com",
+        local_port=5000,
+        remote_port=6000,
+        private_key="private",
+        public_key="public",
+        backend="fake",
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def manager() -> SSHTunnelManager:
+    manager = SSHTunnelManager()
+    manager.backends["fake"] = FakeBackend()
+    manager.reconnects.base_delay = 60
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_boot_starts_each_desired_tunnel_once(manager, tunnel_store):
+    for tunnel in [
+        make_tunnel("startup", startup_enabled=True, auto_reconnect=False),
+        make_tunnel("was_connected", is_connected=True),
+        make_tunnel("idle"),
+        make_tunnel("manually_disconnected", is_connected=True, auto_reconnect=False),
+        make_tunnel("unreachable", startup_enabled=True),
+    ]:
+        tunnel_store.tunnels[tunnel.id] = tunnel
+    backend = manager.backends["fake"]
+    backend.failing.add("unreachable")
+
+    try:
+        reports = await asyncio.gather(manager.reconciler.reconcile(boot=True), manager.reconciler.reconcile(boot=True))
+
+        assert backend.opened == {"startup": 1, "was_connected": 1, "unreachable": 1}
+        assert set(manager.active_tunnels) == {"startup", "was_connected"}
+        assert reports[0]["failed"] == ["unreachable"]
+        assert reports[1]["started"] == 0
+        assert manager.reconnects.is_pending("unreachable")
+        assert manager.supervisor.get_state("unreachable") == "backing_off"
+    finally:
+        await manager.stop_all_tunnels()
+
+
+@pytest.mark.asyncio
+async def test_changes_are_reconciled_on_request(manager, tunnel_store):
+    for tunnel in [make_tunnel("t0", is_connected=True), make_tunnel("t1", is_connected=True)]:
+        tunnel_store.tunnels[tunnel.id] = tunnel
+    backend = manager.backends["fake"]
+
+    try:
+        await manager.reconciler.start()
+        first = manager.active_tunnels["t0"]
+
+        tunnel_store.tunnels["t0"] = tunnel_store.tunnels["t0"].copy(update={"remote_port": 6001})
+        del tunnel_store.tunnels["t1"]
+        manager.reconciler.request()
+        manager.reconciler.request()
+        for _ in range(100):
+            if manager.reconciler.last_report["restarted"]:
+                break
+            await asyncio.sleep(0.01)
+
+        assert manager.reconciler.last_report["restarted"] == ["t0"]
+        assert manager.reconciler.last_report["stopped"] == ["t1"]
+        assert manager.active_tunnels["t0"] is not first
+        assert first.closed.is_set()
+        assert set(manager.active_tunnels) == {"t0"}
+        assert backend.opened == {"t0": 2, "t1": 1}
+    finally:
+        await manager.stop_all_tunnels()
+
+
+@pytest.mark.asyncio
+async def test_auto_reconnect_tunnels_come_back_after_a_graceful_restart(manager, tunnel_store):
+    for tunnel in [
+        make_tunnel("auto", is_connected=True),
+        make_tunnel("manually_disconnected", is_connected=True, auto_reconnect=False),
+    ]:
+        tunnel_store.tunnels[tunnel.id] = tunnel
+        tunnel_store.status[tunnel.id] = (True, None)
+
+    await manager.reconciler.reconcile(boot=True)
+    await manager.runtime.flush()
+    assert tunnel_store.status["manually_disconnected"] == (False, None)
+    await manager.stop_all_tunnels()
+    assert tunnel_store.status["auto"] == (True, None)
+
+    # the next run sees what the previous one left in tunnel_runtime
+    for tunnel_id, (connected, pid) in tunnel_store.status.items():
+        tunnel_store.tunnels[tunnel_id] = tunnel_store.tunnels[tunnel_id].copy(
+            update={"is_connected": connected, "process_id": pid}
+        )
+    restarted = SSHTunnelManager()
+    restarted.backends["fake"] = FakeBackend()
+    try:
+        await restarted.reconciler.reconcile(boot=True)
+        assert set(restarted.active_tunnels) == {"auto"}
+    finally:
+        await restarted.stop_all_tunnels()
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from ..reconnect import ReconnectScheduler, backoff_delay
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(100):
+        delay = backoff_delay(attempt, base=1.0, cap=30.0)
+        assert 0 <= delay <= min(30.0, 2**attempt)
+
+
+@pytest.mark.asyncio
+async def test_failing_host_is_probed_by_one_tunnel_then_ramps_up():
+    calls: list[str] = []
+    in_flight = {"now": 0, "max_while_down": 0, "max": 0}
+    host_down = {"failures_left": 3}
+
+    async def reconnect(tunnel_id: str):
+        calls.append(tunnel_id)
+        if tunnel_id == "other":
+            return True
+        in_flight["now"] += 1
+        if host_down["failures_left"]:
+            in_flight["max_while_down"] = max(in_flight["max_while_down"], in_flight["now"])
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        if host_down["failures_left"]:
+            host_down["failures_left"] -= 1
+            return False
+        return True
+
+    scheduler = ReconnectScheduler(reconnect, base_delay=0.01, max_delay=0.05, ramp_up_initial=1, ramp_up_max=4)
+    for i in range(10):
+        scheduler.schedule(f"t{i}", "cloud.example.com")
+    scheduler.schedule("other", "other.example.com")
+
+    for _ in range(200):
+        if not scheduler.entries:
+            break
+        await asyncio.sleep(0.01)
+
+    assert not scheduler.entries
+    assert in_flight["max_while_down"] == 1
+    assert in_flight["max"] <= 4
+    assert len(calls) == 11 + 3
+    assert scheduler.hosts["cloud.example.com"].failures == 0
+
+
+@pytest.mark.asyncio
+async def test_cancel_and_drop():
+    async def reconnect(tunnel_id: str):
+        return None
+
+    scheduler = ReconnectScheduler(reconnect, base_delay=0.01)
+    scheduler.schedule("gone", "cloud.example.com")
+    scheduler.schedule("cancelled", "cloud.example.com")
+    assert scheduler.get_state("cancelled")["host"] == "cloud.example.com"
+    scheduler.cancel("cancelled")
+    assert scheduler.get_state("cancelled") is None
+
+    await asyncio.sleep(0.1)
+    assert not scheduler.entries
+    scheduler.stop()
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from .. import runtime
+from ..runtime import RuntimeStore
+
+
+@pytest.mark.asyncio
+async def test_only_changes_are_written(tunnel_store):
+    tunnel_store.status["t0"] = (True, 10)
+    store = RuntimeStore()
+    await store.load()
+
+    assert not store.update("t0", is_connected=True, process_id=10)
+    assert store.update("t1", is_connected=True, process_id=11)
+    assert store.update("t0", is_connected=False, process_id=None)
+    assert store.update("t0", last_error="gone")
+    assert store.pending == 2
+
+    await store.flush()
+    assert tunnel_store.writes == 2
+    assert tunnel_store.status == {"t0": (False, None), "t1": (True, 11)}
+    await store.flush()
+    assert tunnel_store.writes == 2
+    assert store.stats()["skipped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_retried(tunnel_store, monkeypatch):
+    store = RuntimeStore()
+    store.update("t0", is_connected=True, process_id=10)
+
+    async def fail(runtimes):
+        raise ConnectionError("database is locked")
+
+    monkeypatch.setattr(runtime, "upsert_tunnel_runtimes", fail)
+    with pytest.raises(ConnectionError):
+        await store.flush()
+    assert store.is_dirty("t0")
+
+    monkeypatch.setattr(runtime, "upsert_tunnel_runtimes", tunnel_store.upsert_tunnel_runtimes)
+    await store.flush()
+    assert tunnel_store.status["t0"] == (True, 10)
+    assert not store.is_dirty("t0")
+
+
+@pytest.mark.asyncio
+async def test_changes_within_the_window_are_merged(tunnel_store):
+    store = RuntimeStore(flush_window=0.05)
+    store.update("t0", is_connected=True, process_id=10)
+    store.update("t0", is_connected=False, process_id=None)
+    store.update("t0", is_connected=True, process_id=12)
+    store.update("t1", is_connected=True, process_id=11)
+    assert tunnel_store.writes == 0
+
+    await asyncio.sleep(0.2)
+    assert tunnel_store.writes == 2
+    assert tunnel_store.status == {"t0": (True, 12), "t1": (True, 11)}
+    stats = store.stats()
+    assert stats["merged"] == 2
+    assert stats["flushes"] == 1
+    assert stats["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_background_failure_reports_and_keeps_queued(tunnel_store, monkeypatch):
+    errors = []
+    store = RuntimeStore(flush_window=0.01, on_error=lambda: errors.append(True))
+
+    async def fail(runtimes):
+        raise ConnectionError("database is locked")
+
+    monkeypatch.setattr(runtime, "upsert_tunnel_runtimes", fail)
+    store.update("t0", is_connected=True, process_id=10)
+    await asyncio.sleep(0.1)
+    assert errors == [True]
+    assert store.stats()["failures"] == 1
+    assert store.is_dirty("t0")
+
+    monkeypatch.setattr(runtime, "upsert_tunnel_runtimes", tunnel_store.upsert_tunnel_runtimes)
+    await store.close()
+    assert tunnel_store.status["t0"] == (True, 10)
+    assert store.pending == 0
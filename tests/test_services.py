@@ -0,0 +1,42 @@
+import pytest
+
+from .. import crud
+from ..models import CreateClientData, CreateOwnerData, CreateSSHTunnel
+from ..services import get_dashboard
+
+
+@pytest.mark.asyncio
+async def test_dashboard_returns_the_first_page_of_every_section(db, keypair):
+    owner_data = [await crud.create_owner_data("alice", CreateOwnerData(name=f"o{i}")) for i in range(3)]
+    await crud.create_owner_data("bob", CreateOwnerData(name="b"))
+    await crud.create_client_data(owner_data[0].id, CreateClientData(name="c"))
+    data = CreateSSHTunnel(
+        name="t", remote_server_user="lnbits", remote_server_url="cloud.example.com", local_port=5000, remote_port=9000
+    )
+    tunnel = await crud.create_ssh_tunnel("wallet", data, keypair[0], keypair[1])
+
+    dashboard = await get_dashboard("alice", "wallet", limit=2)
+    assert "sat" not in dashboard["currencies"] and "USD" in dashboard["currencies"]
+    assert dashboard["owner_data"]["total"] == 3
+    assert len(dashboard["owner_data"]["data"]) == 2
+    assert dashboard["client_data"]["total"] == 1
+    assert dashboard["ssh_tunnels"]["data"][0]["id"] == tunnel.id
+    assert "private_key" not in dashboard["ssh_tunnels"]["data"][0]
+
+
+@pytest.mark.asyncio
+async def test_dashboard_sections_and_fields_can_be_selected(db):
+    await crud.create_owner_data("alice", CreateOwnerData(name="o"))
+
+    dashboard = await get_dashboard(
+        "alice", "wallet", sections=["owner_data", "ssh_tunnels"], fields={"owner_data": ["id", "name"]}
+    )
+    assert set(dashboard) == {"owner_data", "ssh_tunnels"}
+    assert set(dashboard["owner_data"]["data"][0]) == {"id", "name"}
+
+    with pytest.raises(ValueError):
+        await get_dashboard("alice", "wallet", sections=["payments"])
+    with pytest.raises(ValueError):
+        await get_dashboard("alice", "wallet", fields={"owner_data": ["secret"]})
+    with pytest.raises(ValueError):
+        await get_dashboard("alice", "wallet", fields={"currencies": ["id"]})
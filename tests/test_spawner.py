@@ -0,0 +1,70 @@
+import asyncio
+import os
+import signal
+
+import pytest
+
+from ..spawner import SpawnedProcess, spawn_process
+
+
+@pytest.mark.asyncio
+async def test_spawned_process_output_and_exit_code(spawner):
+    process = await spawn_process("sh", "-c", "echo out; echo err >&2; exit 3")
+    assert isinstance(process, SpawnedProcess)
+    assert process.pid
+
+    stdout, stderr = await process.communicate()
+    assert stdout == b"out\n"
+    assert stderr == b"err\n"
+    assert process.returncode == 3
+    assert not spawner.children
+
+
+@pytest.mark.asyncio
+async def test_spawned_process_terminate(spawner):
+    process = await spawn_process("sh", "-c", "exec sleep 5")
+    process.terminate()
+    assert await asyncio.wait_for(process.wait(), timeout=5) == -signal.SIGTERM
+
+
+@pytest.mark.asyncio
+async def test_spawn_missing_command_raises(spawner):
+    with pytest.raises(FileNotFoundError):
+        await spawn_process("lnbits-no-such-command")
+
+
+@pytest.mark.asyncio
+async def test_spawner_stop_kills_children(spawner):
+    process = await spawn_process("sh", "-c", "exec sleep 5")
+    await spawner.stop()
+    assert await asyncio.wait_for(process.wait(), timeout=5) != 0
+    assert not spawner.is_running
+
+    # falls back to forking directly once the helper is gone
+    direct = await spawn_process("true")
+    assert not isinstance(direct, SpawnedProcess)
+    assert await direct.wait() == 0
+
+
+@pytest.mark.asyncio
+async def test_only_adoptable_children_outlive_helper_without_shutdown(spawner):
+    # writes after the helper is gone, which a pipe would answer with SIGPIPE
+    adoptable = await spawn_process("sh", "-c", "sleep 0.5; echo late; echo late >&2; exec sleep 5", adoptable=True)
+    other = await spawn_process("sh", "-c", "exec sleep 5")
+    # LNbits going away closes the helper's stdin without a shutdown request
+    spawner.process.stdin.close()
+    await asyncio.wait_for(spawner._reader, timeout=5)
+    await asyncio.sleep(1)
+    try:
+        assert is_alive(adoptable.pid)
+        assert not is_alive(other.pid)
+    finally:
+        os.kill(adoptable.pid, signal.SIGKILL)
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,163 @@
+import asyncio
+import tempfile
+import time
+
+import pytest
+
+from ..models import SSHTunnel
+from ..ssh_service import (
+    ProcessHandle,
+    SSHTunnelManager,
+    TunnelLog,
+    interleave_by_host,
+    parse_log_level,
+    wait_for_forward_ready,
+)
+
+
+def make_tunnel(tunnel_id: str, host: str = "cloud.example.com") -> SSHTunnel:
+    return SSHTunnel(
+        id=tunnel_id,
+        wallet_id="wallet",
+        name=tunnel_id,
+        remote_server_user="lnbits",
+        remote_server_url=host,
+        local_port=5000,
+        remote_port=6000,
+        private_key="private",
+        public_key="public",
+    )
+
+
+def test_interleave_by_host():
+    tunnels = [
+        make_tunnel("a1", "a"),
+        make_tunnel("a2", "a"),
+        make_tunnel("a3", "a"),
+        make_tunnel("b1", "b"),
+        make_tunnel("c1", "c"),
+        make_tunnel("b2", "b"),
+    ]
+    ordered = [t.id for t in interleave_by_host(tunnels)]
+    assert ordered == ["a1", "b1", "c1", "a2", "b2", "a3"]
+
+
+@pytest.mark.asyncio
+async def test_start_tunnels_bounded_concurrency():
+    manager = SSHTunnelManager(startup_concurrency=4, startup_per_host_concurrency=2)
+    running = {"total": 0, "max_total": 0}
+    per_host: dict[str, int] = {}
+    max_per_host: dict[str, int] = {}
+
+    async def fake_start(tunnel: SSHTunnel) -> bool:
+        host = tunnel.remote_server_url
+        running["total"] += 1
+        per_host[host] = per_host.get(host, 0) + 1
+        running["max_total"] = max(running["max_total"], running["total"])
+        max_per_host[host] = max(max_per_host.get(host, 0), per_host[host])
+        await asyncio.sleep(0.01)
+        running["total"] -= 1
+        per_host[host] -= 1
+        return tunnel.id != "b-0"
+
+    manager.start_tunnel = fake_start  # type: ignore[method-assign]
+    tunnels = [make_tunnel(f"{host}-{i}", host) for host in "abc" for i in range(5)]
+
+    report = await manager.start_tunnels(tunnels)
+
+    assert running["max_total"] == 4
+    assert max(max_per_host.values()) <= 2
+    assert report["total"] == 15
+    assert report["started"] == 14
+    assert report["failed"] == ["b-0"]
+    assert set(report["time_to_ready"]) == {t.id for t in tunnels} - {"b-0"}
+
+
+async def spawn_shell(script: str) -> asyncio.subprocess.Process:
+    return await asyncio.create_subprocess_exec(
+        "sh", "-c", script, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+
+
+@pytest.mark.asyncio
+async def test_wait_for_forward_ready():
+    process = await spawn_shell(
+        "echo 'debug1: Authentication succeeded (publickey).' >&2; "
+        "echo 'debug1: remote forward success for: listen 127.0.0.1:6000, connect lnbits.embassy:5000' >&2; "
+        "exec sleep 5"
+    )
+    log = TunnelLog()
+    log.attach(process)
+    await wait_for_forward_ready(process, log, timeout=2)
+    assert process.returncode is None
+    process.kill()
+    await process.wait()
+
+
+@pytest.mark.asyncio
+async def test_wait_for_forward_ready_process_exits():
+    process = await spawn_shell("echo 'Permission denied (publickey).' >&2; exit 255")
+    log = TunnelLog()
+    log.attach(process)
+    with pytest.raises(RuntimeError, match="Permission denied"):
+        await wait_for_forward_ready(process, log, timeout=2)
+
+
+@pytest.mark.asyncio
+async def test_wait_for_forward_ready_timeout():
+    process = await spawn_shell("echo 'debug1: Connecting to cloud.example.com' >&2; exec sleep 5")
+    log = TunnelLog()
+    log.attach(process)
+    with pytest.raises(RuntimeError, match="not ready after"):
+        await wait_for_forward_ready(process, log, timeout=0.2)
+    process.kill()
+    await process.wait()
+
+
+def test_parse_log_level():
+    assert parse_log_level("debug1: Reading configuration data /etc/ssh/ssh_config") == "debug"
+    assert parse_log_level("Warning: Permanently added 'cloud.example.com' to the list of known hosts.") == "warning"
+    assert parse_log_level("lnbits@cloud.example.com: Permission denied (publickey).") == "error"
+    assert parse_log_level("Transferred: sent 2836, received 2556 bytes") == "info"
+
+
+@pytest.mark.asyncio
+async def test_tunnel_log_ring_buffer():
+    process = await spawn_shell('for i in $(seq 1 50); do echo "debug1: line $i" >&2; done')
+    log = TunnelLog(size=10)
+    log.attach(process)
+    await process.wait()
+    await log.drained()
+
+    assert len(log.tail()) == 10
+    assert [e.message for e in log.tail(2)] == ["debug1: line 49", "debug1: line 50"]
+    assert all(e.stream == "stderr" and e.level == "debug" for e in log.tail())
+
+
+@pytest.mark.asyncio
+async def test_stop_all_tunnels_shares_one_deadline(tunnel_store):
+    manager = SSHTunnelManager()
+    processes = []
+    for i in range(6):
+        # half of the tunnels ignore SIGTERM and have to be killed
+        script = "trap '' TERM; echo ready; exec sleep 30" if i % 2 else "echo ready; exec sleep 30"
+        process = await spawn_shell(script)
+        # SIGTERM must not arrive before the trap is set
+        await process.stdout.readline()
+        key_file = tempfile.NamedTemporaryFile(suffix=".key", delete=False)
+        manager.active_tunnels[f"t{i}"] = ProcessHandle(process, key_file.name)
+        processes.append(process)
+        tunnel_store.status[f"t{i}"] = (True, process.pid)
+    await manager.runtime.load()
+
+    started_at = time.monotonic()
+    report = await manager.stop_all_tunnels(deadline=0.5)
+
+    assert time.monotonic() - started_at < 2
+    assert report["stopped"] == 6
+    assert report["killed"] == 3
+    assert all(process.returncode is not None for process in processes)
+    assert tunnel_store.writes == 6
+    # still marked connected, so the next boot starts them again
+    assert all(status == (True, None) for status in tunnel_store.status.values())
+    assert manager.supervisor.get_state("t1") == "stopped"
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from .. import supervisor
+from ..supervisor import TunnelState, TunnelSupervisor
+
+
+@pytest.mark.asyncio
+async def test_audit_repairs_drift_in_batches(tunnel_store, monkeypatch):
+    monkeypatch.setattr(supervisor, "AUDIT_BATCH_SIZE", 2)
+    tunnel_store.status = {
+        "stale1": (True, 11),
+        "stale2": (True, 12),
+        "stale3": (True, 13),
+        "ok": (True, 20),
+        "moved": (True, 30),
+        "gone": (False, None),
+    }
+    running = {"ok": 20, "moved": 31, "new": 40}
+    tunnel_supervisor = TunnelSupervisor(lambda: running)
+
+    result = await tunnel_supervisor.audit()
+
+    assert result == {"disconnected": ["stale1", "stale2", "stale3"], "connected": ["moved", "new"]}
+    assert tunnel_store.batches == [["stale1", "stale2"], ["stale3"], ["moved", "new"]]
+    assert tunnel_store.status["stale3"] == (False, None)
+    assert tunnel_store.status["moved"] == (True, 31)
+    assert tunnel_store.status["new"] == (True, 40)
+    assert tunnel_supervisor.stats()["drift"] == {
+        "db_connected_not_running": 3,
+        "db_disconnected_running": 1,
+        "db_wrong_process_id": 1,
+    }
+
+    tunnel_store.batches.clear()
+    assert await tunnel_supervisor.audit() == {"disconnected": [], "connected": []}
+    assert tunnel_store.batches == []
+
+
+@pytest.mark.asyncio
+async def test_degraded_tunnel_recovers_when_errors_stop():
+    tunnel_supervisor = TunnelSupervisor(dict, degraded_recovery=0.05)
+
+    tunnel_supervisor.report_error("t0")
+    assert tunnel_supervisor.get_state("t0") == TunnelState.STOPPED
+
+    tunnel_supervisor.transition("t0", TunnelState.STARTING)
+    tunnel_supervisor.transition("t0", TunnelState.READY)
+    tunnel_supervisor.report_error("t0")
+    assert tunnel_supervisor.get_state("t0") == TunnelState.DEGRADED
+
+    await asyncio.sleep(0.03)
+    tunnel_supervisor.report_error("t0")
+    await asyncio.sleep(0.03)
+    assert tunnel_supervisor.get_state("t0") == TunnelState.DEGRADED
+    await asyncio.sleep(0.05)
+    assert tunnel_supervisor.get_state("t0") == TunnelState.READY
+    assert tunnel_supervisor.stats()["states"] == {"ready": 1}
+
+
+def test_unexpected_transition_is_applied_and_counted():
+    tunnel_supervisor = TunnelSupervisor(dict)
+    tunnel_supervisor.transition("t0", TunnelState.READY)
+    assert tunnel_supervisor.get_state("t0") == TunnelState.READY
+    assert tunnel_supervisor.drift["invalid_transition"] == 1
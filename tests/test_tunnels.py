@@ -0,0 +1,225 @@
+import asyncio
+import os
+import shutil
+import socket
+
+import pytest
+
+from ..models import SSHTunnel
+from ..ssh_service import SSHTunnelManager, read_ssh_cmdline
+
+pytestmark = pytest.mark.skipif(shutil.which("ssh") is None, reason="OpenSSH client not installed")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def roundtrip(port: int) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"ping")
+    await writer.drain()
+    data = await reader.read(1024)
+    writer.close()
+    return data
+
+
+def make_tunnel(tunnel_id: str, server: str, local_port: int, keypair, backend: str) -> SSHTunnel:
+    return SSHTunnel(
+        id=tunnel_id,
+        wallet_id="wallet",
+        name=tunnel_id,
+        remote_server_user="lnbits",
+        remote_server_url=server,
+        local_port=local_port,
+        remote_port=free_port(),
+        private_key=keypair[0],
+        public_key=keypair[1],
+        backend=backend,
+    )
+
+
+BACKENDS = ["openssh", "asyncssh"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_tunnels_forward_traffic(backend, tunnel_store, ssh_server, echo_server, keypair):
+    manager = SSHTunnelManager(local_host="127.0.0.1", ready_timeout=10)
+    tunnels = [make_tunnel(f"t{i}", ssh_server, echo_server, keypair, backend) for i in range(3)]
+    for tunnel in tunnels:
+        tunnel_store.tunnels[tunnel.id] = tunnel
+
+    try:
+        report = await manager.start_tunnels(tunnels)
+        assert report["started"] == 3
+        await manager.runtime.flush()
+        for tunnel in tunnels:
+            assert await roundtrip(tunnel.remote_port) == b"echo:ping"
+            assert tunnel_store.status[tunnel.id][0] is True
+
+        statuses = [await manager.get_tunnel_status(t.id) for t in tunnels]
+        assert {status["backend"] for status in statuses} == {backend}
+        assert {status["state"] for status in statuses} == {"ready"}
+        assert all(status["time_to_ready"] is not None for status in statuses)
+        assert all(status["uptime"] is not None for status in statuses)
+        assert {status["consecutive_failures"] for status in statuses} == {0}
+        assert [s["tunnel_id"] for s in await manager.get_wallet_tunnel_statuses("wallet")] == ["t0", "t1", "t2"]
+        pids = {status["process_id"] for status in statuses}
+        if backend == "asyncssh":
+            assert pids == {None}
+            assert statuses[0]["stats"]["bytes_in"] == len(b"ping")
+            assert statuses[0]["stats"]["bytes_out"] == len(b"echo:ping")
+        else:
+            assert len(pids) == 3
+
+        assert await manager.stop_tunnel("t0", manual_disconnect=False)
+        await manager.runtime.flush()
+        assert tunnel_store.status["t0"][0] is False
+        assert manager.supervisor.get_state("t0") == "stopped"
+        with pytest.raises(OSError):
+            await roundtrip(tunnels[0].remote_port)
+        assert await roundtrip(tunnels[1].remote_port) == b"echo:ping"
+    finally:
+        await manager.stop_all_tunnels()
+
+    assert await manager.get_all_active_tunnels() == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_tunnel_reconnects_after_server_drop(backend, tunnel_store, ssh_server, echo_server, keypair):
+    manager = SSHTunnelManager(local_host="127.0.0.1", ready_timeout=10)
+    manager.reconnects.base_delay = 0.05
+    tunnel = make_tunnel("t0", ssh_server, echo_server, keypair, backend)
+    tunnel_store.tunnels[tunnel.id] = tunnel
+
+    try:
+        assert await manager.start_tunnel(tunnel)
+        first = manager.active_tunnels[tunnel.id]
+        first.kill()
+
+        for _ in range(100):
+            current = manager.active_tunnels.get(tunnel.id)
+            if current and current is not first:
+                break
+            await asyncio.sleep(0.05)
+
+        assert manager.active_tunnels[tunnel.id] is not first
+        assert manager.supervisor.get_state(tunnel.id) == "ready"
+        assert await roundtrip(tunnel.remote_port) == b"echo:ping"
+        await manager.runtime.flush()
+        assert tunnel_store.status[tunnel.id][0] is True
+        status = await manager.get_tunnel_status(tunnel.id)
+        assert status["reconnect_count"] == 1
+        assert status["consecutive_failures"] == 0
+        assert status["last_error"]
+    finally:
+        await manager.stop_all_tunnels()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", BACKENDS)
+async def test_rejected_key_fails_start(backend, tunnel_store, ssh_server, echo_server):
+    from ..helpers import generate_ssh_keypair
+
+    manager = SSHTunnelManager(local_host="127.0.0.1", ready_timeout=10)
+    tunnel = make_tunnel("t0", ssh_server, echo_server, generate_ssh_keypair(), backend)
+
+    assert not await manager.start_tunnel(tunnel)
+    assert tunnel.id not in manager.active_tunnels
+    await manager.runtime.flush()
+    assert tunnel_store.status[tunnel.id] == (False, None)
+    assert manager.supervisor.get_state(tunnel.id) == "stopped"
+    assert any(e.level == "error" for e in manager.get_tunnel_logs(tunnel.id))
+    status = await manager.get_tunnel_status(tunnel.id)
+    assert status["consecutive_failures"] == 1
+    assert status["time_to_ready"] is None
+
+
+@pytest.mark.asyncio
+async def test_openssh_tunnel_through_spawner(spawner, tunnel_store, ssh_server, echo_server, keypair):
+    manager = SSHTunnelManager(local_host="127.0.0.1", ready_timeout=10)
+    tunnel = make_tunnel("t0", ssh_server, echo_server, keypair, "openssh")
+    tunnel_store.tunnels[tunnel.id] = tunnel
+
+    try:
+        assert await manager.start_tunnel(tunnel)
+        assert await roundtrip(tunnel.remote_port) == b"echo:ping"
+
+        pid = manager.active_tunnels[tunnel.id].pid
+        with open(f"/proc/{pid}/stat") as f:
+            parent_pid = int(f.read().rsplit(")", 1)[1].split()[1])
+        assert parent_pid == spawner.process.pid
+    finally:
+        await manager.stop_all_tunnels()
+
+
+async def start_leftover_process(tunnel: SSHTunnel, tunnel_store, spawner) -> tuple[int, str]:
+    """
+    Start a tunnel through the spawner helper, then let LNbits "crash": the
+    helper loses its stdin and exits, and ssh has to keep forwarding alone.
+    """
+    crashed = SSHTunnelManager(local_host="127.0.0.1", ready_timeout=10)
+    tunnel_store.tunnels[tunnel.id] = tunnel
+    assert await crashed.start_tunnel(tunnel)
+    # nothing of the crashed LNbits runs anymore
+    handle = crashed.active_tunnels.pop(tunnel.id)
+    log = crashed._get_log(tunnel.id)
+    for reader in log._readers:
+        reader.cancel()
+
+    assert spawner.process and spawner.process.stdin
+    spawner.process.stdin.close()
+    await spawner._reader
+    assert not spawner.is_running
+
+    # ssh has no pipe left to write to, its debug output goes to the -E file
+    assert os.readlink(f"/proc/{handle.pid}/fd/2") == "/dev/null"
+    await asyncio.sleep(0.5)
+    assert await roundtrip(tunnel.remote_port) == b"echo:ping"
+    assert read_ssh_cmdline(handle.pid) is not None
+    return handle.pid, handle.key_file_path
+
+
+@pytest.mark.asyncio
+async def test_surviving_ssh_process_is_adopted(spawner, tunnel_store, ssh_server, echo_server, keypair):
+    tunnel = make_tunnel("t0", ssh_server, echo_server, keypair, "openssh")
+    pid, key_file_path = await start_leftover_process(tunnel, tunnel_store, spawner)
+
+    manager = SSHTunnelManager(local_host="127.0.0.1", ready_timeout=10)
+    try:
+        report = await manager.adopt_tunnels([tunnel.copy(update={"process_id": pid})])
+        assert report == {"adopted": ["t0"], "killed": []}
+
+        status = await manager.get_tunnel_status("t0")
+        assert status["process_id"] == pid
+        assert status["state"] == "ready"
+        assert await roundtrip(tunnel.remote_port) == b"echo:ping"
+
+        assert await manager.stop_tunnel("t0", manual_disconnect=False)
+        assert read_ssh_cmdline(pid) is None
+        assert not os.path.exists(key_file_path)
+        assert not os.path.exists(key_file_path.removesuffix(".key") + ".log")
+    finally:
+        await manager.stop_all_tunnels()
+
+
+@pytest.mark.asyncio
+async def test_mismatching_ssh_process_is_stopped(spawner, tunnel_store, ssh_server, echo_server, keypair):
+    tunnel = make_tunnel("t0", ssh_server, echo_server, keypair, "openssh")
+    pid, key_file_path = await start_leftover_process(tunnel, tunnel_store, spawner)
+
+    manager = SSHTunnelManager(local_host="127.0.0.1", ready_timeout=10)
+    # the remote port was changed while LNbits was down
+    changed = tunnel.copy(update={"process_id": pid, "remote_port": free_port()})
+    # a stored PID that is now used by some other program
+    reused = make_tunnel("t1", ssh_server, echo_server, keypair, "openssh").copy(update={"process_id": os.getpid()})
+
+    report = await manager.adopt_tunnels([changed, reused])
+    assert report == {"adopted": [], "killed": [pid]}
+    assert read_ssh_cmdline(pid) is None
+    assert not os.path.exists(key_file_path)
+    assert manager.active_tunnels == {}
@@ -0,0 +1,130 @@
+import importlib.util
+from datetime import datetime, timezone
+from http import HTTPStatus
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from lnbits.core.models import User, Wallet
+from lnbits.decorators import check_user_exists
+
+from .. import crud
+from ..models import CreateOwnerData, CreateSSHTunnel, TunnelRuntime, available_ssh_tunnel_backends
+from ..views_api import lnbits_cloud_connect_api_router
+
+
+@pytest_asyncio.fixture
+async def client(db):
+    app = FastAPI()
+    app.include_router(lnbits_cloud_connect_api_router)
+    now = datetime.now(timezone.utc)
+    wallet = Wallet(id="wallet", user="alice", adminkey="a", inkey="i", name="w")
+    user = User(id="alice", wallets=[wallet], created_at=now, updated_at=now)
+    app.dependency_overrides[check_user_exists] = lambda: user
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.asyncio
+async def test_list_is_not_modified_until_a_write(client, keypair, monkeypatch):
+    await crud.create_owner_data("alice", CreateOwnerData(name="o"))
+    url = "/api/v1/owner_data/paginated?limit=10"
+    first = await client.get(url)
+    etag = first.headers["etag"]
+
+    # answered without touching the database
+    async def fail(*args, **kwargs):
+        raise AssertionError("queried the database")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(crud.db, "fetch_page", fail)
+        patch.setattr(crud.db, "fetchall", fail)
+        cached = await client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == HTTPStatus.NOT_MODIFIED
+    assert cached.headers["etag"] == etag
+
+    # another page is another representation
+    assert (await client.get(url + "&offset=10")).headers["etag"] != etag
+
+    await crud.create_owner_data("alice", CreateOwnerData(name="p"))
+    changed = await client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == HTTPStatus.OK
+    assert changed.json()["total"] == 2
+
+
+@pytest.mark.asyncio
+async def test_tunnel_status_writes_change_the_etag_of_the_wallet(client, keypair):
+    data = CreateSSHTunnel(
+        name="t", remote_server_user="lnbits", remote_server_url="cloud.example.com", local_port=5000, remote_port=9000
+    )
+    tunnel = await crud.create_ssh_tunnel("wallet", data, keypair[0], keypair[1])
+    etag = (await client.get("/api/v1/ssh-tunnels")).headers["etag"]
+    cached = await client.get("/api/v1/ssh-tunnels", headers={"If-None-Match": etag})
+    assert cached.status_code == HTTPStatus.NOT_MODIFIED
+
+    await crud.upsert_tunnel_runtimes([TunnelRuntime(tunnel_id=tunnel.id, is_connected=True, process_id=1)])
+    response = await client.get("/api/v1/ssh-tunnels", headers={"If-None-Match": etag})
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()["data"][0]["is_connected"] is True
+
+
+@pytest.mark.asyncio
+async def test_bulk_status_only_lists_tunnels_of_the_wallet(client, keypair):
+    from ..ssh_service import tunnel_manager
+
+    data = CreateSSHTunnel(
+        name="t", remote_server_user="lnbits", remote_server_url="cloud.example.com", local_port=5000, remote_port=9000
+    )
+    response = await client.post("/api/v1/ssh-tunnels", json=data.dict())
+    tunnel_id = response.json()["id"]
+    other = await crud.create_ssh_tunnel("other", data, keypair[0], keypair[1])
+    tunnel_manager.track([other])
+    try:
+        statuses = (await client.get("/api/v1/ssh-tunnels/status")).json()
+        assert [status["tunnel_id"] for status in statuses] == [tunnel_id]
+        assert statuses[0]["state"] == "stopped"
+        assert statuses[0]["is_active"] is False
+
+        assert (await client.get(f"/api/v1/ssh-tunnels/{tunnel_id}/status")).status_code == HTTPStatus.OK
+        response = await client.get(f"/api/v1/ssh-tunnels/{other.id}/status")
+        assert response.status_code == HTTPStatus.NOT_FOUND
+    finally:
+        tunnel_manager.forget_tunnel(tunnel_id)
+        tunnel_manager.forget_tunnel(other.id)
+
+
+@pytest.mark.asyncio
+async def test_asyncssh_backend_is_rejected_when_not_installed(client, monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util, "find_spec", lambda name, *args: None if name == "asyncssh" else find_spec(name, *args)
+    )
+    data = CreateSSHTunnel(
+        name="t", remote_server_user="lnbits", remote_server_url="cloud.example.com", local_port=5000, remote_port=9000
+    )
+    response = await client.post("/api/v1/ssh-tunnels", json={**data.dict(), "backend": "asyncssh"})
+    assert response.status_code == HTTPStatus.UNPROCESSABLE_ENTITY
+    assert "not installed" in response.text
+    assert available_ssh_tunnel_backends() == ["openssh"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_admin_only(client, keypair):
+    from ..metrics import DB_STATUS_WRITES
+
+    assert (await client.get("/api/v1/metrics")).status_code == HTTPStatus.FORBIDDEN
+
+    app = client._transport.app
+    user = app.dependency_overrides[check_user_exists]()
+    admin = user.copy(update={"admin": True})
+    app.dependency_overrides[check_user_exists] = lambda: admin
+    writes = DB_STATUS_WRITES.get("mark_disconnected")
+    await crud.mark_ssh_tunnels_disconnected(["t0", "t1"])
+
+    response = await client.get("/api/v1/metrics")
+    assert response.status_code == HTTPStatus.OK
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert f'cloud_connect_db_status_writes_total{{operation="mark_disconnected"}} {writes + 2}' in response.text
+    assert "# TYPE cloud_connect_tunnel_ready_seconds histogram" in response.text
+    assert "# TYPE cloud_connect_tunnels gauge" in response.text
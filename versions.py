@@ -0,0 +1,48 @@
+import hashlib
+import secrets
+
+
+def ssh_tunnels_scope(wallet_id: str) -> str:
+    return f"ssh_tunnels:{wallet_id}"
+
+
+def user_data_scope(user_id: str) -> str:
+    """
+    Owner data and client data of a user, which the client data list joins.
+    """
+    return f"data:{user_id}"
+
+
+class ListVersions:
+    """
+    In-memory version counter per list scope (the tunnels of a wallet, the
+    owner and client data of a user), bumped by every write in crud.py.
+
+    It backs strong ETags: a list response only changes when the version
+    of its scope does, so a matching `If-None-Match` is answered with 304
+    without touching the database. The counters start over on a restart,
+    so every version also carries a random boot id; with several LNbits
+    processes an ETag only ever matches on the process that issued it.
+    """
+
+    def __init__(self):
+        self.boot_id = secrets.token_hex(4)
+        self._versions: dict[str, int] = {}
+
+    def get(self, scope: str) -> int:
+        return self._versions.get(scope, 0)
+
+    def bump(self, *scopes: str):
+        for scope in scopes:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def etag(self, scope: str, variant: str = "") -> str:
+        """
+        Strong ETag of the current version of `scope`; `variant` tells
+        apart responses of the same scope, e.g. the query string.
+        """
+        digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+        return f'"{self.boot_id}.{self.get(scope)}.{digest}"'
+
+
+list_versions = ListVersions()
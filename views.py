@@ -9,6 +9,7 @@ from lnbits.decorators import check_user_exists
 from lnbits.helpers import template_renderer
 
 from .crud import get_owner_data_by_id
+from .models import available_ssh_tunnel_backends
 
 lnbits_cloud_connect_generic_router = APIRouter()
 
@@ -28,7 +29,8 @@ def lnbits_cloud_connect_renderer():
 @lnbits_cloud_connect_generic_router.get("/", response_class=HTMLResponse)
 async def index(req: Request, user: User = Depends(check_user_exists)):
     return lnbits_cloud_connect_renderer().TemplateResponse(
-        "lnbits_cloud_connect/index.html", {"request": req, "user": user.json()}
+        "lnbits_cloud_connect/index.html",
+        {"request": req, "user": user.json(), "ssh_tunnel_backends": available_ssh_tunnel_backends()},
     )
 
 
@@ -1,8 +1,9 @@
 # Description: This file contains the extensions API endpoints.
 from http import HTTPStatus
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
 from lnbits.core.models import SimpleStatus, User
 from lnbits.db import Filters, Page
 from lnbits.decorators import (
@@ -11,6 +12,7 @@ from lnbits.decorators import (
 )
 from lnbits.helpers import generate_filter_params_openapi
 
+from .cache import tunnel_cache
 from .crud import (
     create_client_data,
     create_owner_data,
@@ -21,14 +23,16 @@ from .crud import (
     get_client_data_by_id,
     get_client_data_paginated,
     get_owner_data,
-    get_owner_data_ids_by_user,
     get_owner_data_paginated,
     get_ssh_tunnel,
+    get_ssh_tunnel_summary,
     get_ssh_tunnels_paginated,
     update_client_data,
     update_owner_data,
     update_ssh_tunnel,
 )
+from .events import tunnel_events
+from .metrics import metrics
 from .models import (
     ClientData,
     ClientDataFilters,
@@ -40,21 +44,46 @@ from .models import (
     OwnerDataFilters,
     SSHTunnel,
     SSHTunnelFilters,
+    SSHTunnelLogEntry,
+    SSHTunnelSummary,
 )
-
+from .pagination import CursorPage
 from .services import (
+    get_dashboard,
     get_settings,  #  
     update_settings,  #  
 )
+from .versions import list_versions, ssh_tunnels_scope, user_data_scope
 
 
 owner_data_filters = parse_filters(OwnerDataFilters)
 client_data_filters = parse_filters(ClientDataFilters)
 ssh_tunnel_filters = parse_filters(SSHTunnelFilters)
 
+CURSOR_DESCRIPTION = (
+    "Page by cursor instead of offset: empty for the first page, "
+    "then the `next_cursor` of the previous page"
+)
+TOTAL_DESCRIPTION = "In cursor mode, also return the (briefly cached) total"
+
 lnbits_cloud_connect_api_router = APIRouter()
 
 
+def not_modified(request: Request, response: Response, scope: str) -> Response | None:
+    """
+    Tag `response` with the ETag of the current version of `scope` and
+    the query; returns a 304 response instead if the client has it already.
+    Called before the database is read, so the tag is never newer than the data.
+    """
+    etag = list_versions.etag(scope, request.url.query)
+    response.headers["Cache-Control"] = "no-cache"
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    return None
+
+
 ############################# Owner Data #############################
 @lnbits_cloud_connect_api_router.post("/api/v1/owner_data", status_code=HTTPStatus.CREATED)
 async def api_create_owner_data(
@@ -86,17 +115,28 @@ async def api_update_owner_data(
     summary="get paginated list of owner_data",
     response_description="list of owner_data",
     openapi_extra=generate_filter_params_openapi(OwnerDataFilters),
-    response_model=Page[OwnerData],
+    response_model=CursorPage[OwnerData],
 )
 async def api_get_owner_data_paginated(
+    request: Request,
+    response: Response,
     user: User = Depends(check_user_exists),
     filters: Filters = Depends(owner_data_filters),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    total: bool = Query(False, description=TOTAL_DESCRIPTION),
 ) -> Page[OwnerData]:
-
-    return await get_owner_data_paginated(
-        user_id=user.id,
-        filters=filters,
-    )
+    cached = not_modified(request, response, user_data_scope(user.id))
+    if cached:
+        return cached
+    try:
+        return await get_owner_data_paginated(
+            user_id=user.id,
+            filters=filters,
+            cursor=cursor,
+            with_total=total,
+        )
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(e)) from e
 
 
 @lnbits_cloud_connect_api_router.get(
@@ -192,25 +232,35 @@ async def api_update_client_data(
     summary="get paginated list of client_data",
     response_description="list of client_data",
     openapi_extra=generate_filter_params_openapi(ClientDataFilters),
-    response_model=Page[ClientData],
+    response_model=CursorPage[ClientData],
 )
 async def api_get_client_data_paginated(
+    request: Request,
+    response: Response,
     user: User = Depends(check_user_exists),
     owner_data_id: str | None = None,
     filters: Filters = Depends(client_data_filters),
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    total: bool = Query(False, description=TOTAL_DESCRIPTION),
 ) -> Page[ClientData]:
+    cached = not_modified(request, response, user_data_scope(user.id))
+    if cached:
+        return cached
+    try:
+        page = await get_client_data_paginated(
+            user_id=user.id,
+            owner_data_id=owner_data_id,
+            filters=filters,
+            cursor=cursor,
+            with_total=total,
+        )
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(e)) from e
+    # an empty first page may also mean the owner data is someone else's
+    if owner_data_id and not page.data and not cursor and not await get_owner_data(user.id, owner_data_id):
+        raise HTTPException(HTTPStatus.FORBIDDEN, "Not your owner data.")
 
-    owner_data_ids = await get_owner_data_ids_by_user(user.id)
-
-    if owner_data_id:
-        if owner_data_id not in owner_data_ids:
-            raise HTTPException(HTTPStatus.FORBIDDEN, "Not your owner data.")
-        owner_data_ids = [owner_data_id]
-
-    return await get_client_data_paginated(
-        owner_data_ids=owner_data_ids,
-        filters=filters,
-    )
+    return page
 
 
 @lnbits_cloud_connect_api_router.get(
@@ -258,6 +308,43 @@ async def api_delete_client_data(
     return SimpleStatus(success=True, message="Client Data Deleted")
 
 
+############################ Dashboard #############################
+@lnbits_cloud_connect_api_router.get(
+    "/api/v1/dashboard",
+    name="Dashboard",
+    summary="Everything the extension page shows on load, in one response.",
+    response_description="The currencies and the first page of owner data, client data and SSH tunnels",
+)
+async def api_get_dashboard(
+    user: User = Depends(check_user_exists),
+    limit: int = Query(10, ge=1, le=100, description="Rows per list"),
+    sections: str | None = Query(
+        None, description="Comma separated sections to include, e.g. `currencies,ssh_tunnels` (default all)"
+    ),
+    fields: str | None = Query(
+        None,
+        description="Comma separated `section.field` to return only those fields of the rows of a section, "
+        "e.g. `ssh_tunnels.id,ssh_tunnels.name,ssh_tunnels.is_connected`",
+    ),
+) -> dict:
+    selected: dict[str, list[str]] = {}
+    for item in (fields or "").split(","):
+        if not item.strip():
+            continue
+        section, _, field = item.strip().partition(".")
+        selected.setdefault(section, []).append(field)
+    try:
+        return await get_dashboard(
+            user_id=user.id,
+            wallet_id=user.wallets[0].id,
+            limit=limit,
+            sections=[section.strip() for section in sections.split(",") if section.strip()] if sections else None,
+            fields=selected,
+        )
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(e)) from e
+
+
 ############################ Settings #############################
 @lnbits_cloud_connect_api_router.get(
     "/api/v1/settings",
@@ -299,17 +386,20 @@ async def api_create_ssh_tunnel(
     data: CreateSSHTunnel,
     user: User = Depends(check_user_exists),
 ) -> SSHTunnel:
-    from .helpers import generate_ssh_keypair, encrypt_private_key
-    
+    from .helpers import encrypt_private_key
+    from .keypool import key_pool
+    from .ssh_service import tunnel_manager
+
     # Check if user already has a tunnel
     existing_tunnels = await get_ssh_tunnels_paginated(wallet_id=user.wallets[0].id)
     if existing_tunnels.total > 0:
         raise HTTPException(HTTPStatus.BAD_REQUEST, "Only one SSH tunnel allowed per user.")
     
-    private_key, public_key = generate_ssh_keypair()
+    private_key, public_key = await key_pool.take()
     encrypted_private_key = encrypt_private_key(private_key)
     
     tunnel = await create_ssh_tunnel(user.wallets[0].id, data, encrypted_private_key, public_key)
+    tunnel_manager.track([tunnel])
     return tunnel
 
 
@@ -319,26 +409,96 @@ async def api_create_ssh_tunnel(
     summary="Get paginated list of SSH tunnels",
     response_description="List of SSH tunnels",
     openapi_extra=generate_filter_params_openapi(SSHTunnelFilters),
-    response_model=Page[SSHTunnel],
+    response_model=CursorPage[SSHTunnelSummary],
 )
 async def api_get_ssh_tunnels(
+    request: Request,
+    response: Response,
     user: User = Depends(check_user_exists),
     filters: Filters = Depends(ssh_tunnel_filters),
-) -> Page[SSHTunnel]:
+    cursor: str | None = Query(None, description=CURSOR_DESCRIPTION),
+    total: bool = Query(False, description=TOTAL_DESCRIPTION),
+) -> Page[SSHTunnelSummary]:
+    cached = not_modified(request, response, ssh_tunnels_scope(user.wallets[0].id))
+    if cached:
+        return cached
     try:
         return await get_ssh_tunnels_paginated(
             wallet_id=user.wallets[0].id,
             filters=filters,
+            cursor=cursor,
+            with_total=total,
         )
+    except ValueError as e:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, str(e)) from e
     except Exception as e:
         # Handle case where ssh_tunnels table doesn't exist yet
         if "no such table" in str(e).lower() or "table" in str(e).lower():
             # Return empty page if table doesn't exist yet
             from lnbits.db import Page
+            del response.headers["ETag"]
             return Page(data=[], total=0)
         raise HTTPException(HTTPStatus.INTERNAL_SERVER_ERROR, f"Database error: {str(e)}")
 
 
+@lnbits_cloud_connect_api_router.get("/api/v1/ssh-tunnels/supervisor")
+async def api_get_ssh_tunnel_supervisor(
+    user: User = Depends(check_user_exists),
+) -> dict:
+    from .keypool import key_pool
+    from .ssh_service import tunnel_manager
+
+    if not user.admin:
+        raise HTTPException(HTTPStatus.FORBIDDEN, "Only admins can view the tunnel supervisor.")
+
+    return {
+        **tunnel_manager.supervisor.stats(),
+        "cache": tunnel_cache.stats(),
+        "runtime": tunnel_manager.runtime.stats(),
+        "key_pool": key_pool.stats(),
+        "events": tunnel_events.stats(),
+    }
+
+
+@lnbits_cloud_connect_api_router.get("/api/v1/metrics")
+async def api_get_metrics(
+    user: User = Depends(check_user_exists),
+) -> Response:
+    """
+    Extension metrics in the Prometheus text exposition format.
+    """
+    if not user.admin:
+        raise HTTPException(HTTPStatus.FORBIDDEN, "Only admins can view the metrics.")
+
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@lnbits_cloud_connect_api_router.get("/api/v1/ssh-tunnels/events")
+async def api_get_ssh_tunnel_events(
+    user: User = Depends(check_user_exists),
+) -> StreamingResponse:
+    """
+    Server-Sent Events stream of the state changes of the user's tunnels.
+    """
+    return StreamingResponse(
+        tunnel_events.stream(user.wallets[0].id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@lnbits_cloud_connect_api_router.get("/api/v1/ssh-tunnels/status")
+async def api_get_ssh_tunnel_statuses(
+    user: User = Depends(check_user_exists),
+) -> list[dict]:
+    """
+    Status of every tunnel of the user in one call, served from memory.
+    """
+    from .ssh_service import tunnel_manager
+
+    return await tunnel_manager.get_wallet_tunnel_statuses(user.wallets[0].id)
+
+
 @lnbits_cloud_connect_api_router.get("/api/v1/ssh-tunnels/{tunnel_id}")
 async def api_get_ssh_tunnel(
     tunnel_id: str,
@@ -381,7 +541,7 @@ async def api_disconnect_ssh_tunnel(
 ) -> SimpleStatus:
     from .ssh_service import tunnel_manager
     
-    tunnel = await get_ssh_tunnel(tunnel_id, user.wallets[0].id)
+    tunnel = await get_ssh_tunnel_summary(tunnel_id, user.wallets[0].id)
     if not tunnel:
         raise HTTPException(HTTPStatus.NOT_FOUND, "SSH tunnel not found.")
     
@@ -398,13 +558,33 @@ async def api_get_ssh_tunnel_status(
     user: User = Depends(check_user_exists),
 ) -> dict:
     from .ssh_service import tunnel_manager
-    
-    tunnel = await get_ssh_tunnel(tunnel_id, user.wallets[0].id)
+
+    # the manager knows the wallet of every tunnel it has seen; only ask
+    # the database about the others
+    wallet_id = tunnel_manager.wallets.get(tunnel_id)
+    if wallet_id is None:
+        tunnel = await get_ssh_tunnel_summary(tunnel_id, user.wallets[0].id)
+        wallet_id = tunnel.wallet_id if tunnel else None
+    if wallet_id != user.wallets[0].id:
+        raise HTTPException(HTTPStatus.NOT_FOUND, "SSH tunnel not found.")
+
+    return await tunnel_manager.get_tunnel_status(tunnel_id)
+
+
+@lnbits_cloud_connect_api_router.get("/api/v1/ssh-tunnels/{tunnel_id}/logs")
+async def api_get_ssh_tunnel_logs(
+    tunnel_id: str,
+    limit: int = Query(100, ge=1, le=500),
+    level: str | None = None,
+    user: User = Depends(check_user_exists),
+) -> list[SSHTunnelLogEntry]:
+    from .ssh_service import tunnel_manager
+
+    tunnel = await get_ssh_tunnel_summary(tunnel_id, user.wallets[0].id)
     if not tunnel:
         raise HTTPException(HTTPStatus.NOT_FOUND, "SSH tunnel not found.")
-    
-    status = await tunnel_manager.get_tunnel_status(tunnel_id)
-    return status
+
+    return tunnel_manager.get_tunnel_logs(tunnel_id, limit, level)
 
 
 @lnbits_cloud_connect_api_router.put("/api/v1/ssh-tunnels/{tunnel_id}")
@@ -417,8 +597,12 @@ async def api_update_ssh_tunnel(
     if not tunnel:
         raise HTTPException(HTTPStatus.NOT_FOUND, "SSH tunnel not found.")
     
+    from .ssh_service import tunnel_manager
+
     updated_tunnel = SSHTunnel(**{**tunnel.dict(), **data.dict()})
     tunnel = await update_ssh_tunnel(updated_tunnel)
+    # a running tunnel is restarted with its new settings
+    tunnel_manager.reconciler.request()
     return tunnel
 
 
@@ -429,12 +613,13 @@ async def api_delete_ssh_tunnel(
 ) -> SimpleStatus:
     from .ssh_service import tunnel_manager
     
-    tunnel = await get_ssh_tunnel(tunnel_id, user.wallets[0].id)
+    tunnel = await get_ssh_tunnel_summary(tunnel_id, user.wallets[0].id)
     if not tunnel:
         raise HTTPException(HTTPStatus.NOT_FOUND, "SSH tunnel not found.")
     
     await tunnel_manager.stop_tunnel(tunnel_id, manual_disconnect=True)
     await delete_ssh_tunnel(tunnel_id, user.wallets[0].id)
+    tunnel_manager.forget_tunnel(tunnel_id)
     
     return SimpleStatus(success=True, message="SSH tunnel deleted.")
 